@@ -0,0 +1,245 @@
+import os
+import numpy as np
+from pydub import AudioSegment
+from resample import resample_ratio
+from wav_file import WavSamples, UnsupportedWav, is_wav_file, open_wav, write_wav
+
+# In-memory audio for everything between decode and encode. Samples are a float32 NumPy array of
+# shape (frames, channels) in [-1, 1]; every operation is vectorized. pydub's AudioSegment is only
+# used to read and write files, so nothing on the hot paths goes through audioop.
+#
+# WAV files are memory-mapped instead (see wav_file). A buffer over integer PCM keeps it encoded
+# until something asks for .samples; until then frame counts, slices, RMS, export and the engine's
+# block reads (lazy_samples) work on the mapping and decode only the frames they touch.
+
+# Engine format: the pygame mixer is opened with these parameters and every track is converted
+# to them once, when it is loaded, so playback, EQ and mixdown never convert formats again
+ENGINE_FRAME_RATE = 44100
+ENGINE_CHANNELS = 2
+ENGINE_SAMPLE_WIDTH = 2  # bytes, signed 16-bit, for the mixer and for encoded files
+
+_SAMPLE_TYPES = {1: np.int8, 2: np.int16, 4: np.int32}
+CHUNK_FRAMES = 16384  # Long buffers are converted to and from PCM in chunks that stay in cache
+
+
+class AudioBuffer:
+    __slots__ = ("_samples", "_encoded", "frame_rate")
+
+    def __init__(self, samples, frame_rate=ENGINE_FRAME_RATE):
+        self._encoded = None
+        if isinstance(samples, WavSamples):
+            self._encoded = samples  # Decoded by the first access to .samples
+            samples = None
+        else:
+            samples = np.asarray(samples, dtype=np.float32)
+            if samples.ndim == 1:
+                samples = samples.reshape((-1, 1))
+        self._samples = samples
+        self.frame_rate = frame_rate
+
+    @property
+    def samples(self):
+        if self._samples is None:
+            self._samples = self._encoded.decode()
+            self._encoded = None
+        return self._samples
+
+    @samples.setter
+    def samples(self, samples):
+        self._samples = samples
+        self._encoded = None
+
+    @property
+    def lazy_samples(self):
+        """
+        The samples, or while they are still encoded in a mapped file, an array-like that decodes
+        only the frames sliced from it. Supports len() and slicing by frames.
+        """
+        return self._encoded if self._samples is None else self._samples
+
+    @property
+    def storage(self):
+        # The array holding the audio, for memory accounting: the samples or the encoded mapping
+        return self._encoded.raw if self._samples is None else self._samples
+
+    @classmethod
+    def silent(cls, duration_ms, channels=ENGINE_CHANNELS, frame_rate=ENGINE_FRAME_RATE):
+        frames = int(duration_ms * frame_rate / 1000)
+        return cls(np.zeros((frames, channels), dtype=np.float32), frame_rate)
+
+    @classmethod
+    def from_segment(cls, audio_segment):
+        sample_type = _SAMPLE_TYPES.get(audio_segment.sample_width)
+        if sample_type is None:
+            audio_segment = audio_segment.set_sample_width(ENGINE_SAMPLE_WIDTH)
+            sample_type = np.int16
+        pcm = np.frombuffer(audio_segment.raw_data, dtype=sample_type).reshape((-1, audio_segment.channels))
+        return cls.from_pcm(pcm, audio_segment.frame_rate)
+
+    @classmethod
+    def from_pcm(cls, pcm, frame_rate=ENGINE_FRAME_RATE):
+        """
+        Builds a buffer from a (frames x channels) array of signed integers, the inverse of to_pcm().
+        """
+        scale = np.float32(1 / 2 ** (8 * pcm.itemsize - 1))
+        frames = np.empty(pcm.shape, dtype=np.float32)
+        for start in range(0, len(pcm), CHUNK_FRAMES):
+            np.multiply(pcm[start:start + CHUNK_FRAMES], scale, out=frames[start:start + CHUNK_FRAMES])
+        return cls(frames, frame_rate)
+
+    @classmethod
+    def from_file(cls, file_path):
+        if is_wav_file(file_path):
+            try:
+                samples, frame_rate = open_wav(file_path)
+                return cls(samples, frame_rate)
+            except UnsupportedWav:
+                pass  # 8-bit or compressed WAV: ffmpeg decodes it
+        return cls.from_segment(AudioSegment.from_file(file_path))
+
+    def to_segment(self, sample_width=ENGINE_SAMPLE_WIDTH):
+        return AudioSegment(
+            self.to_pcm(sample_width).tobytes(),
+            frame_rate=self.frame_rate,
+            sample_width=sample_width,
+            channels=self.channels
+        )
+
+    def export(self, file_path, format="wav", **kwargs):
+        # Written next to the destination and renamed over it, so a buffer still mapping the old
+        # file (the track being edited, its undo history) keeps reading the old contents
+        temp_path = f"{file_path}.part"
+        try:
+            if format == "wav" and not kwargs:
+                write_wav(temp_path, self.pcm_chunks(), self.frame_rate, self.channels, ENGINE_SAMPLE_WIDTH)
+            else:
+                self.to_segment().export(temp_path, format=format, **kwargs).close()
+            os.replace(temp_path, file_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return file_path
+
+    def pcm_chunks(self, sample_width=ENGINE_SAMPLE_WIDTH):
+        """
+        Yields the samples as (frames x channels) signed integers, clipped to the sample width,
+        CHUNK_FRAMES at a time. Samples still encoded at this width are passed through as they are.
+        """
+        if self._samples is None and self._encoded.pcm(sample_width) is not None:
+            pcm = self._encoded.pcm(sample_width)
+            for start in range(0, len(pcm), CHUNK_FRAMES):
+                yield pcm[start:start + CHUNK_FRAMES]
+            return
+        samples = self.lazy_samples
+        scale = np.float32(2 ** (8 * sample_width - 1))
+        scaled = np.empty((CHUNK_FRAMES, self.channels), dtype=np.float32)
+        pcm = np.empty((CHUNK_FRAMES, self.channels), dtype=_SAMPLE_TYPES[sample_width])
+        for start in range(0, self.frame_count, CHUNK_FRAMES):
+            chunk = samples[start:start + CHUNK_FRAMES]
+            block = scaled[:len(chunk)]
+            np.multiply(chunk, scale, out=block)
+            np.clip(block, -scale, scale - 1, out=block)
+            pcm[:len(chunk)] = block
+            yield pcm[:len(chunk)]
+
+    def to_pcm(self, sample_width=ENGINE_SAMPLE_WIDTH):
+        """
+        Returns the samples as interleaved signed integers, clipped to the sample width.
+        """
+        pcm = np.empty((self.frame_count, self.channels), dtype=_SAMPLE_TYPES[sample_width])
+        start = 0
+        for chunk in self.pcm_chunks(sample_width):
+            pcm[start:start + len(chunk)] = chunk
+            start += len(chunk)
+        return pcm
+
+    @property
+    def channels(self):
+        return self.lazy_samples.shape[1]
+
+    @property
+    def frame_count(self):
+        return self.lazy_samples.shape[0]
+
+    @property
+    def duration_seconds(self):
+        return self.frame_count / self.frame_rate
+
+    @property
+    def duration_ms(self):
+        return self.frame_count * 1000 / self.frame_rate
+
+    @property
+    def rms(self):
+        if not self.frame_count:
+            return 0.0
+        samples = self.lazy_samples
+        total = 0.0
+        for start in range(0, self.frame_count, CHUNK_FRAMES):
+            flat = samples[start:start + CHUNK_FRAMES].reshape(-1)
+            total += float(np.dot(flat, flat))
+        return float(np.sqrt(total / (self.frame_count * self.channels)))
+
+    def __len__(self):
+        return self.frame_count
+
+    def ms_to_frames(self, ms):
+        return int(round(ms * self.frame_rate / 1000))
+
+    def slice_ms(self, start_ms=0, end_ms=None):
+        # A view, like any NumPy slice; copy before editing it in place
+        start = self.ms_to_frames(start_ms)
+        end = self.frame_count if end_ms is None else self.ms_to_frames(end_ms)
+        if self._samples is None:
+            return AudioBuffer(self._encoded.slice(start, end), self.frame_rate)
+        return AudioBuffer(self.samples[start:end], self.frame_rate)
+
+    def copy(self):
+        return AudioBuffer(self.samples.copy(), self.frame_rate)
+
+    def gain(self, factor):
+        return AudioBuffer(self.samples * np.float32(factor), self.frame_rate)
+
+    def apply_gain(self, gain_db):
+        return self.gain(10 ** (gain_db / 20))
+
+    def mix_into(self, other, position_frames=0, gain=1.0):
+        """
+        Adds `other` (scaled by gain) into this buffer in place, starting at position_frames.
+        Whatever runs past the end of this buffer is dropped.
+        """
+        end = min(self.frame_count, position_frames + other.frame_count)
+        if end <= position_frames:
+            return self
+        target = self.samples[position_frames:end]
+        source = other.samples[:end - position_frames]
+        if gain == 1.0:
+            np.add(target, source, out=target)
+        else:
+            target += source * np.float32(gain)
+        return self
+
+    def set_channels(self, channels):
+        if channels == self.channels:
+            return self
+        if channels == 1:
+            return AudioBuffer(self.samples.mean(axis=1, keepdims=True), self.frame_rate)
+        if self.channels == 1:
+            return AudioBuffer(np.repeat(self.samples, channels, axis=1), self.frame_rate)
+        raise ValueError(f"Cannot convert {self.channels} channels to {channels}")
+
+    def resample(self, frame_rate):
+        if frame_rate == self.frame_rate or not self.frame_count:
+            return AudioBuffer(self.lazy_samples, frame_rate)
+        return AudioBuffer(resample_ratio(self.samples, frame_rate / self.frame_rate), frame_rate)
+
+    def to_engine_format(self):
+        """
+        Returns the buffer at the engine frame rate and channel count; a no-op if it already is.
+        """
+        audio = self
+        if audio.frame_rate != ENGINE_FRAME_RATE:
+            audio = audio.resample(ENGINE_FRAME_RATE)
+        if audio.channels != ENGINE_CHANNELS:
+            audio = audio.set_channels(ENGINE_CHANNELS)
+        return audio
@@ -1,114 +1,222 @@
 import os
-import io
 import math
 import json
-import pygame
-from pydub import AudioSegment
-from time import sleep
 from tkinter import filedialog, messagebox
-import threading
 import globals
 import shutil
-import librosa
 import time
-from track_timeline import grid_state, ROWS, COLUMNS, INTERVAL_DURATION
+from event_log import EventLog, is_event_log_file
+from tracing import traced, span
+from mixdown import change_speed, mix_timeline
+from audio_buffer import AudioBuffer
+from effects import EffectChain
+from automation import AutomationLane
+from undo_journal import journal
+import job_scheduler
+from job_scheduler import track_key
+from track_timeline import grid_state, set_cell_active
+from preview_player import preview_player
 
+@traced()
 def detect_bpm(track_index):
     file_path = globals.track_file_paths[track_index]
-    if file_path:
-        try:
-            y, sr = librosa.load(file_path)
+    if not file_path:
+        messagebox.showwarning(title="No File Loaded", message=f"No audio file loaded in Track {track_index + 1}.")
+        return None
 
-            tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
-            bpm = round(float(tempo))
+    def work(job):
+        # librosa pulls in numba and scikit-learn, so only import it when BPM detection is used
+        import librosa
+        job.report_progress(0.0, "Analyzing tempo")
+        y, sr = librosa.load(file_path)
+        job.report_progress(0.5)
+        tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
+        return round(float(tempo))
 
-            messagebox.showinfo(title="BPM Detection", message=f"Track {track_index + 1} BPM: {bpm}")
-            return bpm
-        except Exception as e:
-            print(f"Error detecting BPM for track {track_index + 1}: {e}")
-            messagebox.showerror(title="BPM Detection Error", message=f"Could not detect BPM for Track {track_index + 1}.")
-            return None
+    def done(bpm):
+        messagebox.showinfo(title="BPM Detection", message=f"Track {track_index + 1} BPM: {bpm}")
+
+    def failed(e):
+        print(f"Error detecting BPM for track {track_index + 1}: {e}")
+        messagebox.showerror(title="BPM Detection Error", message=f"Could not detect BPM for Track {track_index + 1}.")
+
+    return job_scheduler.submit(f"Detecting BPM of Track {track_index + 1}", work,
+                                keys=[track_key(track_index)], on_done=done, on_error=failed)
+
+@traced()
+def read_track_file(file_path):
+    """
+    Decodes a track file without touching Tk, so it can run on a worker thread.
+    Returns (audio, event_log, duration_seconds); exactly one of audio and event_log is set.
+    """
+    if is_event_log_file(file_path):
+        # MIDI recordings stay as an event log until playback or export renders them
+        event_log = EventLog.load_midi(file_path)
+        return None, event_log, event_log.duration_seconds
+    with span("audio_processing.decode"):
+        audio = AudioBuffer.from_file(file_path)
+    # Convert once here; the file itself is left as it was
+    with span("audio_processing.to_engine_format"):
+        audio = audio.to_engine_format()
+    return audio, None, audio.duration_seconds
+
+def set_track(track_index, file_path, audio, event_log, duration_seconds):
+    # Must run on the Tk thread
+    if event_log is not None:
+        print(f"Loaded recording for Track {track_index + 1}: {len(event_log)} events, Duration = {duration_seconds}s")
     else:
-        messagebox.showwarning(title="No File Loaded", message=f"No audio file loaded in Track {track_index + 1}.")
-        return None
+        print(f"Loaded audio for Track {track_index + 1}: Duration = {duration_seconds}s, Frame Rate = {audio.frame_rate}Hz")
+    globals.track_event_logs[track_index] = event_log
+    globals.original_tracks[track_index] = audio
+    globals.tracks[track_index] = audio
+    globals.track_file_paths[track_index] = file_path
+    globals.track_durations[track_index] = duration_seconds
+
+    filename = os.path.basename(file_path)
+    duration_formatted = format_duration(duration_seconds)
+    globals.track_labels[track_index].config(text=f"{filename} ({duration_formatted})")
+
+    globals.last_mod_times[track_index] = os.path.getmtime(file_path)
+    globals.update_total_length()  # Update total length when a new track is loaded
 
+def replace_track_audio(track_index, audio):
+    # Must run on the Tk thread; used by edits (trim, EQ) and by undo/redo
+    globals.tracks[track_index] = audio
+    globals.original_tracks[track_index] = audio
+    globals.track_durations[track_index] = audio.duration_seconds
+    filename = os.path.basename(globals.track_file_paths[track_index])
+    globals.track_labels[track_index].config(text=f"{filename} ({format_duration(audio.duration_seconds)})")
+    globals.update_total_length()
+
+@traced()
 def load_audio(track_index, file_path=None):
+    source_path = None
     if not file_path:
         # Open the file dialog in the Session Audios folder by default
-        file_path = filedialog.askopenfilename(
+        source_path = filedialog.askopenfilename(
             initialdir=globals.TEMP_DIR,
-            filetypes=[("Audio Files", "*.wav *.mp3")]
+            filetypes=[("Audio Files", "*.wav *.mp3 *.mid")]
         )
-        if not file_path:
-            return
-        dest_filename = f"track_{track_index + 1}_{os.path.basename(file_path)}"
+        if not source_path:
+            return None
+        dest_filename = f"track_{track_index + 1}_{os.path.basename(source_path)}"
         dest_path = os.path.join(globals.TEMP_DIR, dest_filename)
-        shutil.copy2(file_path, dest_path)
     else:
         dest_path = file_path
-    try:
-        audio = AudioSegment.from_file(dest_path)
-        print(f"Loaded audio for Track {track_index + 1}: Duration = {audio.duration_seconds}s, Frame Rate = {audio.frame_rate}Hz")
-        globals.original_tracks[track_index] = audio
-        globals.tracks[track_index] = audio
-        globals.track_file_paths[track_index] = dest_path
 
-        duration_seconds = audio.duration_seconds
-        globals.track_durations[track_index] = duration_seconds
+    def work(job):
+        if source_path:
+            # Copied next to the destination and renamed over it, like AudioBuffer.export: the track
+            # loaded from the old file keeps its mapping of the old contents
+            temp_path = f"{dest_path}.part"
+            try:
+                shutil.copy2(source_path, temp_path)
+                os.replace(temp_path, dest_path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+        job.report_progress(0.5, "Decoding")
+        return read_track_file(dest_path)
 
-        filename = os.path.basename(dest_path)
-        duration_formatted = format_duration(duration_seconds)
-        globals.track_labels[track_index].config(text=f"{filename} ({duration_formatted})")
+    def done(result):
+        if source_path:
+            # A different file: edits recorded on the old one can't be undone on it
+            journal.forget_track(track_index)
+        set_track(track_index, dest_path, *result)
 
-        globals.last_mod_times[track_index] = os.path.getmtime(dest_path)
-        globals.update_total_length()  # Update total length when a new track is loaded
-    except Exception as e:
+    def failed(e):
         messagebox.showerror("Load Audio", f"Failed to load audio file:\n{e}")
 
+    return job_scheduler.submit(f"Loading Track {track_index + 1}", work,
+                                keys=[track_key(track_index)], on_done=done, on_error=failed)
+
 def format_duration(seconds):
     minutes = int(seconds) // 60
     seconds = int(seconds) % 60
     return f"{minutes}:{seconds:02d}"
 
-def change_speed(sound, speed=1.0):
-    new_frame_rate = int(sound.frame_rate * speed)
-    print(f"Changing speed: Original frame rate = {sound.frame_rate}, New frame rate = {new_frame_rate}")
-    new_sound = sound._spawn(sound.raw_data, overrides={"frame_rate": new_frame_rate})
-    return new_sound.set_frame_rate(sound.frame_rate)
+@traced()
+def render_event_log_tracks():
+    # Render MIDI recordings to PCM only once something actually needs the audio
+    for i, event_log in enumerate(globals.track_event_logs):
+        if event_log is not None and globals.original_tracks[i] is None:
+            audio = event_log.render()
+            globals.original_tracks[i] = audio
+            globals.tracks[i] = audio
 
-def apply_bpm_change():
-    current_bpm = globals.bpm_var.get()
-    speed_ratio = current_bpm / 120.0
+# (original track, speed, preserve pitch) each entry of globals.tracks was last made from
+applied_speeds = [None] * globals.track_count
+
+def resize_applied_speeds(count):
+    del applied_speeds[count:]
+    applied_speeds.extend([None] * (count - len(applied_speeds)))
+
+globals.track_count_listeners.append(resize_applied_speeds)
+
+def pending_speed_changes():
+    """
+    Returns (track_index, setting) for the tracks whose audio, tempo or stretch mode changed
+    since they were last processed; the others are reused as they are.
+    """
+    speed_ratio = globals.bpm_var.get() / 120.0
+    pending = []
     for i, original_track in enumerate(globals.original_tracks):
         if original_track:
-            globals.tracks[i] = change_speed(original_track, speed_ratio)
-
-def convert_to_pygame_sound(audio_segment):
-    # Ensure audio is in 16-bit signed format for pygame
-    if audio_segment.sample_width != 2:
-        print(f"Converting sample width from {audio_segment.sample_width} to 2")
-        audio_segment = audio_segment.set_sample_width(2)
-    wav_io = io.BytesIO()
-    audio_segment.export(wav_io, format="wav")
-    wav_io.seek(0)
-    return pygame.mixer.Sound(wav_io)
+            setting = (original_track, speed_ratio, globals.preserve_pitch[i])
+            applied = applied_speeds[i]
+            if applied is None or applied[0] is not original_track or applied[1:] != setting[1:]:
+                pending.append((i, setting))
+    return pending
+
+def process_speed_change(setting):
+    original_track, speed_ratio, preserve_pitch = setting
+    return change_speed(original_track, speed_ratio, preserve_pitch)
+
+def store_speed_change(track_index, setting, track):
+    # Must run on the Tk thread; skipped if the track was replaced while it was being processed
+    if globals.original_tracks[track_index] is setting[0]:
+        globals.tracks[track_index] = track
+        applied_speeds[track_index] = setting
+
+@traced()
+def apply_bpm_change():
+    for track_index, setting in pending_speed_changes():
+        store_speed_change(track_index, setting, process_speed_change(setting))
+
+def set_preserve_pitch(track_index, preserve):
+    globals.preserve_pitch[track_index] = bool(preserve)
+
+@traced()
+def convert_to_pygame_sound(audio):
+    import pygame
+    # Tracks are already at the mixer's rate and channel count, so only the sample type changes
+    return pygame.mixer.Sound(buffer=audio.to_engine_format().to_pcm())
+
+METER_INTERVAL_MS = 100
+meter_updates_running = False
 
 def update_volume_meters():
-    while any(channel.get_busy() for channel in globals.channels):
-        for i, track in enumerate(globals.tracks):
-            if track and globals.channels[i].get_busy():
-                rms = track.rms
-                current_volume = globals.volume_levels[i]
-                normalized_rms = min(rms / 1000, 1.0)
-                effective_rms = normalized_rms * current_volume
-                globals.volume_meters[i]['value'] = effective_rms * 100
-                current_db = calculate_db(effective_rms * 1000)
-                if current_db == -float('inf'):
-                    globals.db_labels[i].config(text="-∞ dB")
-                else:
-                    globals.db_labels[i].config(text=f"{int(current_db)} dB")
-        globals.window.update()
-        sleep(0.1)
+    # Runs on the Tk thread from window.after; the levels come from the mixer engine's last block,
+    # and the previewed track's from the preview playing
+    global meter_updates_running
+    engine = globals.mixer_engine
+    playing = engine is not None and engine.playing
+    previewing = preview_player.playing
+    for i, meter in enumerate(globals.volume_meters):
+        rms = float(engine.levels[i]) * 32768 if playing else 0.0
+        if previewing and i == preview_player.track_index:
+            rms = max(rms, preview_player.level() * 32768)
+        effective_rms = min(rms / 1000, 1.0)
+        meter['value'] = effective_rms * 100
+        current_db = calculate_db(effective_rms * 1000)
+        if current_db == -float('inf'):
+            globals.db_labels[i].config(text="-∞ dB")
+        else:
+            globals.db_labels[i].config(text=f"{int(current_db)} dB")
+    if playing or previewing:
+        globals.window.after(METER_INTERVAL_MS, update_volume_meters)
+    else:
+        meter_updates_running = False
 
 def calculate_db(rms):
     if rms == 0:
@@ -116,190 +224,338 @@ def calculate_db(rms):
     return 20 * math.log10(rms / 1000)
 
 def start_volume_meter_updates():
-    meter_thread = threading.Thread(target=update_volume_meters)
-    meter_thread.daemon = True
-    meter_thread.start()
+    global meter_updates_running
+    if not meter_updates_running:
+        meter_updates_running = True
+        globals.window.after(METER_INTERVAL_MS, update_volume_meters)
+
+def start_engine_playback():
+    engine = globals.mixer_engine
+    start_frame = int(globals.cursor_position * engine.frame_rate)
+    apply_loop_region()
+    # Tracks shorter than the cursor position simply stay silent in the engine
+    engine.play([track.lazy_samples if track else None for track in globals.tracks], start_frame)
+    globals.playback_start_time = time.time()
+    paused_channels.clear()
+    start_volume_meter_updates()
+    globals.update_current_playback_time()
 
+@traced()
 def play_all_audio():
     try:
-        apply_bpm_change()
-        globals.playback_start_time = time.time()
-        cursor_ms = globals.cursor_position * 1000  # Convert cursor position to milliseconds
-        for i, track in enumerate(globals.tracks):
-            if track:
-                print(f"Track {i + 1} length: {len(track)} ms")
-                if cursor_ms >= len(track):
-                    print(f"Skipping Track {i + 1} because cursor is beyond track length.")
-                    continue  # Skip if cursor position is beyond track length
-                # Trim the track to start from cursor_position
-                track_to_play = track[cursor_ms:]
-                sound = convert_to_pygame_sound(track_to_play)
-                globals.channels[i].stop()
-                globals.channels[i].play(sound)
-                globals.channels[i].set_volume(globals.volume_levels[i])
-                globals.paused_states[i] = False
-        start_volume_meter_updates()
-        globals.update_current_playback_time()
+        render_event_log_tracks()
+        pending = pending_speed_changes()
+        if not pending:
+            start_engine_playback()
+            return None
     except Exception as e:
         messagebox.showerror("Playback Error", f"An error occurred during playback:\n{e}")
         print(f"Playback Error: {e}")
+        return None
+
+    # Tempo changes (time-stretching especially) can take seconds, so they run as a job
+    def work(job):
+        results = []
+        for n, (track_index, setting) in enumerate(pending):
+            job.report_progress(n / len(pending), f"Changing tempo of Track {track_index + 1}")
+            results.append((track_index, setting, process_speed_change(setting)))
+        return results
+
+    def done(results):
+        for track_index, setting, track in results:
+            store_speed_change(track_index, setting, track)
+        start_engine_playback()
+
+    def failed(e):
+        messagebox.showerror("Playback Error", f"An error occurred during playback:\n{e}")
+        print(f"Playback Error: {e}")
+
+    return job_scheduler.submit("Preparing playback", work, keys=[track_key(i) for i, _ in pending],
+                                on_done=done, on_error=failed)
+
+paused_channels = []  # Channels pause_audio() paused, for resume_audio() to unpause
 
 def pause_audio():
-    for i, channel in enumerate(globals.channels):
+    if globals.mixer_engine is not None:
+        globals.mixer_engine.pause()
+    for channel in globals.all_channels():
         if channel.get_busy():
             channel.pause()
-            globals.paused_states[i] = True
+            paused_channels.append(channel)
     if globals.playback_start_time:
-        globals.paused_time = time.time() - globals.playback_start_time
+        engine = globals.mixer_engine
+        if engine is not None and engine.playing:
+            globals.paused_time = engine.heard_frame() / engine.frame_rate - globals.cursor_position
+        else:
+            globals.paused_time = time.time() - globals.playback_start_time
     globals.playback_start_time = None  # Stop updating current playback time
 
 def resume_audio():
     if globals.paused_time:
         globals.cursor_position += globals.paused_time
         globals.paused_time = None
-    for i, channel in enumerate(globals.channels):
-        if globals.paused_states[i]:
-            channel.unpause()
-            globals.paused_states[i] = False
+    if globals.mixer_engine is not None:
+        globals.mixer_engine.resume()
+    for channel in paused_channels:
+        channel.unpause()
+    paused_channels.clear()
     globals.playback_start_time = time.time()  # Resume updating current playback time
     globals.update_current_playback_time()
+    start_volume_meter_updates()
 
 def adjust_volume(channel_index, volume):
+    # Takes effect in the engine on the next mixed block
     volume = float(volume)
+    journal.record_volume(channel_index, float(globals.volume_levels[channel_index]), volume)
     globals.volume_levels[channel_index] = volume
-    globals.channels[channel_index].set_volume(volume)
+    if globals.mixer_engine is not None:
+        globals.mixer_engine.set_gain(channel_index, volume)
+    if channel_index < len(globals.channels):
+        globals.channels[channel_index].set_volume(volume)
+
+def adjust_pan(channel_index, pan):
+    pan = float(pan)
+    globals.pan_levels[channel_index] = pan
+    if globals.mixer_engine is not None:
+        globals.mixer_engine.set_pan(channel_index, pan)
+
+def set_track_muted(channel_index, muted):
+    globals.muted_tracks[channel_index] = bool(muted)
+    if globals.mixer_engine is not None:
+        globals.mixer_engine.set_muted(channel_index, bool(muted))
 
+def set_track_soloed(channel_index, soloed):
+    globals.soloed_tracks[channel_index] = bool(soloed)
+    if globals.mixer_engine is not None:
+        globals.mixer_engine.set_soloed(channel_index, bool(soloed))
+
+def set_track_effects(channel_index, chain):
+    globals.effect_chains[channel_index] = chain
+    if globals.mixer_engine is not None:
+        globals.mixer_engine.set_effects(channel_index, chain)
+
+def set_track_automation(channel_index, lane):
+    globals.automation_lanes[channel_index] = lane
+    if globals.mixer_engine is not None:
+        globals.mixer_engine.set_automation(channel_index, lane)
+
+MIN_LOOP_SECONDS = 0.1  # Longer than a mixer block
+
+def set_loop_region(start, end):
+    """
+    Loops Play All between start and end seconds; set_loop_region(None, None) turns looping off.
+    Takes effect on the next mixed block.
+    """
+    if start is not None:
+        if start < 0 or end - start < MIN_LOOP_SECONDS:
+            raise ValueError(f"The loop must start at 0 s or later and last at least {MIN_LOOP_SECONDS} s.")
+        globals.loop_region = (float(start), float(end))
+    else:
+        globals.loop_region = None
+    apply_loop_region()
+
+def apply_loop_region():
+    engine = globals.mixer_engine
+    if engine is None:
+        return
+    if globals.loop_region is None:
+        engine.set_loop(None, None)
+    else:
+        start, end = globals.loop_region
+        engine.set_loop(int(start * engine.frame_rate), int(end * engine.frame_rate))
+
+def add_track():
+    globals.set_track_count(globals.track_count + 1)
+
+def all_track_keys():
+    return [track_key(i) for i in range(len(globals.tracks))]
+
+@traced()
 def save_project():
     project_data = {
         "tracks": [],
-        "track_durations": globals.track_durations,
-        "volume_levels": globals.volume_levels,
+        "track_durations": globals.track_durations.tolist(),
+        "volume_levels": globals.volume_levels.tolist(),
         "grid_state": [[cell["active"] for cell in row] for row in grid_state],  # Save only `active` states
         "cursor_position": globals.cursor_position,
         "bpm": globals.bpm_var.get(),
+        "preserve_pitch": globals.preserve_pitch.tolist(),
+        "effects": [chain.to_list() for chain in globals.effect_chains],
+        "automation": [lane.to_list() for lane in globals.automation_lanes],
+        "loop_region": list(globals.loop_region) if globals.loop_region else None,
     }
+    track_file_paths = list(globals.track_file_paths)
     file_path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON Files", "*.json")])
-    if file_path:
+    if not file_path:
+        return None
+
+    def work(job):
         project_dir = os.path.splitext(file_path)[0]
-        try:
-            if not os.path.exists(project_dir):
-                os.makedirs(project_dir)
-            session_audios_src = globals.TEMP_DIR
-            session_audios_dst = os.path.join(project_dir, "session_audios")
-            if os.path.exists(session_audios_dst):
-                shutil.rmtree(session_audios_dst)
-            shutil.copytree(session_audios_src, session_audios_dst)
-            
-            for track_path in globals.track_file_paths:
-                if track_path:
-                    rel_path = os.path.relpath(track_path, session_audios_src)
-                    project_data["tracks"].append(rel_path)
-                else:
-                    project_data["tracks"].append(None)
-
-            json_file_path = os.path.join(project_dir, os.path.basename(file_path))
-            with open(json_file_path, "w") as f:
-                json.dump(project_data, f)
-            messagebox.showinfo("Save Project", "Project saved successfully!")
-        except Exception as e:
-            messagebox.showerror("Save Project", f"Failed to save project:\n{e}")
+        if not os.path.exists(project_dir):
+            os.makedirs(project_dir)
+        session_audios_src = globals.TEMP_DIR
+        session_audios_dst = os.path.join(project_dir, "session_audios")
+        job.report_progress(0.1, "Copying session audio")
+        if os.path.exists(session_audios_dst):
+            shutil.rmtree(session_audios_dst)
+        shutil.copytree(session_audios_src, session_audios_dst)
+
+        for track_path in track_file_paths:
+            if track_path:
+                rel_path = os.path.relpath(track_path, session_audios_src)
+                project_data["tracks"].append(rel_path)
+            else:
+                project_data["tracks"].append(None)
+
+        json_file_path = os.path.join(project_dir, os.path.basename(file_path))
+        with open(json_file_path, "w") as f:
+            json.dump(project_data, f)
 
+    def done(_):
+        messagebox.showinfo("Save Project", "Project saved successfully!")
 
+    def failed(e):
+        messagebox.showerror("Save Project", f"Failed to save project:\n{e}")
+
+    # Waits for pending edits so the saved files are the edited ones
+    return job_scheduler.submit("Saving project", work, keys=all_track_keys(), on_done=done, on_error=failed)
+
+
+@traced()
 def load_project():
     file_path = filedialog.askopenfilename(filetypes=[("JSON Files", "*.json")])
-    if file_path:
-        project_dir = os.path.dirname(file_path)
-        try:
-            with open(file_path, "r") as f:
-                project_data = json.load(f)
-            
-            session_audios_src = os.path.join(project_dir, "session_audios")
-            session_audios_dst = globals.TEMP_DIR
-            if os.path.exists(session_audios_dst):
-                shutil.rmtree(session_audios_dst)
-            shutil.copytree(session_audios_src, session_audios_dst)
-            
-            # Load track files and metadata
-            for i, rel_track_path in enumerate(project_data["tracks"]):
-                if rel_track_path:
-                    track_path = os.path.join(session_audios_dst, rel_track_path)
-                    load_audio(i, file_path=track_path)
-                else:
-                    globals.track_file_paths[i] = None
-                    globals.original_tracks[i] = None
-                    globals.tracks[i] = None
-                    globals.track_labels[i].config(text=f"Track {i + 1}")
-            
-            globals.track_durations = project_data.get("track_durations", [0.0] * 10)
-            globals.volume_levels = project_data.get("volume_levels", [1.0] * 10)
-            
-            # Restore volume levels
-            for i, volume in enumerate(globals.volume_levels):
-                globals.mixer_sliders[i].set(volume)
-                globals.channels[i].set_volume(volume)
-            
-            # Restore grid state
-            saved_grid_state = project_data["grid_state"]
-            for row in range(ROWS):
-                for col in range(COLUMNS):
-                    grid_state[row][col]["active"] = saved_grid_state[row][col]
-                    grid_state[row][col]["button"].configure(bg="blue" if saved_grid_state[row][col] else "white")
-            
-            # Restore playback details
-            globals.cursor_position = project_data.get("cursor_position", 0.0)
-            globals.bpm_var.set(project_data.get("bpm", 120))
-            globals.update_total_length()
-            
-            messagebox.showinfo("Load Project", "Project loaded successfully!")
-        except Exception as e:
-            messagebox.showerror("Load Project", f"Failed to load project:\n{e}")
+    if not file_path:
+        return None
+    project_dir = os.path.dirname(file_path)
+
+    def work(job):
+        with open(file_path, "r") as f:
+            project_data = json.load(f)
+
+        # Decode from the project folder first so a cancelled load leaves the session untouched
+        session_audios_src = os.path.join(project_dir, "session_audios")
+        session_audios_dst = globals.TEMP_DIR
+        decoded_tracks = []
+        for i, rel_track_path in enumerate(project_data["tracks"]):
+            job.report_progress(i / len(project_data["tracks"]), f"Decoding Track {i + 1}")
+            if rel_track_path:
+                decoded_tracks.append(read_track_file(os.path.join(session_audios_src, rel_track_path)))
+            else:
+                decoded_tracks.append(None)
+
+        job.report_progress(1.0, "Copying session audio")
+        if os.path.exists(session_audios_dst):
+            shutil.rmtree(session_audios_dst)
+        shutil.copytree(session_audios_src, session_audios_dst)
+        return project_data, decoded_tracks
+
+    def done(result):
+        with journal.suspended():
+            restore_project(*result)
+        # The history belongs to the previous session
+        journal.clear()
+        messagebox.showinfo("Load Project", "Project loaded successfully!")
+
+    def restore_project(project_data, decoded_tracks):
+        globals.set_track_count(len(project_data["tracks"]))
+        # Load track files and metadata
+        for i, rel_track_path in enumerate(project_data["tracks"]):
+            if rel_track_path:
+                track_path = os.path.join(globals.TEMP_DIR, rel_track_path)
+                set_track(i, track_path, *decoded_tracks[i])
+            else:
+                globals.track_file_paths[i] = None
+                globals.track_event_logs[i] = None
+                globals.original_tracks[i] = None
+                globals.tracks[i] = None
+                globals.track_durations[i] = 0.0
+                globals.track_labels[i].config(text=f"Track {i + 1}")
+
+        # Restore volume levels
+        for i, volume in enumerate(project_data.get("volume_levels", [])):
+            globals.mixer_sliders[i].set(volume)
+            adjust_volume(i, volume)
+
+        # Restore grid state
+        for row, saved_row in enumerate(project_data["grid_state"][:len(grid_state)]):
+            for col, active in enumerate(saved_row):
+                set_cell_active(row, col, active)
+
+        # Restore playback details
+        globals.cursor_position = project_data.get("cursor_position", 0.0)
+        globals.bpm_var.set(project_data.get("bpm", 120))
+        for i, preserve in enumerate(project_data.get("preserve_pitch", [])):
+            set_preserve_pitch(i, preserve)
+            globals.preserve_pitch_vars[i].set(preserve)
+        saved_effects = project_data.get("effects", [])
+        for i in range(globals.track_count):
+            set_track_effects(i, EffectChain.from_list(saved_effects[i] if i < len(saved_effects) else []))
+        saved_loop = project_data.get("loop_region")
+        set_loop_region(*(saved_loop or (None, None)))
+        globals.loop_var.set(bool(saved_loop))
+        if saved_loop:
+            for entry, seconds in zip((globals.loop_start_entry, globals.loop_end_entry), saved_loop):
+                entry.delete(0, "end")
+                entry.insert(0, f"{seconds:g}")
+        saved_automation = project_data.get("automation", [])
+        for i in range(globals.track_count):
+            set_track_automation(i, AutomationLane.from_list(saved_automation[i] if i < len(saved_automation) else []))
+        globals.update_total_length()
+
+    def failed(e):
+        messagebox.showerror("Load Project", f"Failed to load project:\n{e}")
 
+    return job_scheduler.submit("Loading project", work, keys=all_track_keys(), on_done=done, on_error=failed)
 
+
+@traced()
 def export_project_as_mp3():
-    total_duration_ms = INTERVAL_DURATION * COLUMNS * 1000  # Total duration in milliseconds
-    final_audio = AudioSegment.silent(duration=total_duration_ms)  # Initialize final audio with silence
-
-    for row in range(ROWS):
-        track = globals.tracks[row]
-        if track:
-            # Adjust volume according to the volume slider
-            volume_level = globals.volume_levels[row]
-            gain_db = 20 * math.log10(volume_level) if volume_level > 0 else -float('inf')
-            adjusted_track = track.apply_gain(gain_db)
-
-            # For each interval in the timeline
-            for col in range(COLUMNS):
-                cell = grid_state[row][col]
-                if cell["active"]:
-                    start_time_ms = col * INTERVAL_DURATION * 1000  # Start time of the interval
-                    segment_duration_ms = INTERVAL_DURATION * 1000   # Duration of the interval
-
-                    # Extract the segment from the beginning of the track
-                    segment = adjusted_track[:segment_duration_ms]
-
-                    # Pad the segment with silence if it's shorter than the interval
-                    if len(segment) < segment_duration_ms:
-                        segment += AudioSegment.silent(duration=(segment_duration_ms - len(segment)))
-
-                    # Overlay the segment onto the final audio at the correct position
-                    final_audio = final_audio.overlay(segment, position=start_time_ms)
-
-    if final_audio:
-        file_path = filedialog.asksaveasfilename(defaultextension=".mp3", filetypes=[("MP3 Files", "*.mp3")])
-        if file_path:
-            final_audio.export(file_path, format="mp3")
-            messagebox.showinfo("Export Project", "Project exported successfully")
-    else:
+    if not any(globals.tracks) and not any(log is not None for log in globals.track_event_logs):
         messagebox.showwarning("Export Project", "No tracks loaded to export")
+        return None
+    file_path = filedialog.asksaveasfilename(defaultextension=".mp3", filetypes=[("MP3 Files", "*.mp3")])
+    if not file_path:
+        return None
+    grid_active = [[cell["active"] for cell in row] for row in grid_state]
+    volume_levels = list(globals.volume_levels)
+    # Copies, so the export's effect state is separate from the one playing
+    saved_effects = [chain.to_list() for chain in globals.effect_chains]
+    saved_automation = [lane.to_list() for lane in globals.automation_lanes]
+
+    def work(job):
+        # Read the tracks when the job runs, after any pending edits on them have finished
+        tracks = [
+            event_log.render() if event_log is not None and track is None else track
+            for track, event_log in zip(globals.tracks, globals.track_event_logs)
+        ]
+        effect_chains = [EffectChain.from_list(effects) for effects in saved_effects]
+        automation_lanes = [AutomationLane.from_list(points) for points in saved_automation]
+        final_audio = mix_timeline(tracks, volume_levels, grid_active,
+                                   progress=lambda fraction: job.report_progress(fraction * 0.5, "Mixing"),
+                                   effect_chains=effect_chains, automation_lanes=automation_lanes)
+        job.report_progress(0.5, "Encoding MP3")
+        with span("audio_processing.encode_mp3"):
+            final_audio.export(file_path, format="mp3")
+
+    def done(_):
+        messagebox.showinfo("Export Project", "Project exported successfully")
+
+    def failed(e):
+        messagebox.showerror("Export Project", f"Failed to export project:\n{e}")
+
+    return job_scheduler.submit("Exporting project", work, keys=all_track_keys(), on_done=done, on_error=failed)
 
+@traced()
 def play_single_track(track_index):
+    render_event_log_tracks()
     track = globals.tracks[track_index]
     if track:
         try:
             sound = convert_to_pygame_sound(track)
-            globals.channels[track_index].stop()
-            globals.channels[track_index].play(sound)
-            globals.channels[track_index].set_volume(globals.volume_levels[track_index])
+            channel = globals.track_channel(track_index)
+            channel.stop()
+            channel.play(sound)
+            channel.set_volume(float(globals.volume_levels[track_index]))
         except Exception as e:
             messagebox.showerror("Play Track Error", f"Failed to play Track {track_index + 1}:\n{e}")
             print(f"Play Track Error: {e}")
@@ -0,0 +1,112 @@
+import numpy as np
+
+# Volume automation: a lane of (seconds, gain) breakpoints per track, on the session timeline.
+# Between breakpoints the gain moves linearly, before the first and after the last it holds. The
+# lane scales the track's fader, so the fader stays usable as an overall trim.
+#
+# A lane is turned into a per-frame gain envelope with one np.interp() over the frame times of
+# a block, so dense automation costs the same as a single ramp. The mixer engine does this for
+# every block it plays; mixdown does it in chunks of ENVELOPE_CHUNK frames, so an envelope is
+# never allocated for the whole session.
+
+ENVELOPE_CHUNK = 65536
+MAX_GAIN = 1.0
+
+
+class AutomationLane:
+    """
+    Breakpoints are kept as two sorted arrays, replaced on every edit so the engine thread
+    always reads a consistent pair.
+    """
+
+    def __init__(self, points=()):
+        self._set(points)
+
+    def _set(self, points):
+        points = sorted((float(time), min(MAX_GAIN, max(0.0, float(value)))) for time, value in points)
+        self.points = (np.array([time for time, _ in points], dtype=np.float64),
+                       np.array([value for _, value in points], dtype=np.float32))
+
+    def __bool__(self):
+        return bool(len(self.points[0]))
+
+    def __len__(self):
+        return len(self.points[0])
+
+    def add_point(self, time, value):
+        # A new point at the time of an existing one replaces it
+        times, values = self.points
+        self._set([(t, v) for t, v in zip(times, values) if t != time] + [(time, value)])
+
+    def remove_point(self, index):
+        times, values = self.points
+        self._set([(t, v) for n, (t, v) in enumerate(zip(times, values)) if n != index])
+
+    def clear(self):
+        self._set(())
+
+    def value_at(self, time):
+        times, values = self.points
+        return float(np.interp(time, times, values)) if len(times) else 1.0
+
+    def envelope(self, start_frame, frames, frame_rate, offsets=None):
+        """
+        Returns the float32 gain of each of `frames` frames from start_frame. offsets, if given,
+        is a precomputed frame_offsets(frames, frame_rate).
+        """
+        times, values = self.points
+        if offsets is None:
+            offsets = frame_offsets(frames, frame_rate)
+        offsets = offsets[:frames]
+        start_time = start_frame / frame_rate
+        end_time = start_time + float(offsets[-1])
+        first, last = np.searchsorted(times, (start_time, end_time), side="right")
+        if first == last:
+            # No breakpoint inside, the usual case: the envelope is one straight line across the block
+            start_value = float(np.interp(start_time, times, values))
+            end_value = float(np.interp(end_time, times, values))
+            if start_value == end_value:
+                return np.full(frames, start_value, dtype=np.float32)
+            envelope = offsets * np.float32((end_value - start_value) / (end_time - start_time))
+            envelope += np.float32(start_value)
+            return envelope
+        return np.interp(offsets.astype(np.float64) + start_time, times, values).astype(np.float32)
+
+    def to_list(self):
+        times, values = self.points
+        return [[float(time), float(value)] for time, value in zip(times, values)]
+
+    @classmethod
+    def from_list(cls, data):
+        return cls(data or [])
+
+
+def frame_offsets(frames, frame_rate):
+    return (np.arange(frames) / frame_rate).astype(np.float32)
+
+
+def apply_envelope(block, envelope):
+    # Channel by channel: broadcasting a (frames x 1) envelope over interleaved frames is several times slower
+    for channel in range(block.shape[1]):
+        np.multiply(block[:, channel], envelope, out=block[:, channel])
+
+
+def mix_automated(target, source, position, lane, frame_rate, gain=1.0):
+    """
+    Adds source into target (both frames x channels) at frame `position`, scaled by gain and by
+    the lane's envelope over the frames it lands on. Whatever runs past target is dropped.
+    """
+    end = min(len(target), position + len(source))
+    chunk = min(ENVELOPE_CHUNK, max(0, end - position))
+    offsets = frame_offsets(chunk, frame_rate)
+    scratch = np.empty(chunk, dtype=np.float32)
+    for start in range(position, end, ENVELOPE_CHUNK):
+        stop = min(end, start + ENVELOPE_CHUNK)
+        envelope = lane.envelope(start, stop - start, frame_rate, offsets)
+        if gain != 1.0:
+            envelope *= np.float32(gain)
+        scaled = scratch[:stop - start]
+        for channel in range(target.shape[1]):
+            np.multiply(source[start - position:stop - position, channel], envelope, out=scaled)
+            np.add(target[start:stop, channel], scaled, out=target[start:stop, channel])
+    return target
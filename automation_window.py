@@ -0,0 +1,75 @@
+import tkinter as tk
+from tkinter import ttk
+import globals
+from mixdown import COLUMNS, INTERVAL_DURATION
+
+CANVAS_WIDTH = 800
+CANVAS_HEIGHT = 200
+POINT_RADIUS = 4
+PICK_DISTANCE = 8  # Pixels within which a right click removes a point
+
+
+def open_automation_window(track_index):
+    """
+    Edits the volume automation of one track: click to add a breakpoint, right-click one to remove it.
+    """
+    lane = globals.automation_lanes[track_index]
+    auto_window = tk.Toplevel()
+    auto_window.title(f"Track {track_index + 1} Volume Automation")
+
+    # The lane covers the exported timeline, or the longest track if Play All runs longer
+    session_seconds = max(COLUMNS * INTERVAL_DURATION, float(globals.track_durations.max()) if globals.track_count else 0)
+
+    canvas = tk.Canvas(auto_window, width=CANVAS_WIDTH, height=CANVAS_HEIGHT, bg="white")
+    canvas.pack(padx=10, pady=10)
+    position_var = tk.StringVar(value="No automation: the track plays at its fader volume")
+    ttk.Label(auto_window, textvariable=position_var).pack()
+
+    def to_x(seconds):
+        return seconds / session_seconds * CANVAS_WIDTH
+
+    def to_y(gain):
+        return (1 - gain) * CANVAS_HEIGHT
+
+    def redraw():
+        canvas.delete("all")
+        for col in range(1, COLUMNS):
+            x = to_x(col * INTERVAL_DURATION)
+            canvas.create_line(x, 0, x, CANVAS_HEIGHT, fill="gray85")
+        points = lane.to_list()
+        if not points:
+            return
+        coords = [0, to_y(points[0][1])]
+        for seconds, gain in points:
+            coords += [to_x(seconds), to_y(gain)]
+        coords += [CANVAS_WIDTH, to_y(points[-1][1])]
+        canvas.create_line(*coords, fill="blue", width=2)
+        for seconds, gain in points:
+            x, y = to_x(seconds), to_y(gain)
+            canvas.create_oval(x - POINT_RADIUS, y - POINT_RADIUS, x + POINT_RADIUS, y + POINT_RADIUS, fill="blue")
+
+    def add_point(event):
+        seconds = max(0.0, min(session_seconds, event.x / CANVAS_WIDTH * session_seconds))
+        gain = max(0.0, min(1.0, 1 - event.y / CANVAS_HEIGHT))
+        lane.add_point(round(seconds, 3), round(gain, 3))
+        position_var.set(f"{seconds:.2f} s: {gain * 100:.0f}%")
+        redraw()
+
+    def remove_point(event):
+        nearest = None
+        for index, (seconds, gain) in enumerate(lane.to_list()):
+            distance = ((to_x(seconds) - event.x) ** 2 + (to_y(gain) - event.y) ** 2) ** 0.5
+            if distance <= PICK_DISTANCE and (nearest is None or distance < nearest[1]):
+                nearest = (index, distance)
+        if nearest is not None:
+            lane.remove_point(nearest[0])
+            redraw()
+
+    def clear():
+        lane.clear()
+        redraw()
+
+    canvas.bind("<Button-1>", add_point)
+    canvas.bind("<Button-3>", remove_point)
+    ttk.Button(auto_window, text="Clear", command=clear).pack(pady=5)
+    redraw()
@@ -0,0 +1,415 @@
+import os
+
+# Must be set before globals.init_mixer() opens the audio device
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import json
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from tkinter import filedialog, messagebox
+
+import globals
+import audio_processing
+import equalizer
+from event_log import EventLog
+from audio_buffer import AudioBuffer
+from wav_file import write_wav
+from track_timeline import grid_state
+from automation import AutomationLane
+from mixdown import COLUMNS, INTERVAL_DURATION, mix_timeline
+
+globals.init_mixer()
+
+# Benchmarks for the audio hot paths. Runs without a window, dialogs or sound card:
+#   python benchmark.py --output results.json --baseline benchmark_baseline.json
+# A case whose median is slower than baseline * tolerance, or whose peak allocation is larger than
+# baseline * memory tolerance, is reported as a regression and the script exits with status 1.
+# Cases can also set fixed memory limits, checked before any baseline comparison or save, so a
+# baseline re-recorded after a regression can't hide it.
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+FRAME_RATE = 44100
+LONG_TRACK_SECONDS = 20 * 60  # 212 MB as 16-bit stereo WAV
+MAPPED_LOAD_LIMIT_BYTES = 16 * 2 ** 20
+
+BENCHMARKS = {}
+LIMITS = {}  # Case -> {"peak_bytes": limit, "peak_resident_bytes": limit}
+
+
+def benchmark(name, **limits):
+    def register(func):
+        BENCHMARKS[name] = func
+        LIMITS[name] = limits
+        return func
+    return register
+
+
+class NullWidget:
+    # Stands in for the Tk labels/sliders the audio code updates
+    def config(self, **kwargs):
+        pass
+
+    configure = config
+
+    def set(self, value):
+        pass
+
+
+class Value:
+    # Stands in for a Tk variable such as globals.bpm_var
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+
+def make_track(seconds, channels, frame_rate=FRAME_RATE, seed=0):
+    """
+    Synthetic track: a few partials plus noise, so filters and codecs have real work to do.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * frame_rate)) / frame_rate
+    signal = 0.3 * np.sin(2 * np.pi * 110 * t) + 0.2 * np.sin(2 * np.pi * 880 * t) + 0.1 * np.sin(2 * np.pi * 6000 * t)
+    frames = np.empty((len(t), channels), dtype=np.float64)
+    for channel in range(channels):
+        frames[:, channel] = signal + 0.05 * rng.standard_normal(len(t))
+    return AudioBuffer(np.clip(frames, -1, 1), frame_rate)
+
+
+def make_take(sample_paths, seconds, velocities):
+    # One hit every 125 ms (16th notes at 120 BPM), cycling through the samples
+    take = EventLog()
+    for i, timestamp in enumerate(range(0, int(seconds * 1000), 125)):
+        take.append(sample_paths[i % len(sample_paths)], velocities[i % len(velocities)], timestamp)
+    return take
+
+
+def install_headless_ui(work_dir, track_count):
+    globals.TEMP_DIR = work_dir
+    globals.track_labels = [NullWidget() for _ in range(track_count)]
+    globals.mixer_sliders = [NullWidget() for _ in range(track_count)]
+    globals.bpm_var = Value(120)
+
+    def fail(title=None, message=None, **kwargs):
+        raise RuntimeError(f"{title}: {message}")
+
+    messagebox.showinfo = lambda *args, **kwargs: None
+    messagebox.showwarning = fail
+    messagebox.showerror = fail
+    filedialog.asksaveasfilename = lambda *args, **kwargs: os.path.join(work_dir, "export" + kwargs.get("defaultextension", ""))
+    filedialog.askopenfilename = lambda *args, **kwargs: ""
+
+
+def set_tracks(tracks):
+    for i in range(len(globals.tracks)):
+        track = tracks[i] if i < len(tracks) else None
+        globals.tracks[i] = track
+        globals.original_tracks[i] = track
+        globals.track_event_logs[i] = None
+        audio_processing.applied_speeds[i] = None
+
+
+@benchmark("load_audio")
+def bench_load_audio(ctx):
+    return lambda: audio_processing.load_audio(0, file_path=ctx["track_path"])
+
+
+@benchmark("load_long_audio", peak_bytes=MAPPED_LOAD_LIMIT_BYTES, peak_resident_bytes=MAPPED_LOAD_LIMIT_BYTES)
+def bench_load_long_audio(ctx):
+    # A long stem is mapped, not read: loading it must cost neither time nor memory in
+    # proportion to its length
+    path = os.path.join(ctx["work_dir"], "long_track.wav")
+    block = make_track(10, 2).to_pcm()
+    write_wav(path, (block for _ in range(LONG_TRACK_SECONDS // 10)), FRAME_RATE, 2, 2)
+    return lambda: audio_processing.load_audio(0, file_path=path)
+
+
+@benchmark("convert_to_pygame_sound")
+def bench_convert_to_pygame_sound(ctx):
+    return lambda: audio_processing.convert_to_pygame_sound(ctx["track"])
+
+
+@benchmark("change_speed")
+def bench_change_speed(ctx):
+    return lambda: audio_processing.change_speed(ctx["track"], 1.25)
+
+
+@benchmark("time_stretch")
+def bench_time_stretch(ctx):
+    # Same tempo change as change_speed, but keeping the pitch
+    return lambda: audio_processing.change_speed(ctx["track"], 1.25, preserve_pitch=True)
+
+
+@benchmark("apply_bpm_change")
+def bench_apply_bpm_change(ctx):
+    def run():
+        set_tracks(ctx["tracks"])
+        globals.bpm_var.set(150)
+        audio_processing.apply_bpm_change()
+    return run
+
+
+@benchmark("apply_equalizer")
+def bench_apply_equalizer(ctx):
+    track = ctx["track"]
+    bands = {"low": 6.0, "mid": -3.0, "high": 4.0}
+    return lambda: equalizer.apply_equalizer(track.samples, track.frame_rate, bands)
+
+
+@benchmark("mix_automation")
+def bench_mix_automation(ctx):
+    # Every grid cell on, and a volume breakpoint every 10 ms on every track
+    tracks = ctx["tracks"]
+    seconds = COLUMNS * INTERVAL_DURATION
+    lanes = [AutomationLane((n / 100, 0.5 + 0.5 * np.sin(n / 25 + i)) for n in range(seconds * 100))
+             for i in range(len(tracks))]
+    grid = [[True] * COLUMNS for _ in tracks]
+    return lambda: mix_timeline(tracks, [1.0] * len(tracks), grid, automation_lanes=lanes)
+
+
+@benchmark("export_project_as_mp3")
+def bench_export_project_as_mp3(ctx):
+    if not shutil.which("ffmpeg"):
+        return None  # MP3 encoding needs ffmpeg
+
+    def run():
+        set_tracks(ctx["tracks"])
+        for row in grid_state:
+            for cell in row:
+                cell["active"] = True
+        audio_processing.export_project_as_mp3()
+    return run
+
+
+@benchmark("drumpad_save_audio")
+def bench_drumpad_save_audio(ctx):
+    output = os.path.join(ctx["work_dir"], "drums.wav")
+    return lambda: make_take(ctx["drum_samples"], ctx["seconds"], [127]).render().export(output, format="wav")
+
+
+@benchmark("keyboard_save_audio")
+def bench_keyboard_save_audio(ctx):
+    output = os.path.join(ctx["work_dir"], "keys.wav")
+    velocities = [40, 64, 90, 127]
+    return lambda: make_take(ctx["piano_samples"], ctx["seconds"], velocities).render().export(output, format="wav")
+
+
+def prepare_context(work_dir, seconds, channels, track_count):
+    track = make_track(seconds, channels)
+    track_path = os.path.join(work_dir, "track.wav")
+    track.export(track_path, format="wav")
+
+    def write_samples(prefix, count, sample_seconds):
+        paths = []
+        for i in range(count):
+            path = os.path.join(work_dir, f"{prefix}_{i}.wav")
+            make_track(sample_seconds, 2, seed=i + 1).export(path, format="wav")
+            paths.append(path)
+        return paths
+
+    return {
+        "work_dir": work_dir,
+        "seconds": seconds,
+        "track": track,
+        "track_path": track_path,
+        "tracks": [make_track(seconds, channels, seed=i) for i in range(track_count)],
+        "drum_samples": write_samples("pad", 4, 0.3),
+        "piano_samples": write_samples("note", 12, 1.5),
+    }
+
+
+def measure_peak(run):
+    """
+    Runs a case once under tracemalloc and returns the most memory it had allocated at once.
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        run()
+        return tracemalloc.get_traced_memory()[1] - before
+    finally:
+        if started:
+            tracemalloc.stop()
+
+
+def resident_bytes(field):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) * 1024
+    return None
+
+
+def measure_peak_resident(run):
+    """
+    Runs a case once and returns how far its resident memory rose above where it started, or None
+    where the kernel can't report it. Counts what tracemalloc can't see, such as mapped pages read.
+    """
+    try:
+        # Resets the process's resident high-water mark (Linux only)
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        before = resident_bytes("VmRSS")
+    except OSError:
+        return None
+    run()
+    return resident_bytes("VmHWM") - before
+
+
+def run_benchmarks(names, seconds, channels, track_count, repeat):
+    results = {}
+    work_dir = tempfile.mkdtemp(prefix="groove_bench_")
+    try:
+        install_headless_ui(work_dir, len(globals.tracks))
+        ctx = prepare_context(work_dir, seconds, channels, track_count)
+        for name in names:
+            run = BENCHMARKS[name](ctx)
+            if run is None:
+                print(f"{name:28s} skipped")
+                continue
+            run()  # Warm-up: first-call imports and caches shouldn't count
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - start)
+            # Separate from the timed runs: tracemalloc slows allocation down a lot
+            peak_bytes = measure_peak(run)
+            peak_resident_bytes = measure_peak_resident(run)
+            results[name] = {
+                "median_s": statistics.median(timings),
+                "min_s": min(timings),
+                "max_s": max(timings),
+                "repeat": repeat,
+                "peak_bytes": peak_bytes,
+            }
+            if peak_resident_bytes is not None:
+                results[name]["peak_resident_bytes"] = peak_resident_bytes
+            print(f"{name:28s} median {results[name]['median_s'] * 1000:10.2f} ms   min {results[name]['min_s'] * 1000:10.2f} ms"
+                  f"   peak {peak_bytes / 2 ** 20:8.1f} MB")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def check_limits(report):
+    """
+    Returns the cases over one of their fixed memory limits as (name, ratio, what), where ratio is
+    the measurement over the limit.
+    """
+    regressions = []
+    for name, result in report["results"].items():
+        for field, limit in LIMITS.get(name, {}).items():
+            if field in result and result[field] > limit:
+                print(f"{name:28s} {field} {result[field] / 2 ** 20:.1f} MB, limit {limit / 2 ** 20:.1f} MB  REGRESSION")
+                regressions.append((name, result[field] / limit, field))
+    return regressions
+
+
+def report_regressions(regressions):
+    print("\nPERFORMANCE REGRESSION:")
+    for name, ratio, what in regressions:
+        if what == "slower":
+            print(f"  {name} is {ratio:.2f}x slower than the baseline")
+        elif what == "more memory":
+            print(f"  {name} allocates {ratio:.2f}x the baseline peak memory")
+        else:
+            print(f"  {name} is {ratio:.2f}x over its {what} limit")
+
+
+def compare_to_baseline(report, baseline, tolerance, memory_tolerance):
+    """
+    Returns the list of regressions as (name, ratio, what): cases whose median exceeds the baseline
+    median * tolerance, or whose peak allocation exceeds the baseline peak * memory_tolerance.
+    """
+    regressions = []
+    for name, result in report["results"].items():
+        base = baseline["results"].get(name)
+        if not base:
+            print(f"{name:28s} no baseline")
+            continue
+        ratio = result["median_s"] / base["median_s"] if base["median_s"] else float("inf")
+        status = "REGRESSION" if ratio > tolerance else "ok"
+        print(f"{name:28s} {ratio:6.2f}x baseline  {status}")
+        if ratio > tolerance:
+            regressions.append((name, ratio, "slower"))
+        # Baselines recorded before peak memory was measured have no peak_bytes
+        if base.get("peak_bytes") and "peak_bytes" in result:
+            memory_ratio = result["peak_bytes"] / base["peak_bytes"]
+            status = "REGRESSION" if memory_ratio > memory_tolerance else "ok"
+            print(f"{'':28s} {memory_ratio:6.2f}x baseline peak memory  {status}")
+            if memory_ratio > memory_tolerance:
+                regressions.append((name, memory_ratio, "more memory"))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Groove Window audio hot paths")
+    parser.add_argument("--seconds", type=float, default=30.0, help="Length of the synthetic tracks")
+    parser.add_argument("--channels", type=int, default=2, help="Channel count of the synthetic tracks")
+    parser.add_argument("--tracks", type=int, default=4, help="Tracks used by apply_bpm_change and export")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="Run only these cases")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=1.5,
+                        help="Fail when a median is more than this many times the baseline (default: 1.5)")
+    parser.add_argument("--memory-tolerance", type=float, default=1.25,
+                        help="Fail when a peak allocation is more than this many times the baseline (default: 1.25)")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    args = parser.parse_args(argv)
+
+    params = {"seconds": args.seconds, "channels": args.channels, "tracks": args.tracks}
+    results = run_benchmarks(args.only or list(BENCHMARKS), args.seconds, args.channels, args.tracks, args.repeat)
+    report = {
+        "params": params,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    regressions = check_limits(report)
+    if regressions:
+        report_regressions(regressions)
+        return 1
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one.")
+        return 0
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+    if baseline.get("params") != params:
+        print(f"Baseline was recorded with {baseline.get('params')}, not {params}; not comparing.")
+        return 2
+
+    regressions = compare_to_baseline(report, baseline, args.tolerance, args.memory_tolerance)
+    if regressions:
+        report_regressions(regressions)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,88 +1,133 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-from pydub import AudioSegment
 import pygame
 import time
 import os
+import threading
+import numpy as np
 import globals
+from event_log import EventLog, resolve_sample_path
+from step_sequencer import StepSequencer, STEPS_PER_BEAT
+from tracing import traced
+import sample_library
+import memory_accounting
+
+# Pad bank shared by the window and hardware pad input (pad 1 is index 0). Each pad plays the
+# samples of one sample library category (folder); the name -> path maps are filled from the index
+pads = [
+    ("Hi Hat", "hihat", {}),
+    ("Snare", "snare", {}),
+    ("Kick", "kick", {}),
+    ("Open Hat", "openhat", {}),
+]
+selected_sounds = [None] * len(pads)  # Sample path chosen for each pad
+loaded_sounds = {}  # Sample path -> pygame Sound, decoded once instead of on every hit
+memory_accounting.register("drum pad samples", lambda: ((None, sound) for sound in list(loaded_sounds.values())))
+
+# Hits are recorded from the Tk thread and from the serial dispatch thread; recording_lock guards
+# the recording state and every append
+recording_lock = threading.Lock()
+is_recording = False
+recorded_notes = EventLog()
+recording_start_time = 0
+
+
+def load_pad_sounds():
+    # Only the app's own pad folders: a "kick" folder in a shared library is not a pad bank
+    for _, category, sound_mapping in pads:
+        sound_mapping.clear()
+        for name, path in sample_library.samples_in(category, root=sample_library.DRUMPAD_DIR):
+            # "KICK - AMP" is listed as "AMP"
+            sound_mapping[name.split(" - ", 1)[-1]] = sample_library.app_relative_path(path)
+
+
+def get_pad_sound(sound_path):
+    sound = loaded_sounds.get(sound_path)
+    if sound is None:
+        sound = pygame.mixer.Sound(resolve_sample_path(sound_path))
+        loaded_sounds[sound_path] = sound
+    return sound
+
+
+def pad_sample_frames(sound_path):
+    # The pad's Sound is already decoded in the engine format, so the sequencer renders from it
+    pcm = pygame.sndarray.array(get_pad_sound(sound_path)).reshape((-1, pygame.mixer.get_init()[2]))
+    return pcm.astype(np.float32) / 32768
+
+
+sequencer = StepSequencer(len(pads), pad_sample_frames)
+memory_accounting.register("step sequencer", sequencer.buffers)
+
+
+@traced()
+def trigger_pad(pad_index, velocity=127, hit_time=None):
+    """
+    Plays the sample selected for a pad and records the hit if recording is on.
+    Does not touch Tk, so it can be called from the serial reader thread.
+    Returns the sample path that was played, or None if the pad has no sample.
+    """
+    if not 0 <= pad_index < len(pads):
+        return None
+    sound_path = selected_sounds[pad_index]
+    if not sound_path:
+        return None
+    channel = get_pad_sound(sound_path).play()
+    if channel:
+        channel.set_volume(velocity / 127.0)
+    with recording_lock:
+        if is_recording:
+            if hit_time is None:
+                hit_time = time.time()
+            recorded_notes.append(sound_path, velocity, int((hit_time - recording_start_time) * 1000))
+    return sound_path
+
 
 def open_drumpad_window():
+    # On the first run the window opens once the pad folders are indexed
+    sample_library.when_indexed(sample_library.DRUMPAD_DIR, build_drumpad_window)
+
+
+def build_drumpad_window():
     # Don't need to initialize pygame.mixer here if it's already initialized in globals.py
     # pygame.mixer.init()
 
-    # Map sound paths to the sounds for the drum
-    hi_hat_sounds = {
-        "CHAIN": "Sounds_Drumpad/hihat/HI HAT - CHAIN.wav",
-        "CHROME": "Sounds_Drumpad/hihat/HI HAT - CHROME.wav",
-        "FLEXX": "Sounds_Drumpad/hihat/HI HAT - FLEXX.wav",
-        "MONEYBAGG": "Sounds_Drumpad/hihat/HI HAT - MONEYBAGG.wav",
-        "ZAY": "Sounds_Drumpad/hihat/HI HAT - ZAY.wav",
-    }
-
-    snare_sounds = {
-        "88": "Sounds_Drumpad/snare/SNARE - 88.wav",
-        "CLEAN": "Sounds_Drumpad/snare/SNARE - CLEAN.wav",
-        "DARK": "Sounds_Drumpad/snare/SNARE - DARK.wav",
-        "HEAVY": "Sounds_Drumpad/snare/SNARE - HEAVY.wav",
-        "SANGUINE": "Sounds_Drumpad/snare/SNARE - SANGUINE.wav",
-    }
-
-    kick_sounds = {
-        "AMP": "Sounds_Drumpad/kick/KICK - AMP.wav",
-        "DRIZZY": "Sounds_Drumpad/kick/KICK - DRIZZY.wav",
-        "DRONE": "Sounds_Drumpad/kick/KICK - DRONE.wav",
-        "SAVE ME": "Sounds_Drumpad/kick/KICK - SAVE ME.wav",
-        "SOUTHSIDE": "Sounds_Drumpad/kick/KICK - SOUTHSIDE.wav",
-    }
-
-    open_hat_sounds = {
-        "CHARGE": "Sounds_Drumpad/openhat/OPEN HAT - CHARGE.wav",
-        "COOLER": "Sounds_Drumpad/openhat/OPEN HAT - COOLER.wav",
-        "HYPER": "Sounds_Drumpad/openhat/OPEN HAT - HYPER.wav",
-        "RITA": "Sounds_Drumpad/openhat/OPEN HAT - RITA.wav",
-        "SIMPLE": "Sounds_Drumpad/openhat/OPEN HAT - SIMPLE.wav",
-    }
-
-    is_recording = False
-    recorded_notes = []
-    start_time = 0
-    timer_update = None 
-
-    # Function to play a sound 
-    def play_sound(selected_option, sound_mapping):
-        nonlocal is_recording, recorded_notes, start_time
-        if selected_option and selected_option != "Select a sound":
-            sound_path = sound_mapping.get(selected_option)
-            if sound_path:
-                try:
-                    pygame.mixer.Sound(sound_path).play()
-                    if is_recording:
-                        timestamp = int((time.time() - start_time) * 1000)
-                        recorded_notes.append((sound_path, timestamp))
-                        print(f"Recorded: {selected_option} at {timestamp} ms")
-                except pygame.error as e:
-                    print(f"Error playing sound: {e}")
-            else:
-                print(f"Sound file for {selected_option} not found.")
-        else:
+    timer_update = None
+    serial_input = None
+    load_pad_sounds()
+
+    # Function to play a sound
+    def play_sound(pad_index):
+        if not selected_sounds[pad_index]:
             print("No sound selected.")
+            return
+        try:
+            sound_path = trigger_pad(pad_index)
+            with recording_lock:
+                if is_recording and recorded_notes:
+                    print(f"Recorded: {os.path.basename(sound_path)} at {recorded_notes.timestamps[-1]} ms")
+        except pygame.error as e:
+            print(f"Error playing sound: {e}")
 
     # Function to start recording
     def start_recording():
-        nonlocal is_recording, start_time, recorded_notes
-        if is_recording:
-            return  
-        is_recording = True
-        recorded_notes = []
-        start_time = time.time()
+        global is_recording, recording_start_time, recorded_notes
+        with recording_lock:
+            if is_recording:
+                return
+            recorded_notes = EventLog()
+            recording_start_time = time.time()
+            is_recording = True
         print("Recording started")
         update_timer()  # Start the stopwatch
 
     # Function to stop recording
     def stop_recording():
-        nonlocal is_recording, timer_update
-        if is_recording:
+        global is_recording
+        nonlocal timer_update
+        with recording_lock:
+            was_recording = is_recording
             is_recording = False
+        if was_recording:
             print("Recording stopped")
             if timer_update:
                 window.after_cancel(timer_update)
@@ -93,7 +138,7 @@ def open_drumpad_window():
     def update_timer():
         nonlocal timer_update
         if is_recording:
-            elapsed_time = time.time() - start_time
+            elapsed_time = time.time() - recording_start_time
             minutes = int(elapsed_time) // 60
             seconds = int(elapsed_time) % 60
             timer_label.config(text=f"Recording Time: {minutes}:{seconds:02d}")
@@ -102,34 +147,23 @@ def open_drumpad_window():
             timer_label.config(text="Recording Time: 0:00")
 
     # Function to save the recording
+    @traced("drumpad_window.save_audio")
     def save_audio():
         if not recorded_notes:
             messagebox.showwarning("No Recording", "No sounds have been recorded.")
             return
 
-        max_timestamp = max(timestamp for _, timestamp in recorded_notes)
-        output_duration = max_timestamp + 1000 
-
-        output_audio = AudioSegment.silent(duration=output_duration)
-
-        for sound_path, timestamp in recorded_notes:
-            if os.path.exists(sound_path):
-                sound = AudioSegment.from_file(sound_path)
-                output_audio = output_audio.overlay(sound, position=timestamp)
-            else:
-                print(f"Sound file {sound_path} not found.")
-
         # Ask user to enter a filename
         file_name = filedialog.asksaveasfilename(
             initialdir=globals.TEMP_DIR,
-            defaultextension=".wav",
-            filetypes=[("WAV files", "*.wav")],
+            defaultextension=".mid",
+            filetypes=[("MIDI files", "*.mid"), ("WAV files", "*.wav")],
             title="Save Recording As"
         )
 
         if file_name:
-            if not file_name.lower().endswith(".wav"):
-                file_name += ".wav"
+            if not file_name.lower().endswith((".mid", ".wav")):
+                file_name += ".mid"
 
             file_path = file_name
 
@@ -139,8 +173,12 @@ def open_drumpad_window():
                 if not overwrite:
                     return
 
-            # Ensure standard format
-            output_audio.export(file_path, format="wav", parameters=["-ar", "44100", "-ac", "2"])
+            if file_path.lower().endswith(".mid"):
+                # Store only the hits; the track renders them when it is played or exported
+                recorded_notes.save_midi(file_path)
+            else:
+                # Ensure standard format
+                recorded_notes.render().export(file_path, format="wav", parameters=["-ar", "44100", "-ac", "2"])
 
             messagebox.showinfo("Recording Saved",
                                 f"Recording saved as '{os.path.basename(file_path)}' in the Session Audios folder.\n\n"
@@ -149,35 +187,40 @@ def open_drumpad_window():
     ## GUI setup
     window = tk.Toplevel()
     window.title("Drum Pad Recorder")
-    window.geometry("800x800")
+    window.geometry("800x1000")
 
     # Create virtual drum pads
-    def create_drumpad(frame, drumpad_number, label_text, sound_mapping):
+    def create_drumpad(frame, pad_index):
+        label_text, _, sound_mapping = pads[pad_index]
         selected_option = tk.StringVar(value="Select a sound")
-        label = tk.Label(frame, text=f"Drumpad {drumpad_number}: {label_text}", font=("Arial", 14, "bold"))
+        for name, sound_path in sound_mapping.items():
+            if sound_path == selected_sounds[pad_index]:
+                selected_option.set(name)
+
+        def on_select(*_):
+            selected_sounds[pad_index] = sound_mapping.get(selected_option.get())
+            sequencer.set_sample(pad_index, selected_sounds[pad_index])
+
+        selected_option.trace_add("write", on_select)
+        label = tk.Label(frame, text=f"Drumpad {pad_index + 1}: {label_text}", font=("Arial", 14, "bold"))
         label.pack(pady=(10, 5))
         dropdown = ttk.Combobox(frame, values=list(sound_mapping.keys()), state="readonly", textvariable=selected_option, font=("Arial", 12))
         dropdown.pack(pady=(0, 10))
-        play_button = tk.Button(frame, text="Select and Play Sound", command=lambda: play_sound(selected_option.get(), sound_mapping))
+        play_button = tk.Button(frame, text="Select and Play Sound", command=lambda: play_sound(pad_index))
         play_button.pack(pady=(0, 10))
         return selected_option
 
     frame = tk.Frame(window)
     frame.pack(pady=20)
 
-    selected_hi_hat = create_drumpad(frame, 1, "Hi Hat", hi_hat_sounds)
-    selected_snare = create_drumpad(frame, 2, "Snare", snare_sounds)
-    selected_kick = create_drumpad(frame, 3, "Kick", kick_sounds)
-    selected_open_hat = create_drumpad(frame, 4, "Open Hat", open_hat_sounds)
+    selected_options = [create_drumpad(frame, pad_index) for pad_index in range(len(pads))]
 
     # Virtual drum pads
     virtual_frame = tk.Frame(window)
     virtual_frame.pack(pady=20)
 
-    tk.Button(virtual_frame, text="Hi Hat", command=lambda: play_sound(selected_hi_hat.get(), hi_hat_sounds)).pack(side=tk.LEFT, padx=10)
-    tk.Button(virtual_frame, text="Snare", command=lambda: play_sound(selected_snare.get(), snare_sounds)).pack(side=tk.LEFT, padx=10)
-    tk.Button(virtual_frame, text="Kick", command=lambda: play_sound(selected_kick.get(), kick_sounds)).pack(side=tk.LEFT, padx=10)
-    tk.Button(virtual_frame, text="Open Hat", command=lambda: play_sound(selected_open_hat.get(), open_hat_sounds)).pack(side=tk.LEFT, padx=10)
+    for pad_index, (label_text, _, _) in enumerate(pads):
+        tk.Button(virtual_frame, text=label_text, command=lambda p=pad_index: play_sound(p)).pack(side=tk.LEFT, padx=10)
 
     # Recording controls
     recording_frame = tk.Frame(window)
@@ -191,23 +234,148 @@ def open_drumpad_window():
     timer_label = tk.Label(window, text="Recording Time: 0:00", font=("Arial", 12))
     timer_label.pack(pady=10)
 
+    # Step sequencer: one bar of 16th notes per pad, looped at the session BPM
+    sequencer_frame = tk.Frame(window)
+    sequencer_frame.pack(pady=10)
+    playhead_update = None
+    step_buttons = []
+    for i, path in enumerate(selected_sounds):
+        sequencer.set_sample(i, path)
+
+    def toggle_step(pad_index, step):
+        try:
+            velocity = sequencer.toggle_step(pad_index, step)
+        except pygame.error as e:
+            messagebox.showerror("Step Sequencer", f"Failed to render the loop:\n{e}")
+            return
+        step_buttons[pad_index][step].config(bg="blue" if velocity else "white")
+
+    for pad_index, (label_text, _, _) in enumerate(pads):
+        tk.Label(sequencer_frame, text=label_text, width=10, anchor="e").grid(row=pad_index, column=0, padx=5)
+        row_buttons = []
+        for step in range(sequencer.steps):
+            button = tk.Button(sequencer_frame, width=2, bg="blue" if sequencer.patterns[pad_index][step] else "white",
+                               command=lambda p=pad_index, s=step: toggle_step(p, s))
+            # A wider gap before every beat
+            button.grid(row=pad_index, column=step + 1, padx=(6 if step and step % STEPS_PER_BEAT == 0 else 1, 1), pady=2)
+            row_buttons.append(button)
+        step_buttons.append(row_buttons)
+    playhead_labels = []
+    for step in range(sequencer.steps):
+        label = tk.Label(sequencer_frame, text="", width=2)
+        label.grid(row=len(pads), column=step + 1)
+        playhead_labels.append(label)
+
+    def update_playhead():
+        nonlocal playhead_update
+        current = sequencer.current_step()
+        for step, label in enumerate(playhead_labels):
+            label.config(text="▲" if step == current else "")
+        playhead_update = window.after(30, update_playhead) if sequencer.playing else None
+
+    def follow_bpm(*_):
+        try:
+            sequencer.set_bpm(globals.bpm_var.get())
+        except (tk.TclError, pygame.error):
+            pass  # Half-typed BPM; the loop keeps the last valid tempo
+
+    def play_loop():
+        if globals.sequencer_channel is None:
+            messagebox.showwarning("Step Sequencer", "Audio is still starting up.")
+            return
+        follow_bpm()
+        try:
+            sequencer.start(globals.sequencer_channel)
+        except pygame.error as e:
+            messagebox.showerror("Step Sequencer", f"Failed to play the loop:\n{e}")
+            return
+        if playhead_update is None:
+            update_playhead()
+
+    def stop_loop():
+        sequencer.stop()
+
+    def clear_pattern():
+        sequencer.clear()
+        for row_buttons in step_buttons:
+            for button in row_buttons:
+                button.config(bg="white")
+
+    bpm_trace = globals.bpm_var.trace_add("write", follow_bpm) if globals.bpm_var is not None else None
+    sequencer_controls = tk.Frame(window)
+    sequencer_controls.pack(pady=5)
+    tk.Button(sequencer_controls, text="Play Loop", command=play_loop).pack(side=tk.LEFT, padx=10)
+    tk.Button(sequencer_controls, text="Stop Loop", command=stop_loop).pack(side=tk.LEFT, padx=10)
+    tk.Button(sequencer_controls, text="Clear Pattern", command=clear_pattern).pack(side=tk.LEFT, padx=10)
+
+    # Hardware pad rig over USB serial
+    serial_frame = tk.Frame(window)
+    serial_frame.pack(pady=10)
+
+    tk.Label(serial_frame, text="Serial Port:").pack(side=tk.LEFT, padx=5)
+    port_entry = tk.Entry(serial_frame, width=20)
+    port_entry.pack(side=tk.LEFT, padx=5)
+    serial_status_label = tk.Label(window, text="Serial: not connected", font=("Arial", 10))
+    serial_status_label.pack(pady=5)
+
+    def connect_serial():
+        nonlocal serial_input
+        from serial_input import SerialPadInput
+        port = port_entry.get().strip()
+        if not port:
+            messagebox.showwarning("Serial Input", "Enter a serial port, e.g. /dev/ttyACM0 or COM3.")
+            return
+        disconnect_serial()
+        try:
+            serial_input = SerialPadInput(port, on_hit=trigger_pad)
+            serial_input.start()
+        except Exception as e:
+            serial_input = None
+            messagebox.showerror("Serial Input", f"Failed to open {port}:\n{e}")
+            return
+        update_serial_status()
+
+    def disconnect_serial():
+        nonlocal serial_input
+        if serial_input:
+            serial_input.stop()
+            serial_input = None
+        serial_status_label.config(text="Serial: not connected")
+
+    # The reader thread never touches Tk, so the window polls it for stats
+    def update_serial_status():
+        if not serial_input:
+            return
+        stats = serial_input.latency_stats()
+        if serial_input.error:
+            serial_status_label.config(text=f"Serial: {serial_input.error}")
+            return
+        serial_status_label.config(
+            text=f"Serial: {stats['count']} hits, latency avg {stats['mean_ms']:.2f} ms, "
+                 f"p95 {stats['p95_ms']:.2f} ms, max {stats['max_ms']:.2f} ms"
+        )
+        window.after(500, update_serial_status)
+
+    tk.Button(serial_frame, text="Connect", command=connect_serial).pack(side=tk.LEFT, padx=5)
+    tk.Button(serial_frame, text="Disconnect", command=disconnect_serial).pack(side=tk.LEFT, padx=5)
+
     # Keyboard pressing logic
     def on_key_press(event):
-        key_to_pad = {
-            "1": (selected_hi_hat, hi_hat_sounds),
-            "2": (selected_snare, snare_sounds),
-            "3": (selected_kick, kick_sounds),
-            "4": (selected_open_hat, open_hat_sounds),
-        }
+        key_to_pad = {"1": 0, "2": 1, "3": 2, "4": 3}
         if event.char in key_to_pad:
-            selected_option, sound_mapping = key_to_pad[event.char]
-            play_sound(selected_option.get(), sound_mapping)
+            play_sound(key_to_pad[event.char])
 
     window.bind("<KeyPress>", on_key_press)
 
     def on_close():
         # Don't need to quit the mixer here
         # pygame.mixer.quit()
+        disconnect_serial()
+        sequencer.stop()
+        if bpm_trace:
+            globals.bpm_var.trace_remove("write", bpm_trace)
+        if playhead_update is not None:
+            window.after_cancel(playhead_update)
         window.destroy()
 
     window.protocol("WM_DELETE_WINDOW", on_close)
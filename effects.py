@@ -0,0 +1,206 @@
+import math
+import numpy as np
+
+# Per-track insert effects. An effect processes one (frames x channels) float32 block in place and
+# keeps whatever it needs between blocks (envelopes, previous gain) as attributes. Buffers are
+# allocated once in prepare(), so process() allocates no sample data; the mixer engine calls it
+# for every block while playing, and export runs the same chain over the track block by block.
+#
+# Dynamics are computed at block rate: the level of each block drives an attack/release envelope,
+# and the resulting gain is ramped linearly across the block so there are no steps between blocks.
+
+BLOCK_SIZE = 1024  # Block size for offline rendering; the same as the engine's, so export matches playback
+SILENCE_DB = -120.0
+
+
+def to_db(level):
+    return 20 * math.log10(level) if level > 1e-6 else SILENCE_DB
+
+
+def block_rms(block):
+    flat = block.reshape(-1)
+    if not flat.size:
+        return 0.0
+    return math.sqrt(float(np.dot(flat, flat)) / flat.size)
+
+
+def envelope_coefficient(time_ms, block_seconds):
+    # Fraction of the old envelope kept after one block for a time constant of time_ms
+    if time_ms <= 0:
+        return 0.0
+    return math.exp(-block_seconds * 1000 / time_ms)
+
+
+class Effect:
+    TYPE = None
+    LABEL = None
+    # (name, default, minimum, maximum) for every parameter; used for saving and for the sliders
+    PARAMS = ()
+
+    def __init__(self, **params):
+        for name, default, _, _ in self.PARAMS:
+            setattr(self, name, float(params.get(name, default)))
+        self.block_size = 0
+        self.frame_rate = 0
+
+    def prepare(self, block_size, channels, frame_rate):
+        self.block_size = block_size
+        self.frame_rate = frame_rate
+        self.reset()
+
+    def reset(self):
+        pass
+
+    def process(self, block):
+        raise NotImplementedError
+
+    def set_param(self, name, value):
+        setattr(self, name, float(value))
+
+    def to_dict(self):
+        data = {"type": self.TYPE}
+        for name, _, _, _ in self.PARAMS:
+            data[name] = getattr(self, name)
+        return data
+
+
+class Gain(Effect):
+    TYPE = "gain"
+    LABEL = "Gain"
+    PARAMS = (("gain_db", 0.0, -24.0, 24.0),)
+
+    def process(self, block):
+        if self.gain_db != 0.0:
+            np.multiply(block, 10 ** (self.gain_db / 20), out=block)
+
+
+class _BlockDynamics(Effect):
+    """
+    Base for effects whose gain follows the block level. Subclasses implement next_gain().
+    """
+
+    def prepare(self, block_size, channels, frame_rate):
+        self._ramp = np.arange(block_size, dtype=np.float32) / block_size
+        self._gains = np.empty((block_size, 1), dtype=np.float32)
+        super().prepare(block_size, channels, frame_rate)
+
+    def reset(self):
+        self.envelope_db = SILENCE_DB
+        self.gain = 1.0
+
+    def coefficient(self, time_ms):
+        return envelope_coefficient(time_ms, self.block_size / self.frame_rate)
+
+    def next_gain(self, level_db):
+        raise NotImplementedError
+
+    def process(self, block):
+        frames = len(block)
+        target = self.next_gain(to_db(block_rms(block)))
+        gains = self._gains[:frames]
+        np.multiply(self._ramp[:frames, None], target - self.gain, out=gains)
+        np.add(gains, self.gain, out=gains)
+        np.multiply(block, gains, out=block)
+        self.gain = target
+
+
+class Compressor(_BlockDynamics):
+    TYPE = "compressor"
+    LABEL = "Compressor"
+    PARAMS = (
+        ("threshold_db", -20.0, -60.0, 0.0),
+        ("ratio", 4.0, 1.0, 20.0),
+        ("attack_ms", 10.0, 1.0, 200.0),
+        ("release_ms", 150.0, 10.0, 1000.0),
+        ("makeup_db", 0.0, 0.0, 24.0),
+    )
+
+    def next_gain(self, level_db):
+        coefficient = self.coefficient(self.attack_ms if level_db > self.envelope_db else self.release_ms)
+        self.envelope_db = coefficient * self.envelope_db + (1 - coefficient) * level_db
+        reduction_db = min(0.0, (self.threshold_db - self.envelope_db) * (1 - 1 / max(self.ratio, 1.0)))
+        return 10 ** ((reduction_db + self.makeup_db) / 20)
+
+
+class Gate(_BlockDynamics):
+    TYPE = "gate"
+    LABEL = "Noise Gate"
+    PARAMS = (
+        ("threshold_db", -50.0, -90.0, 0.0),
+        ("release_ms", 80.0, 5.0, 1000.0),
+    )
+
+    def next_gain(self, level_db):
+        # Opens within one block, then fades out with the release time once the level drops
+        if level_db >= self.threshold_db:
+            return 1.0
+        return self.gain * self.coefficient(self.release_ms)
+
+
+EFFECT_TYPES = {effect.TYPE: effect for effect in (Gain, Compressor, Gate)}
+
+
+def effect_from_dict(data):
+    data = dict(data)
+    effect_type = EFFECT_TYPES.get(data.pop("type", None))
+    if effect_type is None:
+        raise ValueError(f"Unknown effect: {data}")
+    return effect_type(**data)
+
+
+class EffectChain:
+    """
+    The insert effects of one track, applied in order. Effects are added and removed by swapping
+    the list, so the engine thread always sees a complete chain.
+    """
+
+    def __init__(self, effects=()):
+        self.effects = list(effects)
+        self.format = None  # (block_size, channels, frame_rate) once prepared
+
+    def __bool__(self):
+        return bool(self.effects)
+
+    def __len__(self):
+        return len(self.effects)
+
+    def prepare(self, block_size, channels, frame_rate):
+        self.format = (block_size, channels, frame_rate)
+        for effect in self.effects:
+            effect.prepare(*self.format)
+
+    def reset(self):
+        for effect in self.effects:
+            effect.reset()
+
+    def add(self, effect):
+        if self.format:
+            effect.prepare(*self.format)
+        self.effects = self.effects + [effect]
+
+    def remove(self, index):
+        self.effects = self.effects[:index] + self.effects[index + 1:]
+
+    def process(self, block):
+        for effect in self.effects:
+            effect.process(block)
+
+    def render(self, samples, frame_rate, block_size=BLOCK_SIZE):
+        """
+        Returns a processed copy of a whole (frames x channels) array, block by block from a reset
+        state, as playback from the start of the track would produce it.
+        """
+        rendered = np.array(samples, dtype=np.float32)
+        if not self.effects:
+            return rendered
+        self.prepare(block_size, rendered.shape[1], frame_rate)
+        for start in range(0, len(rendered), block_size):
+            self.process(rendered[start:start + block_size])
+        return rendered
+
+    def to_list(self):
+        return [effect.to_dict() for effect in self.effects]
+
+    @classmethod
+    def from_list(cls, data):
+        return cls(effect_from_dict(effect) for effect in data or [])
@@ -0,0 +1,62 @@
+import tkinter as tk
+from tkinter import ttk
+import globals
+from effects import EFFECT_TYPES
+
+
+def open_effects_window(track_index):
+    """
+    Edits the insert effect chain of one track. Changes are heard on the next block while playing.
+    """
+    fx_window = tk.Toplevel()
+    fx_window.title(f"Track {track_index + 1} Effects")
+
+    chain_frame = ttk.Frame(fx_window, padding="10")
+    chain_frame.pack(fill="both", expand=True)
+
+    def rebuild():
+        for widget in chain_frame.winfo_children():
+            widget.destroy()
+        chain = globals.effect_chains[track_index]
+        if not chain:
+            ttk.Label(chain_frame, text="No effects").pack(pady=5)
+        for position, effect in enumerate(chain.effects):
+            effect_frame = ttk.LabelFrame(chain_frame, text=f"{position + 1}. {effect.LABEL}", padding="5")
+            effect_frame.pack(fill="x", pady=3)
+            for row, (name, _, minimum, maximum) in enumerate(effect.PARAMS):
+                add_param_slider(effect_frame, effect, name, minimum, maximum, row)
+            ttk.Button(effect_frame, text="Remove",
+                       command=lambda p=position: remove_effect(p)).grid(row=0, column=2, padx=5)
+
+    def remove_effect(position):
+        globals.effect_chains[track_index].remove(position)
+        rebuild()
+
+    def add_effect():
+        label = selected_type.get()
+        effect_type = next(effect for effect in EFFECT_TYPES.values() if effect.LABEL == label)
+        globals.effect_chains[track_index].add(effect_type())
+        rebuild()
+
+    add_frame = ttk.Frame(fx_window, padding="10")
+    add_frame.pack(fill="x")
+    labels = [effect.LABEL for effect in EFFECT_TYPES.values()]
+    selected_type = tk.StringVar(value=labels[0])
+    ttk.OptionMenu(add_frame, selected_type, labels[0], *labels).pack(side="left", padx=5)
+    ttk.Button(add_frame, text="Add Effect", command=add_effect).pack(side="left", padx=5)
+
+    rebuild()
+
+
+def add_param_slider(parent, effect, name, minimum, maximum, row):
+    label_var = tk.StringVar()
+
+    def update(value):
+        effect.set_param(name, value)
+        label_var.set(f"{name}: {float(value):.1f}")
+
+    ttk.Label(parent, textvariable=label_var, width=20).grid(row=row, column=0, sticky="w")
+    slider = ttk.Scale(parent, orient="horizontal", length=200, from_=minimum, to=maximum, command=update)
+    slider.set(getattr(effect, name))
+    slider.grid(row=row, column=1, padx=5)
+    update(getattr(effect, name))
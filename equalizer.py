@@ -1,44 +1,63 @@
+import functools
 import tkinter as tk
 from tkinter import ttk, messagebox
-from pydub import AudioSegment
-from pydub.playback import play
+from audio_buffer import AudioBuffer, ENGINE_FRAME_RATE
 import numpy as np
-import scipy.signal as signal
-import threading
 import os
 import globals
+import job_scheduler
+from job_scheduler import track_key
+from tracing import traced
+from undo_journal import journal, EqualizerStep
+from audio_processing import replace_track_audio
+from preview_player import preview_player
 
 bands = {'low': 0, 'mid': 0, 'high': 0}
-playback_thread = None
-
-def apply_equalizer(samples, sample_rate, bands):
-    def butter_bandpass(lowcut, highcut, fs, order=6):
-        nyq = 0.5 * fs
-        low = lowcut / nyq
-        high = highcut / nyq
-        b, a = signal.butter(order, [low, high], btype='band')
-        return b, a
-
-    def butter_lowpass(cutoff, fs, order=6):
-        nyq = 0.5 * fs
-        normal_cutoff = cutoff / nyq
-        b, a = signal.butter(order, normal_cutoff, btype='low')
-        return b, a
-
-    def butter_highpass(cutoff, fs, order=6):
-        nyq = 0.5 * fs
-        normal_cutoff = cutoff / nyq
-        b, a = signal.butter(order, normal_cutoff, btype='high')
-        return b, a
-
-    b_low, a_low = butter_lowpass(200, sample_rate, 6)
-    low_band = signal.lfilter(b_low, a_low, samples)
-
-    b_mid, a_mid = butter_bandpass(500, 2000, sample_rate, 6)
-    mid_band = signal.lfilter(b_mid, a_mid, samples)
-
-    b_high, a_high = butter_highpass(5000, sample_rate, 6)
-    high_band = signal.lfilter(b_high, a_high, samples)
+analyzer = None  # SpectrumAnalyzer of the open equalizer window
+
+@functools.lru_cache(maxsize=4)
+def design_band_filters(sample_rate):
+    """
+    (b, a) coefficients of the low, mid and high band filters for a sample rate.
+    """
+    import scipy.signal as signal
+    nyq = 0.5 * sample_rate
+    return {
+        'low': signal.butter(6, 200 / nyq, btype='low'),
+        'mid': signal.butter(6, [500 / nyq, 2000 / nyq], btype='band'),
+        'high': signal.butter(6, 5000 / nyq, btype='high'),
+    }
+
+def equalizer_response(bands, frequencies, sample_rate):
+    """
+    Magnitude response of the three-band equalizer at the given frequencies.
+    """
+    import scipy.signal as signal
+    response = np.zeros(len(frequencies), dtype=np.complex128)
+    for band, (b, a) in design_band_filters(sample_rate).items():
+        _, h = signal.freqz(b, a, worN=frequencies, fs=sample_rate)
+        response += h * 10 ** (bands[band] / 20)
+    return np.abs(response)
+
+@traced()
+def apply_equalizer(samples, sample_rate, bands, progress=None):
+    import scipy.signal as signal
+    filters = design_band_filters(sample_rate)
+
+    b_low, a_low = filters['low']
+    low_band = signal.lfilter(b_low, a_low, samples, axis=0)
+    if progress:
+        progress(1 / 3)
+
+    b_mid, a_mid = filters['mid']
+    mid_band = signal.lfilter(b_mid, a_mid, samples, axis=0)
+    if progress:
+        progress(2 / 3)
+
+    b_high, a_high = filters['high']
+    high_band = signal.lfilter(b_high, a_high, samples, axis=0)
+    if progress:
+        progress(1.0)
 
     gain_low = 10 ** (bands['low'] / 20)
     gain_mid = 10 ** (bands['mid'] / 20)
@@ -55,7 +74,8 @@ def apply_equalizer(samples, sample_rate, bands):
     return combined_samples
 
 def open_equalizer_window():
-    global playback_thread
+    global analyzer
+    from spectrum_analyzer import SpectrumAnalyzer
     eq_window = tk.Toplevel()
     eq_window.title("Software Equalizer")
 
@@ -65,16 +85,31 @@ def open_equalizer_window():
     bands['high'] = 0
 
     def on_close():
+        global analyzer
         stop_playback()
+        analyzer.stop()
+        analyzer = None
         eq_window.destroy()
 
     eq_window.protocol("WM_DELETE_WINDOW", on_close)
 
     ttk.Label(eq_window, text="Select Track to Equalize:").pack(pady=5)
-    track_options = [f"Track {i+1}" for i in range(10)]
+    track_options = [f"Track {i+1}" for i in range(globals.track_count)]
     track_menu = ttk.OptionMenu(eq_window, selected_track, track_options[0], *track_options)
     track_menu.pack()
 
+    # Spectrum under the playhead, before and after the current slider settings
+    analyzer = SpectrumAnalyzer(eq_window, ENGINE_FRAME_RATE)
+    analyzer.canvas.pack(padx=10, pady=5)
+    analyzer.set_bands(bands)
+    def select_track(*args):
+        # A preview of the previous track would no longer match the selection
+        stop_playback()
+        analyzer.set_track(int(selected_track.get().split()[1]) - 1)
+
+    selected_track.trace_add("write", select_track)
+    analyzer.start()
+
     slider_frame = ttk.Frame(eq_window)
     slider_frame.pack(pady=10)
 
@@ -109,74 +144,75 @@ def open_equalizer_window():
 def update_band(band, value, label_var):
     bands[band] = float(value)
     label_var.set(f"{band.capitalize()}: {value} dB")
+    if analyzer is not None:
+        analyzer.set_bands(bands)
 
 def stop_playback():
-    global playback_thread
-    if playback_thread and playback_thread.is_alive():
-        playback_thread.join(0.1)
+    preview_player.stop()
 
-def apply_equalizer_to_track(track_str):
+@traced()
+def equalize_buffer(audio, bands, progress=None):
+    processed_samples = apply_equalizer(audio.samples, audio.frame_rate, bands, progress)
+    return AudioBuffer(processed_samples, audio.frame_rate)
+
+def get_track_to_equalize(track_str):
+    # Runs in the job, so it sees a load that was still pending when Apply was pressed
     track_index = int(track_str.split()[1]) - 1
+    if globals.track_event_logs[track_index] is not None:
+        raise ValueError(f"{track_str} holds a MIDI recording. Save it as WAV to equalize it.")
     if not globals.tracks[track_index]:
-        messagebox.showerror("Error", f"No audio loaded in {track_str}.")
-        return
-
-    try:
-        audio_segment = globals.tracks[track_index]
-        sample_rate = audio_segment.frame_rate
-        samples = np.array(audio_segment.get_array_of_samples()).astype(np.float32)
-        if audio_segment.channels == 2:
-            samples = samples.reshape((-1, 2))
-        max_val = 2 ** (audio_segment.sample_width * 8 - 1)
-        samples /= max_val
-        processed_samples = apply_equalizer(samples, sample_rate, bands)
-        if audio_segment.channels == 2:
-            processed_samples = processed_samples.flatten()
-        processed_samples = (processed_samples * max_val).astype(np.int16)
-        combined_audio = AudioSegment(
-            processed_samples.tobytes(),
-            frame_rate=sample_rate,
-            sample_width=audio_segment.sample_width,
-            channels=audio_segment.channels
-        )
-        globals.tracks[track_index] = combined_audio
-        globals.original_tracks[track_index] = combined_audio
+        raise ValueError(f"No audio loaded in {track_str}.")
+    return globals.tracks[track_index]
 
+@traced()
+def apply_equalizer_to_track(track_str):
+    track_index = int(track_str.split()[1]) - 1
+    band_gains = dict(bands)
+
+    def work(job):
+        audio = get_track_to_equalize(track_str)
+        combined_audio = equalize_buffer(audio, band_gains,
+                                          progress=lambda fraction: job.report_progress(fraction * 0.8, "Filtering"))
+        step = EqualizerStep(track_index, audio, band_gains)
+        job.report_progress(0.8, "Writing file")
         file_path = globals.track_file_paths[track_index]
-        combined_audio.export(file_path, format=os.path.splitext(file_path)[1][1:], bitrate="320k")
+        combined_audio.export(file_path, format=os.path.splitext(file_path)[1][1:], **step.export_args)
+        return combined_audio, step
 
+    def done(result):
+        combined_audio, step = result
+        replace_track_audio(track_index, combined_audio)
+        journal.record(step)
         messagebox.showinfo("Equalizer", f"Equalizer applied to {track_str} successfully.")
-    except Exception as e:
-        messagebox.showerror("Equalizer Error", f"Failed to apply equalizer:\n{e}")
 
+    def failed(e):
+        if isinstance(e, ValueError):
+            messagebox.showerror("Error", str(e))
+        else:
+            messagebox.showerror("Equalizer Error", f"Failed to apply equalizer:\n{e}")
+
+    return job_scheduler.submit(f"Equalizing {track_str}", work, keys=[track_key(track_index)],
+                                on_done=done, on_error=failed)
+
+@traced()
 def preview_equalized_audio(track_str):
-    global playback_thread
     track_index = int(track_str.split()[1]) - 1
-    if not globals.tracks[track_index]:
-        messagebox.showerror("Error", f"No audio loaded in {track_str}.")
-        return
-
-    try:
-        audio_segment = globals.tracks[track_index]
-        sample_rate = audio_segment.frame_rate
-        samples = np.array(audio_segment.get_array_of_samples()).astype(np.float32)
-        if audio_segment.channels == 2:
-            samples = samples.reshape((-1, 2))
-        max_val = 2 ** (audio_segment.sample_width * 8 - 1)
-        samples /= max_val
-        processed_samples = apply_equalizer(samples, sample_rate, bands)
-        if audio_segment.channels == 2:
-            processed_samples = processed_samples.flatten()
-        processed_samples = (processed_samples * max_val).astype(np.int16)
-        combined_audio = AudioSegment(
-            processed_samples.tobytes(),
-            frame_rate=sample_rate,
-            sample_width=audio_segment.sample_width,
-            channels=audio_segment.channels
-        )
+    band_gains = dict(bands)
 
-        stop_playback()
-        playback_thread = threading.Thread(target=play, args=(combined_audio,), daemon=True)
-        playback_thread.start()
-    except Exception as e:
-        messagebox.showerror("Playback Error", f"Failed to play equalized audio:\n{e}")
+    def work(job):
+        audio = get_track_to_equalize(track_str)
+        return equalize_buffer(audio, band_gains,
+                                progress=lambda fraction: job.report_progress(fraction, "Filtering"))
+
+    def done(combined_audio):
+        if not preview_player.play(combined_audio, track_index):
+            messagebox.showwarning("Equalizer", "Audio is still starting up.")
+
+    def failed(e):
+        if isinstance(e, ValueError):
+            messagebox.showerror("Error", str(e))
+        else:
+            messagebox.showerror("Playback Error", f"Failed to play equalized audio:\n{e}")
+
+    return job_scheduler.submit(f"Previewing EQ on {track_str}", work, keys=[track_key(track_index)],
+                                on_done=done, on_error=failed)
@@ -0,0 +1,265 @@
+import array
+import os
+import struct
+import numpy as np
+from tracing import traced
+from audio_buffer import AudioBuffer, ENGINE_FRAME_RATE, ENGINE_CHANNELS
+
+# Rendered takes use the same format the instrument windows always exported
+RENDER_FRAME_RATE = ENGINE_FRAME_RATE
+RENDER_CHANNELS = ENGINE_CHANNELS
+TAIL_MS = 1000  # Silence kept after the last hit, same as the old WAV recordings
+
+# 500 ticks per quarter note at 500000 us per quarter note gives 1 tick == 1 ms
+MIDI_TICKS_PER_BEAT = 500
+MIDI_TEMPO_US = 500000
+NOTE_LENGTH_MS = 100
+SAMPLE_META_PREFIX = "sample "
+
+
+def is_event_log_file(file_path):
+    return os.path.splitext(file_path)[1].lower() in (".mid", ".midi")
+
+
+def resolve_sample_path(sample_path):
+    # Instrument windows record paths relative to the app folder, so don't depend on the cwd
+    if not os.path.isabs(sample_path) and not os.path.exists(sample_path):
+        app_relative = os.path.join(os.path.dirname(os.path.abspath(__file__)), sample_path)
+        if os.path.exists(app_relative):
+            return app_relative
+    return sample_path
+
+
+def velocity_to_gain(velocity):
+    # Same curve the keyboard used when rendering: 127 -> 0 dB, 0 -> -20 dB
+    return -20 + (velocity * 20 / 127)
+
+
+class EventLog:
+    """
+    Compact recording of instrument hits: one (sample id, velocity, timestamp) entry per hit.
+    Sample ids index into sample_paths, so each path is stored once no matter how often it is hit.
+    """
+
+    def __init__(self):
+        self.sample_paths = []
+        self._path_ids = {}
+        self.sample_ids = array.array("B")
+        self.velocities = array.array("B")
+        self.timestamps = array.array("I")  # in milliseconds
+        self.version = 0
+        self._rendered = None
+        self._rendered_version = -1
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __iter__(self):
+        for sample_id, velocity, timestamp in zip(self.sample_ids, self.velocities, self.timestamps):
+            yield self.sample_paths[sample_id], velocity, timestamp
+
+    def append(self, sample_path, velocity, timestamp):
+        sample_id = self._path_ids.get(sample_path)
+        if sample_id is None:
+            if len(self.sample_paths) >= 128:
+                raise ValueError("An event log can reference at most 128 different samples.")
+            sample_id = len(self.sample_paths)
+            self.sample_paths.append(sample_path)
+            self._path_ids[sample_path] = sample_id
+        self.sample_ids.append(sample_id)
+        self.velocities.append(max(0, min(127, int(velocity))))
+        self.timestamps.append(max(0, int(timestamp)))
+        self.version += 1
+
+    @property
+    def duration_ms(self):
+        if not self.timestamps:
+            return 0
+        return max(self.timestamps) + TAIL_MS
+
+    @property
+    def duration_seconds(self):
+        return self.duration_ms / 1000.0
+
+    @traced("event_log.render")
+    def render(self):
+        """
+        Renders the log to a 44.1 kHz stereo AudioBuffer. The result is cached until the log changes.
+        """
+        if self._rendered is not None and self._rendered_version == self.version:
+            return self._rendered
+
+        total_frames = int(self.duration_ms * RENDER_FRAME_RATE / 1000)
+        mix = np.zeros((total_frames, RENDER_CHANNELS), dtype=np.float32)
+
+        # Decode every sample once instead of once per hit
+        sample_frames = []
+        for sample_path in self.sample_paths:
+            sample_path = resolve_sample_path(sample_path)
+            if os.path.exists(sample_path):
+                sound = AudioBuffer.from_file(sample_path).to_engine_format()
+                sample_frames.append(sound.samples)
+            else:
+                print(f"Sound file {sample_path} not found.")
+                sample_frames.append(None)
+
+        for sample_id, velocity, timestamp in zip(self.sample_ids, self.velocities, self.timestamps):
+            frames = sample_frames[sample_id]
+            if frames is None:
+                continue
+            start = int(timestamp * RENDER_FRAME_RATE / 1000)
+            end = min(start + len(frames), total_frames)
+            gain = 10 ** (velocity_to_gain(velocity) / 20)
+            mix[start:end] += frames[:end - start] * gain
+
+        np.clip(mix, -1.0, 1.0, out=mix)
+        self._rendered = AudioBuffer(mix, RENDER_FRAME_RATE)
+        self._rendered_version = self.version
+        return self._rendered
+
+    @traced("event_log.save_midi")
+    def save_midi(self, file_path):
+        """
+        Writes the log as a format 0 Standard MIDI File. The sample path of every note number is
+        stored in a text meta event so the file can be rendered again later.
+        """
+        track = bytearray()
+        track += _var_len(0) + b"\xff\x51\x03" + MIDI_TEMPO_US.to_bytes(3, "big")
+        for sample_id, sample_path in enumerate(self.sample_paths):
+            text = (SAMPLE_META_PREFIX + f"{sample_id} {sample_path}").encode("utf-8")
+            track += _var_len(0) + b"\xff\x01" + _var_len(len(text)) + text
+
+        events = []
+        for sample_id, velocity, timestamp in zip(self.sample_ids, self.velocities, self.timestamps):
+            # A note-on with velocity 0 means note-off, so keep silent hits audible to the parser
+            events.append((timestamp, 1, 0x90, sample_id, max(1, velocity)))
+            events.append((timestamp + NOTE_LENGTH_MS, 0, 0x80, sample_id, 0))
+        events.sort()
+
+        last_tick = 0
+        for tick, _, status, note, velocity in events:
+            track += _var_len(tick - last_tick) + bytes((status, note, velocity))
+            last_tick = tick
+        track += _var_len(0) + b"\xff\x2f\x00"
+
+        with open(file_path, "wb") as f:
+            f.write(b"MThd" + struct.pack(">IHHH", 6, 0, 1, MIDI_TICKS_PER_BEAT))
+            f.write(b"MTrk" + struct.pack(">I", len(track)) + bytes(track))
+
+    @classmethod
+    @traced("event_log.load_midi")
+    def load_midi(cls, file_path):
+        """
+        Reads a Standard MIDI File (format 0 or 1) written by save_midi. Note numbers without a
+        sample text event are ignored.
+        """
+        with open(file_path, "rb") as f:
+            data = f.read()
+        if data[:4] != b"MThd":
+            raise ValueError("Not a Standard MIDI File.")
+        header_length, _, track_count, division = struct.unpack(">IHHH", data[4:14])
+        if division & 0x8000:
+            raise ValueError("SMPTE time division is not supported.")
+
+        paths = {}
+        notes = []
+        tempo_changes = []
+        pos = 8 + header_length
+        for _ in range(track_count):
+            if data[pos:pos + 4] != b"MTrk":
+                raise ValueError("Malformed MIDI track chunk.")
+            length = struct.unpack(">I", data[pos + 4:pos + 8])[0]
+            _read_track(data[pos + 8:pos + 8 + length], paths, notes, tempo_changes)
+            pos += 8 + length
+
+        log = cls()
+        tick_to_ms = _tick_converter(sorted(tempo_changes), division)
+        for tick, note, velocity in sorted(notes, key=lambda item: item[0]):
+            sample_path = paths.get(note)
+            if sample_path is not None:
+                log.append(sample_path, velocity, round(tick_to_ms(tick)))
+        return log
+
+
+def _var_len(value):
+    out = bytearray([value & 0x7F])
+    value >>= 7
+    while value:
+        out.insert(0, (value & 0x7F) | 0x80)
+        value >>= 7
+    return bytes(out)
+
+
+def _read_var_len(data, pos):
+    value = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            return value, pos
+
+
+def _read_track(data, paths, notes, tempo_changes):
+    pos = 0
+    tick = 0
+    status = 0
+    while pos < len(data):
+        delta, pos = _read_var_len(data, pos)
+        tick += delta
+        event = status
+        if data[pos] & 0x80:
+            event = data[pos]
+            pos += 1
+            if event < 0xF0:
+                # Only channel messages set the running status; meta and sysex events leave it alone
+                status = event
+        if event == 0xFF:
+            meta_type = data[pos]
+            length, pos = _read_var_len(data, pos + 1)
+            payload = data[pos:pos + length]
+            pos += length
+            if meta_type == 0x51:
+                tempo_changes.append((tick, int.from_bytes(payload, "big")))
+            elif meta_type == 0x01:
+                text = payload.decode("utf-8", errors="replace")
+                if text.startswith(SAMPLE_META_PREFIX):
+                    note, _, sample_path = text[len(SAMPLE_META_PREFIX):].partition(" ")
+                    paths[int(note)] = sample_path
+            elif meta_type == 0x2F:
+                break
+        elif event in (0xF0, 0xF7):
+            length, pos = _read_var_len(data, pos)
+            pos += length
+        else:
+            kind = status & 0xF0
+            if kind in (0xC0, 0xD0):
+                pos += 1
+            else:
+                note, velocity = data[pos], data[pos + 1]
+                pos += 2
+                if kind == 0x90 and velocity > 0:
+                    notes.append((tick, note, velocity))
+
+
+def _tick_converter(tempo_changes, division):
+    # Precompute (start tick, start ms, ms per tick) for each tempo segment
+    segments = []
+    last_tick, last_ms, ms_per_tick = 0, 0.0, MIDI_TEMPO_US / 1000 / division
+    for tick, tempo in tempo_changes:
+        last_ms += (tick - last_tick) * ms_per_tick
+        last_tick = tick
+        ms_per_tick = tempo / 1000 / division
+        segments.append((tick, last_ms, ms_per_tick))
+    if not segments or segments[0][0] != 0:
+        segments.insert(0, (0, 0.0, MIDI_TEMPO_US / 1000 / division))
+
+    def tick_to_ms(tick):
+        start_tick, start_ms, step = segments[0]
+        for segment in segments:
+            if segment[0] > tick:
+                break
+            start_tick, start_ms, step = segment
+        return start_ms + (tick - start_tick) * step
+
+    return tick_to_ms
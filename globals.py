@@ -1,37 +1,63 @@
-import pygame
 import tkinter as tk
 import os
 import tempfile
 import time
-
-pygame.mixer.init()
-pygame.mixer.set_num_channels(10)
-
-tracks = [None] * 10
-channels = [pygame.mixer.Channel(i) for i in range(10)]
-paused_states = [False] * 10
-original_tracks = [None] * 10
-track_file_paths = [None] * 10
-volume_levels = [1.0] * 10
+import numpy as np
+from effects import EffectChain
+from automation import AutomationLane
+
+# The session starts with DEFAULT_TRACK_COUNT tracks and grows (or shrinks, when a project is
+# loaded) through set_track_count(). Object state is kept in lists; numeric per-track state is kept in
+# NumPy arrays, which set_track_count() replaces, so always read them as globals.<name>.
+DEFAULT_TRACK_COUNT = 10
+track_count = DEFAULT_TRACK_COUNT
+track_count_listeners = []  # Called with the new count after set_track_count(), on the Tk thread
+
+tracks = [None] * track_count
+original_tracks = [None] * track_count
+track_file_paths = [None] * track_count
+track_event_logs = [None] * track_count  # EventLog for tracks loaded from MIDI recordings, rendered on demand
+effect_chains = [EffectChain() for _ in range(track_count)]  # Insert effects, run live by the engine and by export
+automation_lanes = [AutomationLane() for _ in range(track_count)]  # Volume automation, scaling the faders
+
+volume_levels = np.ones(track_count, dtype=np.float32)
+pan_levels = np.zeros(track_count, dtype=np.float32)  # -1.0 (left) to 1.0 (right)
+muted_tracks = np.zeros(track_count, dtype=bool)
+soloed_tracks = np.zeros(track_count, dtype=bool)
+preserve_pitch = np.zeros(track_count, dtype=bool)  # Time-stretch instead of resampling when the BPM changes
+track_durations = np.zeros(track_count)
+
+# pygame channels: tracks below HARDWARE_CHANNELS get their own channel for single-track and timeline
+# playback; the rest share SUBMIX_CHANNEL, mixed in software. Play All mixes every track in software.
+HARDWARE_CHANNELS = 16
+SUBMIX_CHANNEL = HARDWARE_CHANNELS
+ENGINE_OUTPUT_CHANNEL = HARDWARE_CHANNELS + 1  # pygame channel reserved for the software mixer output
+SEQUENCER_CHANNEL = ENGINE_OUTPUT_CHANNEL + 1  # Drum pad step sequencer loop
+SCRUB_CHANNEL = SEQUENCER_CHANNEL + 1  # Scrub grains
+PREVIEW_CHANNEL = SCRUB_CHANNEL + 1  # Trim and EQ previews
+channels = []  # Filled by init_mixer() once the main window has been drawn
+submix_channel = None
+sequencer_channel = None
+scrub_channel = None
+preview_channel = None
+mixer_engine = None  # MixerEngine used by Play All, created by init_mixer()
 bpm_var = None
 
 window = None
 track_labels = []
 mixer_sliders = []
+pan_sliders = []
+preserve_pitch_vars = []
 volume_meters = []
 db_labels = []
 
-# Globals for BPM detection
-track_bpm_labels = [None] * 10  # Placeholder for BPM label widgets, one for each track
-
-last_mod_times = [None] * 10
+last_mod_times = [None] * track_count
 
 TEMP_DIR = os.path.join(tempfile.gettempdir(), "Session Audios")
 
-track_durations = [0.0] * 10
-
 # Global variables for cursor management
 cursor_position = 0.0  # in seconds
+loop_region = None  # (start, end) in seconds while looping, else None
 playback_start_time = None  # timestamp when playback starts
 current_playback_time = 0.0  # in seconds
 
@@ -40,6 +66,91 @@ current_time_label = None  # For dynamic cursor display
 
 # Reference to cursor_entry widget
 cursor_entry = None
+loop_var = None  # Loop checkbox and region entries on the transport
+loop_start_entry = None
+loop_end_entry = None
+
+
+def init_mixer():
+    # pygame is imported here rather than at module level: importing it and opening the audio
+    # device are the slowest parts of startup, so they wait until the window is on screen
+    global mixer_engine, submix_channel, sequencer_channel, scrub_channel, preview_channel
+    import pygame
+    from mixer_engine import MixerEngine
+    from audio_buffer import ENGINE_FRAME_RATE, ENGINE_CHANNELS, ENGINE_SAMPLE_WIDTH
+    if pygame.mixer.get_init():
+        return
+    pygame.mixer.init(frequency=ENGINE_FRAME_RATE, size=-8 * ENGINE_SAMPLE_WIDTH, channels=ENGINE_CHANNELS)
+    pygame.mixer.set_num_channels(PREVIEW_CHANNEL + 1)
+    channels[:] = [pygame.mixer.Channel(i) for i in range(HARDWARE_CHANNELS)]
+    submix_channel = pygame.mixer.Channel(SUBMIX_CHANNEL)
+    sequencer_channel = pygame.mixer.Channel(SEQUENCER_CHANNEL)
+    scrub_channel = pygame.mixer.Channel(SCRUB_CHANNEL)
+    preview_channel = pygame.mixer.Channel(PREVIEW_CHANNEL)
+    mixer_engine = MixerEngine(pygame.mixer.Channel(ENGINE_OUTPUT_CHANNEL), track_count)
+    sync_engine_tracks(0)
+
+
+def sync_engine_tracks(first):
+    # Copies the parameters of tracks first.. into the engine
+    for i in range(first, track_count):
+        mixer_engine.set_gain(i, volume_levels[i])
+        mixer_engine.set_pan(i, pan_levels[i])
+        mixer_engine.set_muted(i, muted_tracks[i])
+        mixer_engine.set_soloed(i, soloed_tracks[i])
+        mixer_engine.set_effects(i, effect_chains[i])
+        mixer_engine.set_automation(i, automation_lanes[i])
+
+
+def track_channel(track_index):
+    """
+    The pygame channel a track plays on outside Play All; tracks past the hardware budget share the submix.
+    """
+    if track_index < len(channels):
+        return channels[track_index]
+    return submix_channel
+
+
+def all_channels():
+    return channels + ([submix_channel] if submix_channel is not None else [])
+
+
+def _resized(array, count):
+    resized = np.zeros(count, dtype=array.dtype)
+    kept = min(count, len(array))
+    resized[:kept] = array[:kept]
+    return resized
+
+
+def set_track_count(count):
+    """
+    Grows or shrinks the per-track state to `count` tracks. New tracks are empty, at full volume.
+    """
+    global track_count, volume_levels, pan_levels, muted_tracks, soloed_tracks
+    global preserve_pitch, track_durations
+    old_count = track_count
+    if count == old_count:
+        return
+    for state, make_default in ((tracks, lambda: None), (original_tracks, lambda: None),
+                                (track_file_paths, lambda: None), (track_event_logs, lambda: None),
+                                (last_mod_times, lambda: None), (effect_chains, EffectChain),
+                                (automation_lanes, AutomationLane)):
+        del state[count:]
+        state.extend(make_default() for _ in range(count - len(state)))
+    volume_levels = _resized(volume_levels, count)
+    volume_levels[old_count:] = 1.0
+    pan_levels = _resized(pan_levels, count)
+    muted_tracks = _resized(muted_tracks, count)
+    soloed_tracks = _resized(soloed_tracks, count)
+    preserve_pitch = _resized(preserve_pitch, count)
+    track_durations = _resized(track_durations, count)
+    track_count = count
+    if mixer_engine is not None:
+        mixer_engine.resize(count)
+        sync_engine_tracks(old_count)
+    for listener in track_count_listeners:
+        listener(count)
+    update_total_length()
 
 
 def setup_temp_dir():
@@ -54,8 +165,8 @@ def format_duration(seconds):
 
 
 def update_total_length():
-    if track_durations:
-        max_duration = max(track_durations)
+    if len(track_durations):
+        max_duration = float(track_durations.max())
     else:
         max_duration = 0.0
     if total_length_label:
@@ -65,8 +176,11 @@ def update_total_length():
 def update_current_playback_time():
     global current_playback_time
     if playback_start_time:
-        elapsed = time.time() - playback_start_time
-        current_playback_time = cursor_position + elapsed
+        if mixer_engine is not None and mixer_engine.playing:
+            # The engine knows where it is, jumps back to the loop start included
+            current_playback_time = mixer_engine.heard_frame() / mixer_engine.frame_rate
+        else:
+            current_playback_time = cursor_position + time.time() - playback_start_time
         if current_time_label:
             current_time_label.config(text=f"Current Position: {format_duration(current_playback_time)}")
         # Schedule next update
@@ -1,15 +1,22 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 import globals
+import tracing
+import startup_profile
+import ui_watchdog
 from audio_processing import (
     load_audio, play_all_audio, pause_audio, resume_audio,
-    adjust_volume, save_project, load_project, export_project_as_mp3, detect_bpm
+    adjust_volume, adjust_pan, set_track_muted, set_track_soloed, set_preserve_pitch,
+    save_project, load_project, export_project_as_mp3, detect_bpm, add_track, set_loop_region
 )
+import job_scheduler
+import sample_library
+from undo_journal import journal
+from scrubber import scrubber
 from trim_function import open_trim_window
 import os
 import subprocess
 import sys
-from pydub import AudioSegment
 from track_timeline import (
     setup_track_timeline, toggle_cell, play_timeline, start_timeline_playback
 )
@@ -26,25 +33,28 @@ def open_temp_directory():
     else:
         messagebox.showerror("Error", "Session Audios directory does not exist.")
 
+def open_effects(track_index):
+    from effects_window import open_effects_window
+    open_effects_window(track_index)
+
+def open_automation(track_index):
+    from automation_window import open_automation_window
+    open_automation_window(track_index)
+
 def open_equalizer():
     from equalizer import open_equalizer_window
     open_equalizer_window()
 
+def open_memory():
+    from memory_window import open_memory_window
+    open_memory_window()
+
 def reload_track(track_index):
     file_path = globals.track_file_paths[track_index]
     if file_path and os.path.exists(file_path):
-        try:
-            audio = AudioSegment.from_file(file_path)
-            globals.original_tracks[track_index] = audio
-            globals.tracks[track_index] = audio
-            duration_seconds = audio.duration_seconds
-            globals.track_durations[track_index] = duration_seconds
-            duration_formatted = format_duration(duration_seconds)
-            filename = os.path.basename(file_path)
-            globals.track_labels[track_index].config(text=f"{filename} ({duration_formatted})")
-            globals.update_total_length()  # Update total length when a track is reloaded
-        except Exception as e:
-            messagebox.showerror("Reload Track", f"Failed to reload track {track_index + 1}:\n{e}")
+        # Decodes on the job pool, after any edit that is still writing this file; the track gets a
+        # fresh mapping of the new contents
+        load_audio(track_index, file_path=file_path)
 
 def format_duration(seconds):
     minutes = int(seconds) // 60
@@ -52,7 +62,7 @@ def format_duration(seconds):
     return f"{minutes}:{seconds:02d}"
 
 def check_for_updates():
-    for i in range(10):
+    for i in range(globals.track_count):
         file_path = globals.track_file_paths[i]
         if file_path and os.path.exists(file_path):
             last_mod_time = globals.last_mod_times[i]
@@ -67,14 +77,16 @@ def check_for_updates():
 def move_cursor():
     try:
         target_second = float(globals.cursor_entry.get())
-        max_duration = max(globals.track_durations)
+        max_duration = globals.track_durations.max() if globals.track_count else 0
         if target_second < 0 or target_second > max_duration:
             messagebox.showerror("Invalid Time", "Please enter a valid time within the track duration.")
             return
         globals.cursor_position = target_second
         print(f"Move Cursor: Setting cursor_position to {globals.cursor_position} seconds.")
         # Stop any current playback
-        for channel in globals.channels:
+        if globals.mixer_engine is not None:
+            globals.mixer_engine.stop()
+        for channel in globals.all_channels():
             channel.stop()
         globals.playback_start_time = None
         # Update the current position display
@@ -85,10 +97,196 @@ def move_cursor():
         messagebox.showerror("Move Cursor Error", f"An unexpected error occurred:\n{e}")
         print(f"Move Cursor Error: {e}")
 
+def start_scrub(event):
+    # Scrubbing replaces playback, the way moving the cursor does
+    if globals.mixer_engine is not None:
+        globals.mixer_engine.stop()
+    for channel in globals.all_channels():
+        channel.stop()
+    globals.playback_start_time = None
+    scrub_slider.config(to=globals.track_durations.max() if globals.track_count else 0)
+
+def scrub_transport(value):
+    scrubber.scrub_to(None, float(value))
+
+def end_scrub(event):
+    # The cursor stays where the scrub ended, so Play All starts from there
+    scrubber.stop()
+    globals.cursor_position = round(float(scrub_slider.get()), 3)
+    globals.cursor_entry.delete(0, tk.END)
+    globals.cursor_entry.insert(0, str(globals.cursor_position))
+    globals.update_current_playback_time()
+
+def toggle_loop(event=None):
+    if not globals.loop_var.get():
+        set_loop_region(None, None)
+        return
+    try:
+        set_loop_region(float(globals.loop_start_entry.get()), float(globals.loop_end_entry.get()))
+    except ValueError as e:
+        globals.loop_var.set(False)
+        set_loop_region(None, None)
+        messagebox.showerror("Loop", f"Invalid loop region: {e}")
+
+def save_trace(event=None):
+    if not tracing.enabled:
+        messagebox.showinfo("Tracing", "Tracing is off. Start the app with GROOVE_TRACE=1 to record spans.")
+        return
+    file_path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("Chrome Trace", "*.json")])
+    if file_path:
+        tracing.dump(file_path)
+        messagebox.showinfo("Tracing", "Trace saved. Open it in chrome://tracing or ui.perfetto.dev.")
+
+track_list_frame = None
+mixer_strip_frame = None
+track_rows = []
+mixer_strips = []
+scrub_slider = None
+
+def make_scrollable(parent):
+    """
+    Puts a vertically scrolling canvas at row 0, column 0 of parent and returns the frame inside it.
+    """
+    canvas = tk.Canvas(parent, highlightthickness=0)
+    scrollbar = ttk.Scrollbar(parent, orient="vertical", command=canvas.yview)
+    canvas.configure(yscrollcommand=scrollbar.set)
+    canvas.grid(row=0, column=0, sticky="nsew")
+    scrollbar.grid(row=0, column=2, sticky="ns")
+    inner = ttk.Frame(canvas)
+    canvas.create_window((0, 0), window=inner, anchor="nw")
+    inner.bind("<Configure>", lambda event: canvas.configure(scrollregion=canvas.bbox("all")))
+    return inner
+
+def add_track_row(track):
+    frame = ttk.Frame(track_list_frame)
+    frame.grid(row=track, column=0, padx=10, pady=5, sticky="w")
+    label = ttk.Label(frame, text=f"Track {track + 1}", width=40)
+    label.pack(side="left")
+    globals.track_labels.append(label)
+    load_button = ttk.Button(frame, text="Load Audio", command=lambda t=track: load_audio(t))
+    load_button.pack(side="left", padx=5)
+    detect_bpm_button = ttk.Button(frame, text="Detect BPM", command=lambda t=track: detect_bpm(t))
+    detect_bpm_button.pack(side="left", padx=5)
+    # Follow BPM changes by time-stretching (same pitch) instead of resampling
+    preserve_pitch_var = tk.BooleanVar(value=bool(globals.preserve_pitch[track]))
+    ttk.Checkbutton(frame, text="Keep Pitch", variable=preserve_pitch_var,
+                    command=lambda t=track, var=preserve_pitch_var: set_preserve_pitch(t, var.get())).pack(side="left", padx=5)
+    globals.preserve_pitch_vars.append(preserve_pitch_var)
+    effects_button = ttk.Button(frame, text="FX", width=4, command=lambda t=track: open_effects(t))
+    effects_button.pack(side="left", padx=5)
+    automation_button = ttk.Button(frame, text="Auto", width=5, command=lambda t=track: open_automation(t))
+    automation_button.pack(side="left", padx=5)
+    track_rows.append(frame)
+
+def add_mixer_strip(i):
+    row = i // 5
+    column = i % 5
+    channel_frame = ttk.Frame(mixer_strip_frame)
+    channel_frame.grid(row=row, column=column, padx=3, pady=3)
+    ttk.Label(channel_frame, text=f"Channel {i + 1}").pack()
+
+    slider_meter_frame = ttk.Frame(channel_frame)
+    slider_meter_frame.pack()
+
+    mixer_slider = ttk.Scale(
+        slider_meter_frame,
+        orient="horizontal",
+        length=75,  # Reduced slider length
+        from_=0.0,
+        to=1.0,
+        command=lambda vol, idx=i: adjust_volume(idx, vol)
+    )
+    mixer_slider.set(float(globals.volume_levels[i]))
+    mixer_slider.pack()
+
+    globals.mixer_sliders.append(mixer_slider)
+
+    volume_meter = ttk.Progressbar(
+        slider_meter_frame,
+        orient="horizontal",
+        length=75,  # Reduced progress bar length
+        mode="determinate",
+        maximum=100
+    )
+    volume_meter.pack(pady=1)
+    globals.volume_meters.append(volume_meter)
+
+    pan_slider = ttk.Scale(
+        slider_meter_frame,
+        orient="horizontal",
+        length=75,
+        from_=-1.0,
+        to=1.0,
+        command=lambda pan, idx=i: adjust_pan(idx, pan)
+    )
+    pan_slider.set(float(globals.pan_levels[i]))
+    pan_slider.pack(pady=1)
+    globals.pan_sliders.append(pan_slider)
+
+    toggle_frame = ttk.Frame(channel_frame)
+    toggle_frame.pack()
+    mute_var = tk.BooleanVar(value=bool(globals.muted_tracks[i]))
+    ttk.Checkbutton(toggle_frame, text="M", variable=mute_var,
+                    command=lambda idx=i, var=mute_var: set_track_muted(idx, var.get())).pack(side="left")
+    solo_var = tk.BooleanVar(value=bool(globals.soloed_tracks[i]))
+    ttk.Checkbutton(toggle_frame, text="S", variable=solo_var,
+                    command=lambda idx=i, var=solo_var: set_track_soloed(idx, var.get())).pack(side="left")
+
+    db_label = ttk.Label(channel_frame, text="-inf dB")
+    db_label.pack()
+    globals.db_labels.append(db_label)
+    mixer_strips.append(channel_frame)
+
+def resize_track_widgets(count):
+    # Track rows and mixer strips are built on demand, so a session only pays for the tracks it has
+    while len(track_rows) > count:
+        track_rows.pop().destroy()
+        mixer_strips.pop().destroy()
+        for widgets in (globals.track_labels, globals.preserve_pitch_vars, globals.mixer_sliders,
+                        globals.volume_meters, globals.pan_sliders, globals.db_labels):
+            widgets.pop()
+    for track in range(len(track_rows), count):
+        add_track_row(track)
+        add_mixer_strip(track)
+
+def setup_job_status_bar(parent, scheduler):
+    status_frame = ttk.Frame(parent, padding="5")
+    status_label = ttk.Label(status_frame, text="Ready", width=60)
+    status_label.pack(side="left", padx=5)
+    progress_bar = ttk.Progressbar(status_frame, orient="horizontal", length=200, mode="determinate", maximum=100)
+    progress_bar.pack(side="left", padx=5)
+
+    def cancel_current():
+        if scheduler.jobs:
+            scheduler.jobs[0].cancel()
+
+    cancel_button = ttk.Button(status_frame, text="Cancel", command=cancel_current, state="disabled")
+    cancel_button.pack(side="left", padx=5)
+
+    def refresh():
+        if not scheduler.jobs:
+            status_label.config(text="Ready")
+            progress_bar["value"] = 0
+            cancel_button.config(state="disabled")
+            return
+        job = scheduler.jobs[0]
+        waiting = len(scheduler.jobs) - 1
+        text = f"{job.name}: {job.message}" if job.message else job.name
+        if waiting:
+            text += f" ({waiting} more queued)"
+        status_label.config(text=text)
+        progress_bar["value"] = job.progress * 100
+        cancel_button.config(state="normal")
+
+    scheduler.listeners.append(refresh)
+    return status_frame
+
 def setup_main_window():
+    startup_profile.mark("modules imported")
     globals.window = tk.Tk()
     globals.window.title("Groove Window")
     globals.window.geometry("1920x1080")
+    scheduler = job_scheduler.start(globals.window)
 
     # Configure grid rows and columns
     globals.window.grid_rowconfigure(0, weight=0)
@@ -141,6 +339,35 @@ def setup_main_window():
     timeline_play_button = ttk.Button(control_frame, text="Play Timeline", command=start_timeline_playback)
     timeline_play_button.grid(row=0, column=13, padx=10)
 
+    undo_button = ttk.Button(control_frame, text="Undo", command=journal.undo)
+    undo_button.grid(row=0, column=14, padx=5)
+    redo_button = ttk.Button(control_frame, text="Redo", command=journal.redo)
+    redo_button.grid(row=0, column=15, padx=5)
+    add_track_button = ttk.Button(control_frame, text="Add Track", command=add_track)
+    add_track_button.grid(row=0, column=16, padx=10)
+
+    # Loop region: Play All repeats it without a gap until stopped
+    globals.loop_var = tk.BooleanVar(value=False)
+    ttk.Checkbutton(control_frame, text="Loop", variable=globals.loop_var, command=toggle_loop).grid(row=1, column=2, padx=10, pady=5)
+    ttk.Label(control_frame, text="Loop Start (s):").grid(row=1, column=3, padx=5)
+    globals.loop_start_entry = ttk.Entry(control_frame, width=8)
+    globals.loop_start_entry.grid(row=1, column=4, padx=5)
+    globals.loop_start_entry.insert(0, "0")
+    ttk.Label(control_frame, text="Loop End (s):").grid(row=1, column=5, padx=5)
+    globals.loop_end_entry = ttk.Entry(control_frame, width=8)
+    globals.loop_end_entry.grid(row=1, column=6, padx=5)
+    globals.loop_end_entry.insert(0, "16")
+    for entry in (globals.loop_start_entry, globals.loop_end_entry):
+        entry.bind("<Return>", toggle_loop)
+
+    # Scrub bar: drag to hear the mix around the handle; releasing moves the cursor there
+    global scrub_slider
+    ttk.Label(control_frame, text="Scrub:").grid(row=1, column=8, padx=5)
+    scrub_slider = ttk.Scale(control_frame, from_=0, to=0, orient="horizontal", length=300, command=scrub_transport)
+    scrub_slider.grid(row=1, column=9, columnspan=4, padx=5, sticky="ew")
+    scrub_slider.bind("<ButtonPress-1>", start_scrub)
+    scrub_slider.bind("<ButtonRelease-1>", end_scrub)
+
     # Left Frame
     left_frame = ttk.Frame(globals.window)
     left_frame.grid(row=1, column=0, sticky="nsew")
@@ -148,71 +375,29 @@ def setup_main_window():
     left_frame.grid_rowconfigure(1, weight=1)
     left_frame.grid_columnconfigure(0, weight=1)
 
+    global track_list_frame, mixer_strip_frame
     track_frame = ttk.Frame(left_frame, padding="10")
     track_frame.grid(row=0, column=0, sticky="nsew")
+    track_frame.grid_rowconfigure(0, weight=1)
     track_frame.grid_columnconfigure(0, weight=1)
+    track_list_frame = make_scrollable(track_frame)
     globals.track_labels = []
-    globals.track_bpm_labels = [None] * 10
-
-    for track in range(10):
-        frame = ttk.Frame(track_frame)
-        frame.grid(row=track, column=0, padx=10, pady=5, sticky="w")
-        label = ttk.Label(frame, text=f"Track {track + 1}", width=40)
-        label.pack(side="left")
-        globals.track_labels.append(label)
-        load_button = ttk.Button(frame, text="Load Audio", command=lambda t=track: load_audio(t))
-        load_button.pack(side="left", padx=5)
-        detect_bpm_button = ttk.Button(frame, text="Detect BPM", command=lambda t=track: detect_bpm(t))
-        detect_bpm_button.pack(side="left", padx=5)
+    globals.preserve_pitch_vars = []
 
     mixer_frame = ttk.Frame(left_frame, padding="10")
     mixer_frame.grid(row=1, column=0, sticky="nsew")
+    mixer_frame.grid_rowconfigure(0, weight=1)
     mixer_frame.grid_columnconfigure(0, weight=1)
     mixer_frame.grid_columnconfigure(1, weight=0)
-
-    mixer_inner_frame = ttk.Frame(mixer_frame)
-    mixer_inner_frame.grid(row=0, column=0, sticky="sw")
+    mixer_strip_frame = make_scrollable(mixer_frame)
 
     globals.mixer_sliders = []
     globals.volume_meters = []
     globals.db_labels = []
+    globals.pan_sliders = []
 
-    for i in range(10):
-        row = i // 5
-        column = i % 5
-        channel_frame = ttk.Frame(mixer_inner_frame)
-        channel_frame.grid(row=row, column=column, padx=3, pady=3)  
-        ttk.Label(channel_frame, text=f"Channel {i + 1}").pack()
-
-        slider_meter_frame = ttk.Frame(channel_frame)
-        slider_meter_frame.pack()
-
-        mixer_slider = ttk.Scale(
-            slider_meter_frame,
-            orient="horizontal",
-            length=75,  # Reduced slider length
-            from_=0.0,
-            to=1.0,
-            command=lambda vol, idx=i: adjust_volume(idx, vol)
-        )
-        mixer_slider.set(1.0)
-        mixer_slider.pack()
-
-        globals.mixer_sliders.append(mixer_slider)
-
-        volume_meter = ttk.Progressbar(
-            slider_meter_frame,
-            orient="horizontal",
-            length=75,  # Reduced progress bar length
-            mode="determinate",
-            maximum=100
-        )
-        volume_meter.pack(pady=1)
-        globals.volume_meters.append(volume_meter)
-
-        db_label = ttk.Label(channel_frame, text="-inf dB")
-        db_label.pack()
-        globals.db_labels.append(db_label)
+    resize_track_widgets(globals.track_count)
+    globals.track_count_listeners.append(resize_track_widgets)
 
     def open_keyboard():
         from keyboard_window import open_keyboard_window
@@ -235,6 +420,9 @@ def setup_main_window():
     equalizer_button = ttk.Button(button_frame, text="Equalizer", command=open_equalizer)
     equalizer_button.pack(side="top", pady=5)
 
+    memory_button = ttk.Button(button_frame, text="Memory", command=open_memory)
+    memory_button.pack(side="top", pady=5)
+
     # Button: Keyboard
     keyboard_button = ttk.Button(button_frame, text="Keyboard", command=open_keyboard)
     keyboard_button.pack(side="top", pady=5)
@@ -257,9 +445,31 @@ def setup_main_window():
     globals.window.grid_columnconfigure(0, weight=1)
     globals.window.grid_columnconfigure(1, weight=1)
 
+    # Long operations run in the background; their progress shows here
+    status_frame = setup_job_status_bar(globals.window, scheduler)
+    status_frame.grid(row=2, column=0, columnspan=2, sticky="ew")
+
     globals.current_time_label = current_time_label
     globals.total_length_label = total_length_label
 
+    # Ctrl+Shift+T dumps the tracing ring buffer
+    globals.window.bind("<Control-T>", save_trace)
+    globals.window.bind("<Control-z>", lambda event: journal.undo())
+    globals.window.bind("<Control-y>", lambda event: journal.redo())
+
+    def finish_startup():
+        # Runs once the first frame is on screen
+        startup_profile.mark("first frame drawn")
+        with startup_profile.measure("mixer init"):
+            globals.init_mixer()
+        startup_profile.mark("audio ready")
+        startup_profile.report()
+        # Picks up samples added or changed since the last run; the instrument windows query the index
+        sample_library.start_background_scan()
+
     check_for_updates()
     globals.update_current_playback_time()
+    startup_profile.mark("main window built")
+    globals.window.after_idle(finish_startup)
+    ui_watchdog.start(globals.window)
     globals.window.mainloop()
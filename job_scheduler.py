@@ -0,0 +1,222 @@
+import collections
+import queue
+import threading
+import traceback
+from tracing import span
+import memory_accounting
+
+# Runs long operations (export, EQ, trim, loading, saving, BPM detection) on a small worker pool
+# so the Tk window stays responsive.
+#
+# - Job functions run on a worker thread as func(job, *args). They must not touch Tk widgets;
+#   call job.report_progress(fraction, message) now and then, which also raises JobCancelled
+#   once the job has been cancelled.
+# - on_done(result), on_error(exception), on_cancel() and progress listeners always run on the Tk thread:
+#   workers queue them and the scheduler drains the queue from a window.after() poll.
+# - Jobs sharing a key run in submit order, and a job only starts after the on_done of the job
+#   before it has run. An EQ on track 3 therefore sees the audio a pending load put there.
+
+DEFAULT_WORKERS = 2
+POLL_INTERVAL_MS = 50
+
+scheduler = None
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, name, func, args, keys, on_done, on_error, on_cancel=None):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.keys = tuple(keys)
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_cancel = on_cancel
+        self.state = "pending"  # pending, running, done, failed or cancelled
+        self.progress = 0.0
+        self.message = ""
+        self.result = None
+        self.error = None
+        self._cancel_event = threading.Event()
+        self._waiting_on = set()
+        self._dependents = []
+        self._scheduler = None
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise JobCancelled(self.name)
+
+    def report_progress(self, fraction, message=None):
+        self.check_cancelled()
+        self.progress = max(0.0, min(1.0, fraction))
+        if message is not None:
+            self.message = message
+        if self._scheduler:
+            self._scheduler.post(self._scheduler.notify)
+
+
+def track_key(track_index):
+    return ("track", track_index)
+
+
+class JobScheduler:
+    def __init__(self, window=None, workers=DEFAULT_WORKERS):
+        self.window = window
+        self.jobs = []  # Pending and running jobs in submit order, only touched on the Tk thread
+        self.listeners = []  # Called on the Tk thread whenever a job changes
+        self._ready = queue.Queue()
+        self._callbacks = collections.deque()
+        self._lock = threading.Lock()
+        self._last_job_for_key = {}
+        self._threads = [
+            threading.Thread(target=self._worker_loop, name=f"job-worker-{i + 1}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        if window is not None:
+            window.after(POLL_INTERVAL_MS, self._poll)
+
+    def submit(self, name, func, *args, keys=(), on_done=None, on_error=None, on_cancel=None):
+        job = Job(name, func, args, keys, on_done, on_error, on_cancel)
+        job._scheduler = self
+        with self._lock:
+            for key in job.keys:
+                previous = self._last_job_for_key.get(key)
+                if previous is not None and previous not in job._waiting_on:
+                    job._waiting_on.add(previous)
+                    previous._dependents.append(job)
+                self._last_job_for_key[key] = job
+            ready = not job._waiting_on
+        self.jobs.append(job)
+        if ready:
+            self._ready.put(job)
+        self.notify()
+        return job
+
+    def cancel_all(self):
+        for job in self.jobs:
+            job.cancel()
+
+    def shutdown(self):
+        self.cancel_all()
+        for _ in self._threads:
+            self._ready.put(None)
+
+    def post(self, callback):
+        # deque.append is thread-safe; the Tk thread drains the deque in _poll
+        self._callbacks.append(callback)
+
+    def notify(self):
+        for listener in list(self.listeners):
+            listener()
+
+    def run_pending_callbacks(self):
+        while True:
+            try:
+                callback = self._callbacks.popleft()
+            except IndexError:
+                return
+            try:
+                callback()
+            except Exception:
+                traceback.print_exc()
+
+    def _poll(self):
+        self.run_pending_callbacks()
+        self.window.after(POLL_INTERVAL_MS, self._poll)
+
+    def _worker_loop(self):
+        while True:
+            job = self._ready.get()
+            if job is None:
+                return
+            if job.cancelled:
+                job.state = "cancelled"
+            else:
+                job.state = "running"
+                self.post(self.notify)
+                try:
+                    with span("job_scheduler.job", job=job.name), memory_accounting.measure(job.name):
+                        job.result = job.func(job, *job.args)
+                    job.state = "done"
+                except JobCancelled:
+                    job.state = "cancelled"
+                except Exception as e:
+                    job.error = e
+                    job.state = "failed"
+                    traceback.print_exc()
+            self.post(lambda finished=job: self._complete(finished))
+
+    def _complete(self, job):
+        # Runs on the Tk thread, so on_done can update globals and widgets
+        try:
+            if job.state == "done" and job.on_done:
+                job.on_done(job.result)
+            elif job.state == "failed" and job.on_error:
+                job.on_error(job.error)
+            elif job.state == "cancelled":
+                print(f"{job.name} cancelled")
+                if job.on_cancel:
+                    job.on_cancel()
+        finally:
+            self.jobs.remove(job)
+            released = []
+            with self._lock:
+                for key in job.keys:
+                    if self._last_job_for_key.get(key) is job:
+                        del self._last_job_for_key[key]
+                for dependent in job._dependents:
+                    dependent._waiting_on.discard(job)
+                    if not dependent._waiting_on:
+                        released.append(dependent)
+            for dependent in released:
+                self._ready.put(dependent)
+            self.notify()
+
+
+def start(window, workers=DEFAULT_WORKERS):
+    global scheduler
+    scheduler = JobScheduler(window, workers)
+    return scheduler
+
+
+def submit(name, func, *args, keys=(), on_done=None, on_error=None, on_cancel=None):
+    """
+    Runs func(job, *args) on the worker pool. Without a started scheduler (headless use,
+    benchmarks) the job runs synchronously on the calling thread with the same callbacks.
+    """
+    if scheduler is not None:
+        return scheduler.submit(name, func, *args, keys=keys, on_done=on_done, on_error=on_error,
+                                on_cancel=on_cancel)
+
+    job = Job(name, func, args, keys, on_done, on_error, on_cancel)
+    job.state = "running"
+    try:
+        with memory_accounting.measure(name):
+            job.result = func(job, *args)
+        job.state = "done"
+    except JobCancelled:
+        job.state = "cancelled"
+        if on_cancel:
+            on_cancel()
+        return job
+    except Exception as e:
+        job.error = e
+        job.state = "failed"
+        if on_error:
+            on_error(e)
+        return job
+    if on_done:
+        on_done(job.result)
+    return job
@@ -1,26 +1,44 @@
 import os
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-from pydub import AudioSegment
 import pygame
 import time
 import globals
+from event_log import EventLog
+from tracing import traced
+import sample_library
+import memory_accounting
+
+
+key_sounds = {}  # Note -> pygame Sound for the open keyboard window
+memory_accounting.register("keyboard samples", lambda: ((None, sound) for sound in list(key_sounds.values())))
 
 
 def open_keyboard_window():
+    # On the first run the window opens once the piano folder is indexed
+    sample_library.when_indexed(sample_library.PIANO_DIR, build_keyboard_window)
+
+
+def build_keyboard_window():
     root = tk.Toplevel()
     root.title("Keyboard Simulator")
     root.geometry("1300x1300") # We can adjust these for demo later
 
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    sounds_dir = os.path.join(script_dir, "Sounds_Piano")
+    # Every "<note><octave>" sample in the piano folder of the sample library is a key
+    note_names = ["c", "c#", "d", "d#", "e", "f", "f#", "g", "g#", "a", "a#", "b"]
+    key_note_map = {}
+    for name, file_path in sample_library.samples_in(os.path.basename(sample_library.PIANO_DIR),
+                                                     root=sample_library.PIANO_DIR):
+        key_note_map[name.lower()] = file_path
 
     # Octaves and the notes for each
-    octaves = {
-        "Octave 3": [f"{note}3" for note in ["c", "c#", "d", "d#", "e", "f", "f#", "g", "g#", "a", "a#", "b"]],
-        "Octave 4": [f"{note}4" for note in ["c", "c#", "d", "d#", "e", "f", "f#", "g", "g#", "a", "a#", "b"]],
-        "Octave 5": [f"{note}5" for note in ["c", "c#", "d", "d#", "e", "f", "f#", "g", "g#", "a", "a#", "b"]],
-    }
+    octaves = {}
+    for octave in sorted({note[-1] for note in key_note_map if note[-1].isdigit() and note[:-1] in note_names}):
+        octaves[f"Octave {octave}"] = [f"{note}{octave}" for note in note_names if f"{note}{octave}" in key_note_map]
+    if not octaves:
+        messagebox.showwarning("Keyboard", f"No piano samples found in {sample_library.PIANO_DIR}.")
+        root.destroy()
+        return
 
     # Key mappings for the computer keyboard
     key_map = {
@@ -38,29 +56,20 @@ def open_keyboard_window():
         "j": "b",
     }
 
-    # File paths for all keys
-    key_note_map = {}
-    for octave, notes in octaves.items():
-        for note in notes:
-            file_path = os.path.join(sounds_dir, f"{note}.mp3")
-            key_note_map[note] = file_path
-
     # We don't need this anymore cause it is integrated in the DAW already
     # pygame.mixer.init()
 
     # Load sounds 
-    key_sounds = {}
+    key_sounds.clear()
     for note, file_path in key_note_map.items():
-        if os.path.exists(file_path):
+        if os.path.exists(file_path):  # The index may predate a deletion
             key_sounds[note] = pygame.mixer.Sound(file_path)
-        else:
-            print(f"Warning: Sound file for {note} not found at {file_path}")
 
 
 
 ## GUI Stuff
     is_recording = False
-    recorded_notes = []
+    recorded_notes = EventLog()
     start_time = 0
     velocity_sliders = {}
     timer_update = None  
@@ -72,6 +81,7 @@ def open_keyboard_window():
     keys_frame.pack(pady=20)
 
     # Play sound function
+    @traced("keyboard_window.play_sound")
     def play_sound(note):
         sound = key_sounds.get(note)
         slider = velocity_sliders.get(note)
@@ -87,7 +97,7 @@ def open_keyboard_window():
 
         if is_recording:
             timestamp = int((time.time() - start_time) * 1000)
-            recorded_notes.append((key_note_map[note], velocity, timestamp))
+            recorded_notes.append(key_note_map[note], velocity, timestamp)
             print(f"Recorded: {note} at {timestamp} ms with velocity {velocity}") # Print in terminal for testing
 
     # Function to start recording
@@ -96,7 +106,7 @@ def open_keyboard_window():
         if is_recording:
             return  # Duplicate press
         is_recording = True
-        recorded_notes = []
+        recorded_notes = EventLog()
         start_time = time.time()
         print("Recording started")
         update_timer()  # Start the stopwatch
@@ -126,37 +136,23 @@ def open_keyboard_window():
 
     # Function to save the recording
     # Automatically opens the Session Audios folder now
+    @traced("keyboard_window.save_audio")
     def save_audio():
         if not recorded_notes:
             messagebox.showwarning("No Recording", "No notes have been recorded.")
             return
 
-        max_timestamp = max(timestamp for _, _, timestamp in recorded_notes)
-        output_duration = max_timestamp + 1000  # Add 1 second buffer at the end
-
-        output_audio = AudioSegment.silent(duration=output_duration)
-
-        for note_file, velocity, timestamp in recorded_notes:
-            if os.path.exists(note_file):
-                note_audio = AudioSegment.from_file(note_file)
-                gain = -20 + (velocity * 20 / 127)
-                adjusted_audio = note_audio.apply_gain(gain)
-                output_audio = output_audio.overlay(adjusted_audio, position=timestamp)
-            else:
-                print(f"Note file {note_file} not found.")
-
-
         # Enter a filename function
         file_name = filedialog.asksaveasfilename(
             initialdir=globals.TEMP_DIR,
-            defaultextension=".wav",
-            filetypes=[("WAV files", "*.wav")],
+            defaultextension=".mid",
+            filetypes=[("MIDI files", "*.mid"), ("WAV files", "*.wav")],
             title="Save Recording As"
         )
 
         if file_name:
-            if not file_name.lower().endswith(".wav"):
-                file_name += ".wav"
+            if not file_name.lower().endswith((".mid", ".wav")):
+                file_name += ".mid"
 
             file_path = file_name
 
@@ -166,8 +162,12 @@ def open_keyboard_window():
                 if not overwrite:
                     return
 
-            # Make it the proper format to be compatible with the DAW
-            output_audio.export(file_path, format="wav", parameters=["-ar", "44100", "-ac", "2"])
+            if file_path.lower().endswith(".mid"):
+                # Only the note events are stored, the track renders them on demand
+                recorded_notes.save_midi(file_path)
+            else:
+                # Make it the proper format to be compatible with the DAW
+                recorded_notes.render().export(file_path, format="wav", parameters=["-ar", "44100", "-ac", "2"])
 
             messagebox.showinfo("Recording Saved",
                                 f"Recording saved as '{os.path.basename(file_path)}' in the Session Audios folder.\n\n"
@@ -219,13 +219,14 @@ def open_keyboard_window():
 
 
     # Dropdown for octave selection
-    selected_octave = tk.StringVar(value="Octave 3")
+    default_octave = "Octave 3" if "Octave 3" in octaves else next(iter(octaves))
+    selected_octave = tk.StringVar(value=default_octave)
     octave_dropdown = ttk.Combobox(root, values=list(octaves.keys()), state="readonly", textvariable=selected_octave)
     octave_dropdown.pack(pady=10)
     octave_dropdown.bind("<<ComboboxSelected>>", lambda e: update_keys(selected_octave.get()))
 
     # Default octave (we can change this later)
-    update_keys("Octave 3")
+    update_keys(default_octave)
 
     # Bind keyboard keys to play notes
     root.bind("<KeyPress>", play_note_from_key)
@@ -1,5 +1,10 @@
+import startup_profile
+startup_profile.start()
+
 from gui_setup import setup_main_window
 import globals
+import tracing
+import ui_watchdog
 import atexit
 import shutil
 import os
@@ -13,4 +18,6 @@ def cleanup_temp_dir():
 if __name__ == "__main__":
     globals.setup_temp_dir()
     atexit.register(cleanup_temp_dir)
+    atexit.register(tracing.dump_on_exit)
+    atexit.register(ui_watchdog.print_summary)
     setup_main_window()
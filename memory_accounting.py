@@ -0,0 +1,252 @@
+import collections
+import contextlib
+import json
+import os
+import threading
+import time
+import tracemalloc
+import numpy as np
+import globals
+
+# Accounting of the memory held by audio data: decoded track buffers, the mixer engine's copies,
+# pygame sounds, undo history, previews and instrument samples.
+#
+# Subsystems register a source, a function yielding (track_index or None, object) for every
+# buffer they hold. report() walks the sources and counts each buffer once, however many
+# subsystems or views share it: NumPy views are followed to the array that owns the memory, and
+# memory-mapped arrays are counted apart, as they live in the page cache rather than the heap.
+#
+# With GROOVE_TRACEMALLOC=1 (or enable_tracemalloc()), measure() takes a tracemalloc snapshot
+# before and after an operation and keeps the difference; every background job is measured, so
+# the allocations of an export or an EQ can be compared between versions like their timings.
+# Snapshots cover the whole process, so jobs running at the same time show up in each other's diff.
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+TRACEMALLOC_FRAMES = 8
+TOP_ALLOCATIONS = 10  # Source lines kept per measured operation
+MAX_OPERATIONS = 50
+
+_sources = {}  # Subsystem name -> function yielding (track_index or None, object)
+_operations = collections.deque(maxlen=MAX_OPERATIONS)
+_lock = threading.Lock()
+
+
+def register(subsystem, source):
+    _sources[subsystem] = source
+
+
+def owner(array):
+    # The array that owns the memory behind a view
+    while isinstance(array.base, np.ndarray):
+        array = array.base
+    return array
+
+
+def sound_bytes(sound):
+    # pygame stores sounds in the mixer's format; get_raw() would copy the whole sound to measure it
+    import pygame
+    init = pygame.mixer.get_init()
+    if init is None:
+        return 0
+    frequency, size, channels = init
+    return int(round(sound.get_length() * frequency)) * channels * abs(size) // 8
+
+
+def measure_object(obj):
+    """
+    Returns (key, bytes, mapped) for a buffer, where key identifies the memory so shared buffers
+    are counted once. Objects that hold no audio return None.
+    """
+    from audio_buffer import AudioBuffer
+    from wav_file import WavSamples
+    if obj is None:
+        return None
+    if isinstance(obj, AudioBuffer):
+        obj = obj.storage
+    if isinstance(obj, WavSamples):
+        obj = obj.raw
+    if isinstance(obj, np.ndarray):
+        root = owner(obj)
+        return id(root), root.nbytes, isinstance(root, np.memmap)
+    if type(obj).__name__ == "Sound":
+        return id(obj), sound_bytes(obj), False
+    return None
+
+
+def _track_sources():
+    for i in range(globals.track_count):
+        yield i, globals.tracks[i]
+
+
+def _original_track_sources():
+    for i in range(globals.track_count):
+        yield i, globals.original_tracks[i]
+
+
+def _engine_sources():
+    engine = globals.mixer_engine
+    if engine is None:
+        return
+    for i, source in enumerate(list(engine.sources)):
+        yield i, source
+    for buffer in [engine._mix, engine._track_block] + engine._outputs:
+        yield None, buffer
+    for sound in list(engine._pending):
+        yield None, sound
+
+
+def _effect_sources():
+    for i, chain in enumerate(list(globals.effect_chains)):
+        for effect in chain.effects:
+            for value in vars(effect).values():
+                if isinstance(value, np.ndarray):
+                    yield i, value
+
+
+register("tracks", _track_sources)
+register("original tracks", _original_track_sources)
+register("mixer engine", _engine_sources)
+register("effects", _effect_sources)
+
+
+def report():
+    """
+    Returns the bytes held per subsystem and per track, as a JSON-ready dict. A buffer shared by
+    several subsystems (a track nobody has time-stretched is also its own original) is counted
+    under the first one, in registration order.
+    """
+    seen = set()
+    subsystems = {}
+    tracks = [dict() for _ in range(globals.track_count)]
+    for subsystem, source in list(_sources.items()):
+        held = {"bytes": 0, "mapped_bytes": 0, "buffers": 0}
+        try:
+            items = list(source())
+        except Exception as e:
+            # A window's state can change under us; an incomplete count beats no report
+            held["error"] = str(e)
+            items = []
+        for track_index, obj in items:
+            measured = measure_object(obj)
+            if measured is None:
+                continue
+            key, nbytes, mapped = measured
+            if key in seen:
+                continue
+            seen.add(key)
+            field = "mapped_bytes" if mapped else "bytes"
+            held[field] += nbytes
+            held["buffers"] += 1
+            if track_index is not None and track_index < len(tracks):
+                per_track = tracks[track_index]
+                per_track[subsystem] = per_track.get(subsystem, 0) + (0 if mapped else nbytes)
+        subsystems[subsystem] = held
+
+    result = {
+        "time": time.time(),
+        "process_rss_bytes": process_rss(),
+        "total_bytes": sum(held["bytes"] for held in subsystems.values()),
+        "mapped_bytes": sum(held["mapped_bytes"] for held in subsystems.values()),
+        "subsystems": subsystems,
+        "tracks": [{"track": i + 1, "bytes": sum(held.values()), "subsystems": held}
+                   for i, held in enumerate(tracks)],
+    }
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        result["tracemalloc"] = {"current_bytes": current, "peak_bytes": peak}
+    with _lock:
+        result["operations"] = list(_operations)
+    return result
+
+
+def report_json(indent=2):
+    return json.dumps(report(), indent=indent)
+
+
+def dump(file_path):
+    with open(file_path, "w") as f:
+        f.write(report_json())
+    return file_path
+
+
+def process_rss():
+    # Resident set size of the whole process, where the OS tells us cheaply
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if os.uname().sysname == "Darwin" else peak * 1024  # Peak, not current, here
+
+
+def enable_tracemalloc(frames=TRACEMALLOC_FRAMES):
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def disable_tracemalloc():
+    tracemalloc.stop()
+
+
+def app_location(traceback):
+    # The innermost line of our own code, rather than the NumPy internals that did the allocating
+    frames = list(traceback)
+    for frame in reversed(frames):
+        if frame.filename.startswith(APP_DIR):
+            return f"{os.path.relpath(frame.filename, APP_DIR)}:{frame.lineno}"
+    return f"{frames[-1].filename}:{frames[-1].lineno}"
+
+
+@contextlib.contextmanager
+def measure(name):
+    """
+    Records the memory an operation allocated and kept, and its peak, while tracemalloc is on.
+    Costs one check when it is off.
+    """
+    if not tracemalloc.is_tracing():
+        yield
+        return
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    start_bytes = tracemalloc.get_traced_memory()[0]
+    try:
+        yield
+    finally:
+        after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        differences = after.compare_to(before, "traceback")
+        top = [{"location": app_location(stat.traceback), "size_diff_bytes": stat.size_diff,
+                "count_diff": stat.count_diff}
+               for stat in differences[:TOP_ALLOCATIONS] if stat.size_diff]
+        operation = {
+            "name": name,
+            "time": time.time(),
+            "retained_bytes": current - start_bytes,
+            "peak_bytes": peak - start_bytes,
+            "top": top,
+        }
+        with _lock:
+            _operations.append(operation)
+        print(f"Memory: {name} kept {format_bytes(operation['retained_bytes'])}, "
+              f"peak {format_bytes(operation['peak_bytes'])}")
+
+
+def format_bytes(count):
+    if count is None:
+        return "?"
+    sign = "-" if count < 0 else ""
+    count = abs(count)
+    for unit in ("B", "KB", "MB"):
+        if count < 1024:
+            return f"{sign}{count:.0f} {unit}" if unit == "B" else f"{sign}{count:.1f} {unit}"
+        count /= 1024
+    return f"{sign}{count:.2f} GB"
+
+
+if os.environ.get("GROOVE_TRACEMALLOC") == "1":
+    enable_tracemalloc()
@@ -0,0 +1,92 @@
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox
+import tracemalloc
+import memory_accounting
+from memory_accounting import format_bytes
+
+REFRESH_INTERVAL_MS = 1000
+
+
+def open_memory_window():
+    """
+    Shows the memory held per subsystem and per track, refreshed every second.
+    """
+    memory_window = tk.Toplevel()
+    memory_window.title("Memory")
+
+    summary_var = tk.StringVar()
+    ttk.Label(memory_window, textvariable=summary_var, padding="10").pack(anchor="w")
+
+    tree = ttk.Treeview(memory_window, columns=("memory", "mapped", "buffers"), height=18)
+    tree.heading("#0", text="Held by")
+    tree.heading("memory", text="In memory")
+    tree.heading("mapped", text="Mapped from disk")
+    tree.heading("buffers", text="Buffers")
+    tree.column("#0", width=220)
+    for column in ("memory", "mapped", "buffers"):
+        tree.column(column, width=110, anchor="e")
+    tree.pack(fill="both", expand=True, padx=10)
+
+    operations = ttk.Treeview(memory_window, columns=("kept", "peak"), height=6)
+    operations.heading("#0", text="Operation (tracemalloc)")
+    operations.heading("kept", text="Kept")
+    operations.heading("peak", text="Peak")
+    operations.column("#0", width=330)
+    for column in ("kept", "peak"):
+        operations.column(column, width=110, anchor="e")
+    operations.pack(fill="x", padx=10, pady=5)
+
+    button_frame = ttk.Frame(memory_window, padding="10")
+    button_frame.pack(fill="x")
+    tracing_var = tk.BooleanVar(value=tracemalloc.is_tracing())
+
+    def toggle_tracemalloc():
+        if tracing_var.get():
+            memory_accounting.enable_tracemalloc()
+        else:
+            memory_accounting.disable_tracemalloc()
+
+    ttk.Checkbutton(button_frame, text="Measure each job with tracemalloc", variable=tracing_var,
+                    command=toggle_tracemalloc).pack(side="left", padx=5)
+
+    def save_json():
+        file_path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON", "*.json")])
+        if file_path:
+            memory_accounting.dump(file_path)
+            messagebox.showinfo("Memory", f"Memory report saved to {file_path}.")
+
+    ttk.Button(button_frame, text="Save JSON", command=save_json).pack(side="right", padx=5)
+
+    def refresh():
+        if not memory_window.winfo_exists():
+            return
+        report = memory_accounting.report()
+        summary = f"Audio buffers: {format_bytes(report['total_bytes'])}"
+        if report["mapped_bytes"]:
+            summary += f" (+{format_bytes(report['mapped_bytes'])} mapped)"
+        summary += f"   Process: {format_bytes(report['process_rss_bytes'])}"
+        if "tracemalloc" in report:
+            summary += f"   Python heap: {format_bytes(report['tracemalloc']['current_bytes'])}"
+        summary_var.set(summary)
+
+        tree.delete(*tree.get_children())
+        subsystems = tree.insert("", "end", text="Subsystems", open=True)
+        for name, held in report["subsystems"].items():
+            tree.insert(subsystems, "end", text=name,
+                        values=(format_bytes(held["bytes"]), format_bytes(held["mapped_bytes"]), held["buffers"]))
+        tracks = tree.insert("", "end", text="Tracks", open=True)
+        for track in report["tracks"]:
+            if not track["bytes"]:
+                continue
+            item = tree.insert(tracks, "end", text=f"Track {track['track']}",
+                               values=(format_bytes(track["bytes"]), "", ""))
+            for name, count in track["subsystems"].items():
+                tree.insert(item, "end", text=name, values=(format_bytes(count), "", ""))
+
+        operations.delete(*operations.get_children())
+        for operation in reversed(report["operations"]):
+            operations.insert("", "end", text=operation["name"],
+                              values=(format_bytes(operation["retained_bytes"]), format_bytes(operation["peak_bytes"])))
+        memory_window.after(REFRESH_INTERVAL_MS, refresh)
+
+    refresh()
@@ -0,0 +1,107 @@
+import json
+import os
+import numpy as np
+from event_log import EventLog, is_event_log_file
+from tracing import traced
+from audio_buffer import AudioBuffer
+from resample import resample_ratio
+from time_stretch import time_stretch
+from effects import EffectChain
+from automation import AutomationLane, mix_automated
+
+# Timeline layout, shared with the grid in track_timeline
+COLUMNS = 5  # 16-second intervals
+INTERVAL_DURATION = 16  # Each interval duration in seconds
+BASE_BPM = 120.0  # Tracks are assumed to be recorded at this tempo
+
+# Nothing in this module may import tkinter or pygame: the headless renderer runs it on servers
+
+
+@traced()
+def change_speed(sound, speed=1.0, preserve_pitch=False):
+    # Playing `speed` times faster at the same frame rate means 1/speed as many frames
+    if speed == 1.0:
+        return sound
+    print(f"Changing speed: {speed:.3f}x, {sound.frame_count} frames at {sound.frame_rate} Hz")
+    if preserve_pitch:
+        return AudioBuffer(time_stretch(sound.samples, speed), sound.frame_rate)
+    return AudioBuffer(resample_ratio(sound.samples, 1 / speed), sound.frame_rate)
+
+
+@traced()
+def mix_timeline(tracks, volume_levels, grid_active, progress=None, effect_chains=None, automation_lanes=None):
+    """
+    Mixes the tracks onto the timeline grid. grid_active[row][col] says whether track `row`
+    plays in interval `col`; each active interval plays the start of the track.
+    effect_chains[row], if given, is the track's EffectChain, rendered in blocks as playback runs it.
+    automation_lanes[row], if given, is the track's volume AutomationLane, on the output timeline.
+    progress, if given, is called with the fraction of tracks mixed so far.
+    """
+    final_audio = AudioBuffer.silent(INTERVAL_DURATION * COLUMNS * 1000)  # Initialize final audio with silence
+    interval_frames = final_audio.ms_to_frames(INTERVAL_DURATION * 1000)
+
+    for row, track in enumerate(tracks):
+        if track and row < len(grid_active):
+            # Adjust volume according to the volume slider
+            volume_level = volume_levels[row]
+
+            # Each active interval plays the beginning of the track; shorter tracks leave silence
+            segment = track.slice_ms(0, INTERVAL_DURATION * 1000)
+            if effect_chains and row < len(effect_chains) and effect_chains[row] and any(grid_active[row]):
+                segment = AudioBuffer(effect_chains[row].render(segment.samples, segment.frame_rate), segment.frame_rate)
+            lane = automation_lanes[row] if automation_lanes and row < len(automation_lanes) else None
+            for col in range(COLUMNS):
+                if grid_active[row][col] and volume_level > 0:
+                    if lane:
+                        mix_automated(final_audio.samples, segment.samples, col * interval_frames, lane,
+                                      final_audio.frame_rate, volume_level)
+                    else:
+                        final_audio.mix_into(segment, col * interval_frames, volume_level)
+
+        if progress:
+            progress((row + 1) / len(tracks))
+
+    # Clip like the old 16-bit overlay did, so export and playback agree
+    np.clip(final_audio.samples, -1.0, 1.0, out=final_audio.samples)
+    return final_audio
+
+
+@traced()
+def load_project_tracks(project_file):
+    """
+    Loads the tracks of a project JSON written by save_project, with the project's BPM applied
+    the same way Play All applies it. Returns (project_data, tracks).
+    """
+    with open(project_file, "r") as f:
+        project_data = json.load(f)
+
+    session_audios = os.path.join(os.path.dirname(os.path.abspath(project_file)), "session_audios")
+    speed_ratio = project_data.get("bpm", BASE_BPM) / BASE_BPM
+    preserve_pitch = project_data.get("preserve_pitch", [False] * len(project_data["tracks"]))
+    tracks = []
+    for i, rel_track_path in enumerate(project_data["tracks"]):
+        if not rel_track_path:
+            tracks.append(None)
+            continue
+        track_path = os.path.join(session_audios, rel_track_path)
+        if is_event_log_file(track_path):
+            audio = EventLog.load_midi(track_path).render()
+        else:
+            audio = AudioBuffer.from_file(track_path).to_engine_format()
+        tracks.append(change_speed(audio, speed_ratio, preserve_pitch[i]))
+    return project_data, tracks
+
+
+@traced()
+def render_project(project_file, output_path, audio_format="mp3"):
+    """
+    Renders a saved project to an audio file without Tk or an audio device.
+    """
+    project_data, tracks = load_project_tracks(project_file)
+    volume_levels = project_data.get("volume_levels", [1.0] * len(tracks))
+    effect_chains = [EffectChain.from_list(effects) for effects in project_data.get("effects", [])]
+    automation_lanes = [AutomationLane.from_list(points) for points in project_data.get("automation", [])]
+    final_audio = mix_timeline(tracks, volume_levels, project_data["grid_state"], effect_chains=effect_chains,
+                               automation_lanes=automation_lanes)
+    final_audio.export(output_path, format=audio_format)
+    return output_path
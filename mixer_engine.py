@@ -0,0 +1,292 @@
+import collections
+import threading
+import time
+import numpy as np
+from tracing import span
+from audio_buffer import ENGINE_FRAME_RATE, ENGINE_CHANNELS
+from automation import apply_envelope, frame_offsets
+
+# Block-based software mixer used by Play All.
+#
+# Every block, each track source is copied into a preallocated buffer, run through the track's
+# insert effects (in place), gain/pan/mute/solo are applied and the result is summed into a preallocated mix buffer. The mix is converted to 16-bit
+# and handed to one pygame channel through a short queue of Sounds (pygame copies the buffer,
+# so the output arrays themselves are reused). Parameters are read every block, so a change is
+# heard after at most QUEUE_DEPTH + 2 blocks, and the work per block does not depend on how long
+# the tracks are. With a loop region set, a block that reaches the end of the region continues
+# from its start, so the repeats are sample-accurate and nothing is rendered ahead of time.
+
+DEFAULT_BLOCK_SIZE = 1024  # frames, about 23 ms at 44.1 kHz
+QUEUE_DEPTH = 2  # Blocks rendered ahead of the one queued on the pygame channel
+
+
+def pan_gains(pan):
+    # Balance law: centre keeps both sides at unity, so panning never makes a track louder
+    return min(1.0, 1.0 - pan), min(1.0, 1.0 + pan)
+
+
+class MixerEngine:
+    def __init__(self, output_channel, track_count, frame_rate=ENGINE_FRAME_RATE, channels=ENGINE_CHANNELS,
+                 block_size=DEFAULT_BLOCK_SIZE):
+        # pygame stays out of the module imports so audio_processing can load before the mixer
+        import pygame
+        self._make_sound = pygame.mixer.Sound
+        self.output_channel = output_channel
+        self.frame_rate = frame_rate
+        self.channels = channels
+        self.block_size = block_size
+
+        # Live per-track parameters, read at the start of every block
+        self.gains = np.ones(track_count, dtype=np.float32)
+        self.pans = np.zeros(track_count, dtype=np.float32)
+        self.muted = np.zeros(track_count, dtype=bool)
+        self.soloed = np.zeros(track_count, dtype=bool)
+        self.levels = np.zeros(track_count, dtype=np.float32)  # Post-fader RMS of the last block
+
+        self.sources = [None] * track_count
+        self.effects = [None] * track_count  # EffectChain per track, or None
+        self.automation = [None] * track_count  # AutomationLane per track, or None
+        self.position = 0  # Frame of the tracks the next block starts at
+        self.loop = None  # (start_frame, end_frame) of the loop region, or None
+
+        self._mix = np.zeros((block_size, channels), dtype=np.float32)
+        self._track_block = np.zeros((block_size, channels), dtype=np.float32)
+        self._channel_gains = np.ones(channels, dtype=np.float32)
+        self._block_offsets = frame_offsets(block_size, frame_rate)
+        self._outputs = [np.zeros((block_size, channels), dtype=np.int16) for _ in range(QUEUE_DEPTH + 2)]
+        self._next_output = 0
+        self._pending = collections.deque()
+
+        self.playing = False
+        self.paused = False
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def resize(self, track_count):
+        """
+        Changes the number of tracks, keeping the state of the ones that remain. New tracks are silent
+        until the next play().
+        """
+        def resized(array, fill):
+            new = np.full(track_count, fill, dtype=array.dtype)
+            kept = min(track_count, len(array))
+            new[:kept] = array[:kept]
+            return new
+
+        with self._lock:
+            self.gains = resized(self.gains, 1.0)
+            self.pans = resized(self.pans, 0.0)
+            self.muted = resized(self.muted, False)
+            self.soloed = resized(self.soloed, False)
+            self.levels = resized(self.levels, 0.0)
+            del self.sources[track_count:]
+            del self.effects[track_count:]
+            del self.automation[track_count:]
+            self.sources.extend([None] * (track_count - len(self.sources)))
+            self.effects.extend([None] * (track_count - len(self.effects)))
+            self.automation.extend([None] * (track_count - len(self.automation)))
+
+    # Parameter setters can be called from the Tk thread at any time
+
+    def set_gain(self, track_index, gain):
+        self.gains[track_index] = gain
+
+    def set_pan(self, track_index, pan):
+        self.pans[track_index] = max(-1.0, min(1.0, pan))
+
+    def set_muted(self, track_index, muted):
+        self.muted[track_index] = muted
+
+    def set_soloed(self, track_index, soloed):
+        self.soloed[track_index] = soloed
+
+    def set_effects(self, track_index, chain):
+        if chain is not None:
+            chain.prepare(self.block_size, self.channels, self.frame_rate)
+        self.effects[track_index] = chain
+
+    def set_automation(self, track_index, lane):
+        self.automation[track_index] = lane
+
+    def set_loop(self, start_frame, end_frame):
+        """
+        Loops playback between two frames (None, None turns looping off). When a block reaches the end
+        of the region the rest of it is read from the start, so the repeats have no gap. The region
+        must be at least one block long.
+        """
+        if start_frame is None:
+            self.loop = None
+            return
+        if end_frame - start_frame < self.block_size:
+            raise ValueError("The loop region is shorter than one block.")
+        self.loop = (int(start_frame), int(end_frame))
+
+    def play(self, sources, start_frame=0):
+        """
+        Starts playing. sources[i] is a float32 (frames x channels) array for track i (or an
+        AudioBuffer's lazy_samples, read block by block), or None.
+        """
+        self.stop()
+        with self._lock:
+            for i in range(len(self.sources)):
+                self.sources[i] = sources[i] if i < len(sources) else None
+            self.position = start_frame
+            self.levels[:] = 0
+            for chain in self.effects:
+                if chain is not None:
+                    chain.reset()
+            self.playing = True
+            self.paused = False
+        self._thread = threading.Thread(target=self._run, name="mixer-engine", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.playing = False
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(1.0)
+        self._thread = None
+        self.output_channel.stop()
+        self._pending.clear()
+        self.levels[:] = 0
+
+    def pause(self):
+        if self.playing:
+            self.paused = True
+            self.output_channel.pause()
+
+    def resume(self):
+        if self.playing and self.paused:
+            self.paused = False
+            self.output_channel.unpause()
+
+    def playhead_window(self, track_index, frames):
+        """
+        Returns up to `frames` pre-fader frames of a track ending at the position being heard,
+        as a view of the engine's source (no copy), or None when the track isn't playing.
+        """
+        source = self.sources[track_index]
+        if not self.playing or source is None:
+            return None
+        end = min(len(source), self.heard_frame())
+        return source[max(0, end - frames):end]
+
+    def heard_frame(self):
+        """
+        The frame of the tracks being heard now, behind the one being mixed by the blocks rendered ahead.
+        """
+        # Blocks rendered ahead: the pending ones, the one queued on the channel and half the one playing
+        latency = int((len(self._pending) + 1.5) * self.block_size)
+        frame = self.position - latency
+        if self.loop is not None and frame < self.loop[0] <= self.position:
+            # The blocks rendered ahead have wrapped to the loop start; the one heard is still before the end
+            frame += self.loop[1] - self.loop[0]
+        return max(0, frame)
+
+    def _block_segments(self):
+        """
+        Returns ([(source_start, frames)], next_position) for the next block: one piece, or two
+        when the block runs over the end of the loop region.
+        """
+        position = self.position
+        if self.loop is None:
+            return [(position, self.block_size)], position + self.block_size
+        loop_start, loop_end = self.loop
+        if position >= loop_end:
+            position = loop_start
+        first = min(self.block_size, loop_end - position)
+        if first == self.block_size:
+            return [(position, self.block_size)], position + self.block_size
+        rest = self.block_size - first
+        return [(position, first), (loop_start, rest)], loop_start + rest
+
+    def mix_block(self, out):
+        """
+        Mixes the next block into `out` (block_size x channels int16) and advances the sources.
+        Returns False once every source has run out.
+        """
+        mix = self._mix
+        track_block = self._track_block
+        mix.fill(0)
+        any_solo = self.soloed.any()
+        remaining = False
+        segments, next_position = self._block_segments()
+
+        for i, source in enumerate(self.sources):
+            if source is None:
+                continue
+            # Frames of each piece the source still has (a loop can outlast a short track)
+            counts = [max(0, min(frames, len(source) - start)) for start, frames in segments]
+            if not any(counts):
+                self.levels[i] = 0
+                continue
+            remaining = True
+            if self.muted[i] or (any_solo and not self.soloed[i]):
+                self.levels[i] = 0
+                continue
+
+            offset = 0
+            for (start, frames), count in zip(segments, counts):
+                track_block[offset:offset + count] = source[start:start + count]
+                track_block[offset + count:offset + frames] = 0
+                offset += frames
+            chain = self.effects[i]
+            if chain:
+                chain.process(track_block)
+            lane = self.automation[i]
+            if lane:
+                # Volume automation is on the session timeline, which is where the track is
+                offset = 0
+                for start, frames in segments:
+                    apply_envelope(track_block[offset:offset + frames],
+                                   lane.envelope(start, frames, self.frame_rate, self._block_offsets))
+                    offset += frames
+            left, right = pan_gains(float(self.pans[i]))
+            gain = float(self.gains[i])
+            self._channel_gains[0] = gain * left
+            self._channel_gains[-1] = gain * right
+            np.multiply(track_block, self._channel_gains, out=track_block)
+            np.add(mix, track_block, out=mix)
+
+            flat = track_block.reshape(-1)
+            self.levels[i] = np.sqrt(np.dot(flat, flat) / flat.size)
+
+        np.clip(mix, -1.0, 1.0, out=mix)
+        np.multiply(mix, 32767, out=mix)
+        np.copyto(out, mix, casting="unsafe")
+        self.position = next_position
+        # A loop plays until it is stopped, even over a stretch where every track has ended
+        return remaining or (self.loop is not None and any(source is not None for source in self.sources))
+
+    def _render_next(self):
+        out = self._outputs[self._next_output]
+        self._next_output = (self._next_output + 1) % len(self._outputs)
+        with span("mixer_engine.block"):
+            remaining = self.mix_block(out)
+        if not remaining:
+            return None
+        return self._make_sound(buffer=out)
+
+    def _run(self):
+        block_seconds = self.block_size / self.frame_rate
+        finished = False
+        while self.playing:
+            # Keep a few blocks rendered ahead so a late wake-up doesn't starve the channel
+            while not finished and len(self._pending) < QUEUE_DEPTH:
+                with self._lock:
+                    sound = self._render_next()
+                if sound is None:
+                    finished = True
+                else:
+                    self._pending.append(sound)
+
+            if not self.paused and self._pending and self.output_channel.get_queue() is None:
+                sound = self._pending.popleft()
+                if self.output_channel.get_busy():
+                    self.output_channel.queue(sound)
+                else:
+                    self.output_channel.play(sound)
+            elif finished and not self._pending and not self.output_channel.get_busy():
+                break
+            time.sleep(block_seconds / 4)
+        self.playing = False
+        self.levels[:] = 0
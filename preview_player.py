@@ -0,0 +1,77 @@
+import time
+import numpy as np
+import globals
+import memory_accounting
+from tracing import traced
+
+# Previews (trim selection, equalized track) play on a pygame channel of their own, from the
+# buffer already in memory: no temp files, no second audio backend, and stop() silences them at
+# once. Playing a new preview replaces the one playing. While a preview plays, the previewed
+# track's meter follows it.
+
+METER_WINDOW_FRAMES = 2048  # Frames around the playhead measured for the meter
+
+
+class PreviewPlayer:
+    def __init__(self):
+        self.audio = None  # The AudioBuffer playing, in the engine format
+        self.sound = None
+        self.track_index = None
+        self.started = 0.0
+
+    @traced("preview_player.play")
+    def play(self, audio, track_index=None):
+        """
+        Returns False, playing nothing, while there is no preview channel: before init_mixer() has
+        run, or when the audio device failed to open.
+        """
+        import pygame
+        self.stop()
+        if globals.preview_channel is None:
+            return False
+        audio = audio.to_engine_format()
+        self.sound = pygame.mixer.Sound(buffer=audio.to_pcm())
+        self.audio = audio
+        self.track_index = track_index
+        globals.preview_channel.play(self.sound)
+        self.started = time.perf_counter()
+        from audio_processing import start_volume_meter_updates
+        start_volume_meter_updates()
+        return True
+
+    def stop(self):
+        if globals.preview_channel is not None:
+            globals.preview_channel.stop()
+        self.audio = None
+        self.sound = None
+        self.track_index = None
+
+    @property
+    def playing(self):
+        if self.audio is None or globals.preview_channel is None:
+            return False
+        if not globals.preview_channel.get_busy():
+            self.stop()
+            return False
+        return True
+
+    def level(self):
+        """
+        RMS of the preview just before the position being heard, or 0 when nothing plays.
+        """
+        audio = self.audio
+        if audio is None:
+            return 0.0
+        end = min(audio.frame_count, int((time.perf_counter() - self.started) * audio.frame_rate))
+        window = audio.samples[max(0, end - METER_WINDOW_FRAMES):end].reshape(-1)
+        if not window.size:
+            return 0.0
+        return float(np.sqrt(np.dot(window, window) / window.size))
+
+    def buffers(self):
+        yield self.track_index, self.audio
+        yield self.track_index, self.sound
+
+
+preview_player = PreviewPlayer()
+memory_accounting.register("previews", preview_player.buffers)
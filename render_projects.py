@@ -0,0 +1,53 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from mixdown import render_project
+
+# Headless batch renderer: no Tk window, no audio device. Only imports the mixdown code path.
+
+
+def render_one(project_file, output_dir, audio_format):
+    name = os.path.splitext(os.path.basename(project_file))[0]
+    out_dir = output_dir or os.path.dirname(os.path.abspath(project_file))
+    output_path = os.path.join(out_dir, f"{name}.{audio_format}")
+    start = time.perf_counter()
+    render_project(project_file, output_path, audio_format)
+    return output_path, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render saved Groove Window projects to audio without the GUI")
+    parser.add_argument("projects", nargs="+", help="Project JSON files written by Save Project")
+    parser.add_argument("-o", "--output-dir", help="Where to write the renders (default: next to each project)")
+    parser.add_argument("-f", "--format", default="mp3", help="Output format, e.g. mp3 or wav (default: mp3)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Number of worker processes (default: one per CPU)")
+    args = parser.parse_args(argv)
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    failures = 0
+    jobs = max(1, min(args.jobs, len(args.projects)))
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {
+            pool.submit(render_one, project_file, args.output_dir, args.format): project_file
+            for project_file in args.projects
+        }
+        for future in as_completed(futures):
+            project_file = futures[future]
+            try:
+                output_path, elapsed = future.result()
+                print(f"Rendered {project_file} -> {output_path} in {elapsed:.2f}s")
+            except Exception as e:
+                failures += 1
+                print(f"Failed to render {project_file}: {e}", file=sys.stderr)
+
+    print(f"{len(args.projects) - failures}/{len(args.projects)} projects rendered")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
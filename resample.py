@@ -0,0 +1,79 @@
+import functools
+from fractions import Fraction
+import numpy as np
+
+# Rational-ratio polyphase resampling, used for tempo changes and for converting files to the engine
+# rate. This computes the same thing as scipy.signal.resample_poly, but the filter is designed once
+# per ratio and long tracks are processed in chunks with enough overlap that the output is
+# identical to resampling the whole track at once.
+
+MAX_DENOMINATOR = 1000  # Ratios are approximated to within 1/MAX_DENOMINATOR**2
+ZERO_CROSSINGS = 10  # Filter half-length, in zero crossings of the lowest rate (resample_poly's default)
+KAISER_BETA = 5.0
+CHUNK_FRAMES = 65536
+
+
+def rational_ratio(ratio):
+    ratio = Fraction(ratio).limit_denominator(MAX_DENOMINATOR)
+    return ratio.numerator, ratio.denominator
+
+
+@functools.lru_cache(maxsize=32)
+def polyphase_filter(up, down):
+    """
+    Returns (filter, delay) for resampling by up/down. The filter is the anti-aliasing low-pass,
+    scaled by `up` and zero-padded in front so that output sample `delay` lines up with input 0.
+    """
+    import scipy.signal as signal
+    max_rate = max(up, down)
+    half_len = ZERO_CROSSINGS * max_rate
+    taps = signal.firwin(2 * half_len + 1, 1.0 / max_rate, window=("kaiser", KAISER_BETA)) * up
+    pre_pad = down - half_len % down
+    taps = np.concatenate((np.zeros(pre_pad), taps)).astype(np.float32)
+    taps.setflags(write=False)
+    return taps, (half_len + pre_pad) // down
+
+
+def resample_frames(samples, up, down):
+    """
+    Resamples a (frames x channels) float32 array by up/down along the first axis.
+    """
+    import scipy.signal as signal
+    divisor = np.gcd(up, down)
+    up, down = up // divisor, down // divisor
+    if up == down:
+        return samples.copy()
+
+    frame_count = len(samples)
+    output_count = -(-frame_count * up // down)
+    taps, delay = polyphase_filter(up, down)
+    # Input frames of context on each side of a chunk; a multiple of `down` keeps chunk
+    # boundaries on output samples
+    context = -(-len(taps) // up)
+    context = -(-context // down) * down
+    chunk = max(down, CHUNK_FRAMES // down * down)
+
+    resampled = np.empty((output_count,) + samples.shape[1:], dtype=np.float32)
+    for start in range(0, frame_count, chunk):
+        end = min(frame_count, start + chunk)
+        low = max(0, start - context)
+        high = end + context
+        x = samples[low:min(high, frame_count)]
+        if high > frame_count:
+            # Past the end the signal is silence, as resample_poly assumes
+            x = np.concatenate((x, np.zeros((high - frame_count,) + samples.shape[1:], dtype=x.dtype)))
+        y = signal.upfirdn(taps, x, up, down, axis=0)
+
+        out_start = start * up // down
+        out_end = -(-end * up // down)
+        offset = delay - low * up // down
+        resampled[out_start:out_end] = y[out_start + offset:out_end + offset]
+    return resampled
+
+
+def resample_ratio(samples, ratio):
+    """
+    Resamples so the output has `ratio` times as many frames as the input.
+    """
+    up, down = rational_ratio(ratio)
+    return resample_frames(samples, up, down)
@@ -0,0 +1,283 @@
+import argparse
+import hashlib
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Index of the sample folders in an SQLite database, so instrument windows list their sounds with a
+# query instead of hard-coded paths, and the shared library only has to be analyzed once.
+#
+# A scan walks the roots, compares each file's mtime and size with the index, and only decodes the
+# new or changed ones, spread over a process pool. Each row holds the duration, sample rate, peak
+# and RMS level, a BPM for loops, and a hash of the file contents. Samples are grouped by the folder
+# they are in ("category"), which is how the drum pad finds its kicks, snares and hats.
+#
+#   python sample_library.py /path/to/shared/library   # index a folder ahead of time
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+DRUMPAD_DIR = os.path.join(APP_DIR, "Sounds_Drumpad")
+PIANO_DIR = os.path.join(APP_DIR, "Sounds_Piano")
+DEFAULT_DATABASE = os.path.join(os.path.expanduser("~"), ".groove", "sample_library.sqlite3")
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".flac", ".ogg", ".aif", ".aiff")
+MIN_BPM_SECONDS = 4.0  # Shorter samples are one-shots, with no tempo to detect
+COMMIT_EVERY = 200  # Rows per transaction while scanning, so a cancelled scan keeps its work
+HASH_CHUNK = 1 << 20
+
+_scan_job = None  # Index scan running on the job pool, if any
+_scanned_roots = set()  # Roots scanned this session
+_waiting = []  # (root, callback) waiting for a scan to finish
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    path TEXT PRIMARY KEY,
+    root TEXT NOT NULL,
+    category TEXT NOT NULL COLLATE NOCASE,
+    name TEXT NOT NULL COLLATE NOCASE,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    duration REAL,
+    sample_rate INTEGER,
+    channels INTEGER,
+    peak REAL,
+    rms REAL,
+    bpm REAL,
+    content_hash TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS samples_by_category ON samples (category, name);
+CREATE INDEX IF NOT EXISTS samples_by_root ON samples (root);
+CREATE INDEX IF NOT EXISTS samples_by_hash ON samples (content_hash);
+"""
+
+
+def default_roots():
+    # GROOVE_SAMPLE_DIRS adds shared library folders, separated like PATH
+    extra = os.environ.get("GROOVE_SAMPLE_DIRS", "")
+    return [DRUMPAD_DIR, PIANO_DIR] + [path for path in extra.split(os.pathsep) if path]
+
+
+def connect(database=None):
+    database = database or os.environ.get("GROOVE_SAMPLE_LIBRARY", DEFAULT_DATABASE)
+    os.makedirs(os.path.dirname(os.path.abspath(database)), exist_ok=True)
+    connection = sqlite3.connect(database, timeout=30)
+    # WAL lets the windows query while a scan is writing
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def content_hash(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def detect_bpm(samples, frame_rate):
+    # librosa is optional here: without it loops are indexed with no BPM
+    try:
+        import librosa
+    except ImportError:
+        return None
+    tempo, _ = librosa.beat.beat_track(y=samples.mean(axis=1), sr=frame_rate)
+    return round(float(tempo), 1)
+
+
+def analyze_sample(path, root):
+    """
+    Decodes one file and returns its index row. Runs in a worker process.
+    """
+    import numpy as np
+    from audio_buffer import AudioBuffer
+    stat = os.stat(path)
+    category = os.path.basename(os.path.dirname(path))
+    name = os.path.splitext(os.path.basename(path))[0]
+    row = {"path": path, "root": root, "category": category, "name": name,
+           "mtime": stat.st_mtime, "size": stat.st_size}
+    try:
+        audio = AudioBuffer.from_file(path)
+        row.update(duration=audio.duration_seconds, sample_rate=audio.frame_rate, channels=audio.channels,
+                   peak=float(np.abs(audio.samples).max()) if audio.samples.size else 0.0, rms=audio.rms,
+                   bpm=detect_bpm(audio.samples, audio.frame_rate) if audio.duration_seconds >= MIN_BPM_SECONDS else None,
+                   content_hash=content_hash(path))
+    except Exception as e:
+        # Still listed (pygame may play what pydub can't decode), with no analysis
+        row["error"] = str(e) or type(e).__name__
+    return row
+
+
+def list_audio_files(root):
+    found = {}
+    for directory, _, files in os.walk(root):
+        for file_name in files:
+            if file_name.lower().endswith(AUDIO_EXTENSIONS):
+                path = os.path.join(directory, file_name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                found[path] = (stat.st_mtime, stat.st_size)
+    return found
+
+
+def scan(roots=None, database=None, workers=None, progress=None):
+    """
+    Brings the index up to date with the roots. Only new and modified files are analyzed;
+    rows of deleted files are removed. progress(fraction, message), if given, is called as
+    files finish. Returns (analyzed, removed).
+    """
+    roots = [os.path.abspath(root) for root in (roots or default_roots()) if os.path.isdir(root)]
+    connection = connect(database)
+    try:
+        pending = []
+        removed = 0
+        for root in roots:
+            found = list_audio_files(root)
+            # Files that failed to decode are retried, in case a missing decoder was installed since
+            indexed = dict(((path, (mtime, size)) for path, mtime, size in connection.execute(
+                "SELECT path, mtime, size FROM samples WHERE root = ? AND error IS NULL", (root,))))
+            errored = set(path for path, in connection.execute(
+                "SELECT path FROM samples WHERE root = ? AND error IS NOT NULL", (root,)))
+            gone = [(path,) for path in indexed.keys() | errored if path not in found]
+            connection.executemany("DELETE FROM samples WHERE path = ?", gone)
+            removed += len(gone)
+            pending.extend((path, root) for path, stamp in found.items() if indexed.get(path) != stamp)
+        connection.commit()
+        if not pending:
+            return 0, removed
+
+        columns = ("path", "root", "category", "name", "mtime", "size", "duration", "sample_rate", "channels",
+                   "peak", "rms", "bpm", "content_hash", "error")
+        insert = f"INSERT OR REPLACE INTO samples ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        workers = max(1, min(workers or os.cpu_count() or 1, len(pending)))
+        done = 0
+        # Spawned rather than forked: the app calls this from a worker thread of a process running
+        # pygame, the mixer engine and the job threads, which a fork would copy mid-flight
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            futures = [pool.submit(analyze_sample, path, root) for path, root in pending]
+            for future in as_completed(futures):
+                row = future.result()
+                connection.execute(insert, [row.get(column) for column in columns])
+                done += 1
+                if done % COMMIT_EVERY == 0:
+                    connection.commit()
+                if progress:
+                    progress(done / len(pending), f"Indexed {done} of {len(pending)} samples")
+        finally:
+            connection.commit()
+            pool.shutdown(wait=False, cancel_futures=True)
+        return done, removed
+    finally:
+        connection.close()
+
+
+def samples_in(category, root=None, database=None):
+    """
+    Returns [(name, path)] of the samples in a category (folder name), sorted by name.
+    """
+    query = "SELECT name, path FROM samples WHERE category = ?"
+    args = [category]
+    if root is not None:
+        query += " AND root = ?"
+        args.append(os.path.abspath(root))
+    connection = connect(database)
+    try:
+        return connection.execute(query + " ORDER BY name", args).fetchall()
+    finally:
+        connection.close()
+
+
+def has_samples(root, database=None):
+    connection = connect(database)
+    try:
+        return connection.execute("SELECT 1 FROM samples WHERE root = ? LIMIT 1", (os.path.abspath(root),)).fetchone() is not None
+    finally:
+        connection.close()
+
+
+def when_indexed(root, callback):
+    """
+    Calls callback on the Tk thread once root is in the index: at once if it has rows or was scanned
+    this session, else when the scan running on the job pool (or a new scan of root) finishes, e.g. on
+    the first run before the background scan is done. The Tk thread never scans.
+    """
+    root = os.path.abspath(root)
+    if root in _scanned_roots or has_samples(root):
+        callback()
+        return
+    if (root, callback) not in _waiting:
+        _waiting.append((root, callback))
+    if _scan_job is None or _scan_job.state not in ("pending", "running"):
+        _submit_scan([root], f"Indexing {os.path.basename(root)}")
+
+
+def app_relative_path(path):
+    # Paths inside the app folder are recorded relative to it, so MIDI recordings stay portable
+    relative = os.path.relpath(path, APP_DIR)
+    return path if relative.startswith(os.pardir) else relative.replace(os.sep, "/")
+
+
+def start_background_scan():
+    """
+    Refreshes the index on the job pool; called once the main window is up.
+    """
+    return _submit_scan(default_roots(), "Indexing sample library")
+
+
+def _submit_scan(roots, name):
+    global _scan_job
+    import job_scheduler
+
+    def work(job):
+        return scan(roots, progress=lambda fraction, message: job.report_progress(fraction, message))
+
+    def done(result):
+        analyzed, removed = result
+        if analyzed or removed:
+            print(f"Sample library: {analyzed} samples indexed, {removed} removed")
+        _scanned_roots.update(os.path.abspath(root) for root in roots)
+        waiting = list(_waiting)
+        _waiting.clear()
+        for root, callback in waiting:
+            when_indexed(root, callback)
+
+    def given_up():
+        # The roots stay unscanned, so the next request scans them again; the windows waiting now
+        # open with whatever the index already has rather than never
+        waiting = list(_waiting)
+        _waiting.clear()
+        for _, callback in waiting:
+            callback()
+
+    def failed(e):
+        print(f"Sample library scan failed: {e}")
+        given_up()
+
+    _scan_job = job_scheduler.submit(name, work, on_done=done, on_error=failed, on_cancel=given_up)
+    return _scan_job
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index sample folders for Groove Window")
+    parser.add_argument("roots", nargs="*", help="Folders to index (default: the app's sounds and GROOVE_SAMPLE_DIRS)")
+    parser.add_argument("--database", help=f"Index file (default: {DEFAULT_DATABASE})")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Number of worker processes (default: one per CPU)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    analyzed, removed = scan(args.roots or None, args.database, args.jobs,
+                             progress=lambda fraction, message: print(f"\r{message}", end="", flush=True))
+    if analyzed:
+        print()
+    print(f"{analyzed} samples indexed, {removed} removed in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+import time
+import numpy as np
+import globals
+from audio_buffer import ENGINE_FRAME_RATE, ENGINE_CHANNELS
+from tracing import span
+
+# Scrub playback: while a position is dragged, short Hann-windowed grains of the audio around it
+# are played on their own pygame channel, so edit points can be found by ear.
+#
+# Grains are cut straight from the track samples, in memory or in a mapped WAV file (one track, or
+# a quick mix of every audible track at its fader), into preallocated buffers, so building one
+# takes microseconds and it starts with the next buffer pygame mixes (pygame copies the PCM, so
+# one buffer is reused). At most one grain is started per GRAIN_MS: drag events in between only
+# move the target, and the latest target is played when the slot frees up, so a fast drag never
+# piles up audio behind the mouse.
+
+GRAIN_MS = 60
+GRAIN_FRAMES = ENGINE_FRAME_RATE * GRAIN_MS // 1000
+
+
+class Scrubber:
+    def __init__(self):
+        self.window = np.hanning(GRAIN_FRAMES).astype(np.float32)
+        self._mix = np.zeros((GRAIN_FRAMES, ENGINE_CHANNELS), dtype=np.float32)
+        self._pcm = np.zeros((GRAIN_FRAMES, ENGINE_CHANNELS), dtype=np.int16)
+        self.target = None  # (track_index or None for the mix, seconds)
+        self._played = None
+        self._last_grain = 0.0
+        self._after_id = None
+
+    def grain(self, track_index, seconds):
+        """
+        Returns the int16 grain centred on `seconds` of one track, or of the mix when track_index is None.
+        """
+        mix = self._mix
+        mix.fill(0)
+        start = int(seconds * ENGINE_FRAME_RATE) - GRAIN_FRAMES // 2
+        if track_index is None:
+            any_solo = globals.soloed_tracks.any()
+            indices = [i for i in range(globals.track_count)
+                       if not globals.muted_tracks[i] and (globals.soloed_tracks[i] or not any_solo)]
+        else:
+            indices = [track_index]
+        for i in indices:
+            track = globals.tracks[i]
+            if not track:
+                continue
+            samples = track.lazy_samples
+            gain = np.float32(globals.volume_levels[i]) if track_index is None else np.float32(1.0)
+            source_start = max(0, start)
+            offset = source_start - start
+            count = max(0, min(GRAIN_FRAMES - offset, len(samples) - source_start))
+            if count:
+                mix[offset:offset + count] += samples[source_start:source_start + count] * gain
+        for channel in range(ENGINE_CHANNELS):
+            np.multiply(mix[:, channel], self.window, out=mix[:, channel])
+        np.clip(mix, -1.0, 1.0, out=mix)
+        np.multiply(mix, 32767, out=mix)
+        np.copyto(self._pcm, mix, casting="unsafe")
+        return self._pcm
+
+    def scrub_to(self, track_index, seconds):
+        """
+        Called for every drag event. Plays a grain now if the rate limit allows, else makes sure the
+        latest position is played as soon as it does.
+        """
+        self.target = (track_index, max(0.0, seconds))
+        if self._after_id is not None:
+            return
+        wait_ms = int((self._last_grain + GRAIN_MS / 1000 - time.perf_counter()) * 1000)
+        if wait_ms <= 0:
+            self._play_target()
+        else:
+            self._after_id = globals.window.after(wait_ms, self._play_target)
+
+    def _play_target(self):
+        import pygame
+        self._after_id = None
+        channel = globals.scrub_channel
+        if channel is None or self.target is None or self.target == self._played:
+            return
+        with span("scrubber.grain"):
+            sound = pygame.mixer.Sound(buffer=self.grain(*self.target))
+        # Behind the grain still sounding, so grains join without a click; play at once otherwise
+        if channel.get_busy() and channel.get_queue() is None:
+            channel.queue(sound)
+        else:
+            channel.play(sound)
+        self._played = self.target
+        self._last_grain = time.perf_counter()
+
+    def stop(self):
+        if self._after_id is not None:
+            globals.window.after_cancel(self._after_id)
+            self._after_id = None
+        self.target = None
+        self._played = None
+
+
+scrubber = Scrubber()
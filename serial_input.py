@@ -0,0 +1,208 @@
+import collections
+import os
+import sys
+import threading
+import time
+import serial
+
+# Hit protocol: one ASCII line per hit, "H <pad> [<velocity>]\n".
+# Pads are numbered from 1 like the drum pad window's keys, velocity is 0-127 (default 127).
+# Any other line (e.g. a "#" comment or heartbeat from the rig) is ignored.
+DEFAULT_BAUDRATE = 115200
+LATENCY_HISTORY = 2048
+
+
+def parse_hit(line):
+    """
+    Parses one protocol line. Returns (pad_index, velocity) or None if the line is not a hit.
+    Raises ValueError for a hit line with bad fields.
+    """
+    parts = line.split()
+    if not parts or parts[0] not in ("H", "h"):
+        return None
+    if len(parts) not in (2, 3):
+        raise ValueError(f"Malformed hit message: {line!r}")
+    pad_index = int(parts[1]) - 1
+    velocity = int(parts[2]) if len(parts) == 3 else 127
+    if pad_index < 0 or not 0 <= velocity <= 127:
+        raise ValueError(f"Hit out of range: {line!r}")
+    return pad_index, velocity
+
+
+class SerialPadInput:
+    """
+    Reads hit messages from a serial port on a dedicated thread and triggers them on a second
+    thread, without going through the Tk event loop.
+    on_hit(pad_index, velocity, hit_time) is called for every hit; hit_time is the time.time()
+    at which the message arrived, so recordings are stamped with arrival rather than play time.
+    """
+
+    def __init__(self, port, baudrate=DEFAULT_BAUDRATE, on_hit=None):
+        self.port = port
+        self.baudrate = baudrate
+        self.on_hit = on_hit
+        # deque append/popleft are atomic, so the reader and dispatcher share it without a lock
+        self.events = collections.deque()
+        self.latencies = collections.deque(maxlen=LATENCY_HISTORY)  # in milliseconds
+        self.hit_count = 0
+        self.parse_errors = 0
+        self.error = None
+        self._serial = None
+        self._running = False
+        self._wakeup = threading.Event()
+        self._reader_thread = None
+        self._dispatch_thread = None
+
+    def start(self):
+        # Open on the caller's thread so a bad port is reported straight away
+        self._serial = serial.Serial(self.port, self.baudrate, timeout=0.05)
+        self._running = True
+        self._reader_thread = threading.Thread(target=self._read_loop, name="serial-pad-reader", daemon=True)
+        self._dispatch_thread = threading.Thread(target=self._dispatch_loop, name="serial-pad-dispatch", daemon=True)
+        self._dispatch_thread.start()
+        self._reader_thread.start()
+
+    def stop(self):
+        self._running = False
+        self._wakeup.set()
+        for thread in (self._reader_thread, self._dispatch_thread):
+            if thread and thread is not threading.current_thread():
+                thread.join(1.0)
+        if self._serial:
+            self._serial.close()
+            self._serial = None
+
+    def _read_loop(self):
+        pending = b""
+        while self._running:
+            try:
+                # Read whatever has arrived instead of readline(), which reads one byte per call
+                data = self._serial.read(self._serial.in_waiting or 1)
+            except (serial.SerialException, OSError) as e:
+                if self._running:
+                    self.error = str(e)
+                    print(f"Serial input error on {self.port}: {e}")
+                self._running = False
+                self._wakeup.set()
+                return
+            if not data:
+                continue
+            received = time.perf_counter()
+            hit_time = time.time()
+            pending += data
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                try:
+                    hit = parse_hit(line.decode("ascii", errors="replace"))
+                except ValueError as e:
+                    self.parse_errors += 1
+                    print(f"Serial input: {e}")
+                    continue
+                if hit:
+                    self.events.append((hit[0], hit[1], hit_time, received))
+            self._wakeup.set()
+
+    def _dispatch_loop(self):
+        while self._running:
+            try:
+                pad_index, velocity, hit_time, received = self.events.popleft()
+            except IndexError:
+                self._wakeup.wait(0.1)
+                self._wakeup.clear()
+                continue
+            try:
+                if self.on_hit:
+                    self.on_hit(pad_index, velocity, hit_time)
+            except Exception as e:
+                print(f"Serial input: failed to trigger pad {pad_index + 1}: {e}")
+            self.latencies.append((time.perf_counter() - received) * 1000)
+            self.hit_count += 1
+
+    def latency_stats(self):
+        """
+        Returns the hit count and the message-arrival-to-trigger latency over recent hits, in ms.
+        """
+        latencies = sorted(self.latencies)
+        if not latencies:
+            return {"count": self.hit_count, "parse_errors": self.parse_errors,
+                    "mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+        return {
+            "count": self.hit_count,
+            "parse_errors": self.parse_errors,
+            "mean_ms": sum(latencies) / len(latencies),
+            "p50_ms": latencies[len(latencies) // 2],
+            "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+            "max_ms": latencies[-1],
+        }
+
+
+def open_pty_pair():
+    """
+    Opens a pseudo-terminal pair for testing without hardware (POSIX only).
+    Returns (master_fd, port_name): write protocol lines to master_fd, open port_name as the rig.
+    """
+    import tty
+    master_fd, slave_fd = os.openpty()
+    tty.setraw(slave_fd)
+    return master_fd, os.ttyname(slave_fd)
+
+
+def run_pty_selftest(hit_count=200, interval=0.002):
+    """
+    Sends hits through a pseudo-terminal pair and checks they all arrive in order.
+    """
+    master_fd, port = open_pty_pair()
+    received = []
+    done = threading.Event()
+
+    def on_hit(pad_index, velocity, hit_time):
+        received.append((pad_index, velocity))
+        if len(received) == hit_count:
+            done.set()
+
+    pad_input = SerialPadInput(port, on_hit=on_hit)
+    pad_input.start()
+    try:
+        expected = [(i % 4, (i * 7) % 128) for i in range(hit_count)]
+        os.write(master_fd, b"# pad rig selftest\n")
+        for pad_index, velocity in expected:
+            os.write(master_fd, f"H {pad_index + 1} {velocity}\n".encode("ascii"))
+            time.sleep(interval)
+        done.wait(5.0)
+    finally:
+        pad_input.stop()
+        os.close(master_fd)
+
+    stats = pad_input.latency_stats()
+    print(f"Received {len(received)}/{hit_count} hits, parse errors: {stats['parse_errors']}")
+    print(f"Latency: mean {stats['mean_ms']:.3f} ms, p50 {stats['p50_ms']:.3f} ms, "
+          f"p95 {stats['p95_ms']:.3f} ms, max {stats['max_ms']:.3f} ms")
+    return received == expected, stats
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serial hardware pad input")
+    parser.add_argument("--port", help="Serial port to monitor, e.g. /dev/ttyACM0 or COM3")
+    parser.add_argument("--baudrate", type=int, default=DEFAULT_BAUDRATE)
+    parser.add_argument("--selftest", action="store_true", help="Run against a pseudo-terminal pair, no hardware needed")
+    args = parser.parse_args()
+
+    if args.selftest:
+        ok, _ = run_pty_selftest()
+        sys.exit(0 if ok else 1)
+    if not args.port:
+        parser.error("--port or --selftest is required")
+
+    monitor = SerialPadInput(args.port, args.baudrate,
+                             on_hit=lambda pad, velocity, _: print(f"Pad {pad + 1} velocity {velocity}"))
+    monitor.start()
+    try:
+        while monitor.error is None:
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        monitor.stop()
+        print(monitor.latency_stats())
@@ -0,0 +1,134 @@
+import tkinter as tk
+import numpy as np
+import globals
+from tracing import span
+
+# Live spectrum of the audio under the playhead, before and after the equalizer settings.
+# Samples come straight from the buffers Play All is playing (or the loaded track at the cursor
+# when stopped); nothing is decoded again. Each frame runs a batch of overlapping Hann-windowed
+# rffts, averages their power into log-spaced bands and draws three polylines on a canvas.
+
+FFT_SIZE = 2048
+HOP = FFT_SIZE // 4
+WINDOW_FRAMES = FFT_SIZE + 4 * HOP  # 5 overlapping FFTs, about 93 ms at 44.1 kHz
+BAND_COUNT = 48
+MIN_FREQUENCY = 30.0
+FRAME_INTERVAL_MS = 33  # About 30 frames per second
+FLOOR_DB = -90.0
+PEAK_DECAY_DB = 0.5  # Per frame
+
+
+class SpectrumAnalyzer:
+    def __init__(self, parent, sample_rate, width=600, height=180):
+        self.canvas = tk.Canvas(parent, width=width, height=height, bg="black", highlightthickness=0)
+        self.width = width
+        self.height = height
+        self.sample_rate = sample_rate
+        self.track_index = 0
+        self.bands = None
+        self._response_key = None
+        self._running = False
+
+        self.window = np.hanning(FFT_SIZE).astype(np.float32)
+        # Power of a full-scale sine, so 0 dB is the top of the panel
+        self.reference_power = (self.window.sum() / 2) ** 2
+        frequencies = np.fft.rfftfreq(FFT_SIZE, 1 / sample_rate)
+        edges = np.geomspace(MIN_FREQUENCY, sample_rate / 2, BAND_COUNT + 1)
+        self.band_of_bin = np.clip(np.searchsorted(edges, frequencies) - 1, -1, BAND_COUNT - 1)
+        self.used_bins = self.band_of_bin >= 0
+        bins_per_band = np.bincount(self.band_of_bin[self.used_bins], minlength=BAND_COUNT)
+        self.bins_per_band = np.maximum(bins_per_band, 1)
+        # Low bands narrower than an FFT bin read the bin nearest their centre instead
+        self.empty_bands = bins_per_band == 0
+        centres = np.sqrt(edges[:-1] * edges[1:])
+        self.centre_bins = np.clip(np.round(centres * FFT_SIZE / sample_rate).astype(int), 0, len(frequencies) - 1)
+        self.frequencies = frequencies
+        self.eq_gain = np.ones(len(frequencies))
+        self.peaks = np.full(BAND_COUNT, FLOOR_DB)
+
+        x = np.linspace(0, width, BAND_COUNT)
+        self.x = x
+        flat = [value for point in zip(x, np.full(BAND_COUNT, height)) for value in point]
+        self.before_line = self.canvas.create_line(*flat, fill="gray60")
+        self.after_line = self.canvas.create_line(*flat, fill="deep sky blue", width=2)
+        self.peak_line = self.canvas.create_line(*flat, fill="orange", dash=(2, 2))
+        self.canvas.create_text(4, 4, anchor="nw", fill="gray60", text="before EQ")
+        self.canvas.create_text(70, 4, anchor="nw", fill="deep sky blue", text="after EQ")
+
+    def start(self):
+        if not self._running:
+            self._running = True
+            self.canvas.after(FRAME_INTERVAL_MS, self._tick)
+
+    def stop(self):
+        self._running = False
+
+    def set_track(self, track_index):
+        self.track_index = track_index
+        self.peaks[:] = FLOOR_DB
+
+    def set_bands(self, bands):
+        self.bands = dict(bands)
+
+    def _update_response(self):
+        from equalizer import equalizer_response
+        key = tuple(sorted(self.bands.items())) if self.bands else None
+        if key != self._response_key:
+            self._response_key = key
+            if self.bands is None:
+                self.eq_gain = np.ones(len(self.frequencies))
+            else:
+                self.eq_gain = equalizer_response(self.bands, self.frequencies, self.sample_rate) ** 2
+
+    def current_samples(self):
+        if self.track_index >= globals.track_count:
+            return None
+        engine = globals.mixer_engine
+        if engine is not None and engine.playing:
+            return engine.playhead_window(self.track_index, WINDOW_FRAMES)
+        track = globals.tracks[self.track_index]
+        if not track:
+            return None
+        start = track.ms_to_frames(globals.cursor_position * 1000)
+        return track.lazy_samples[start:start + WINDOW_FRAMES]
+
+    def band_levels(self, samples):
+        """
+        Returns (before_db, after_db) per band for a (frames x channels) block.
+        """
+        mono = samples.mean(axis=1) if samples.ndim == 2 else samples
+        if len(mono) < WINDOW_FRAMES:
+            mono = np.pad(mono, (0, WINDOW_FRAMES - len(mono)))
+        frames = np.lib.stride_tricks.sliding_window_view(mono, FFT_SIZE)[::HOP]
+        spectrum = np.fft.rfft(frames * self.window, axis=-1)
+        power = (spectrum.real ** 2 + spectrum.imag ** 2).mean(axis=0) / self.reference_power
+
+        equalized = power * self.eq_gain
+        bands = self.band_of_bin[self.used_bins]
+        before = np.bincount(bands, power[self.used_bins], minlength=BAND_COUNT) / self.bins_per_band
+        after = np.bincount(bands, equalized[self.used_bins], minlength=BAND_COUNT) / self.bins_per_band
+        before[self.empty_bands] = power[self.centre_bins[self.empty_bands]]
+        after[self.empty_bands] = equalized[self.centre_bins[self.empty_bands]]
+        floor = 10 ** (FLOOR_DB / 10)
+        return 10 * np.log10(np.maximum(before, floor)), 10 * np.log10(np.maximum(after, floor))
+
+    def _to_coords(self, levels_db):
+        y = self.height * (levels_db / FLOOR_DB).clip(0, 1)
+        return [value for point in zip(self.x, y) for value in point]
+
+    def _tick(self):
+        if not self._running or not self.canvas.winfo_exists():
+            self._running = False
+            return
+        with span("spectrum_analyzer.frame"):
+            self._update_response()
+            samples = self.current_samples()
+            if samples is not None and len(samples):
+                before, after = self.band_levels(samples)
+            else:
+                before = after = np.full(BAND_COUNT, FLOOR_DB)
+            self.peaks = np.maximum(after, self.peaks - PEAK_DECAY_DB)
+            self.canvas.coords(self.before_line, *self._to_coords(before))
+            self.canvas.coords(self.after_line, *self._to_coords(after))
+            self.canvas.coords(self.peak_line, *self._to_coords(self.peaks))
+        self.canvas.after(FRAME_INTERVAL_MS, self._tick)
@@ -0,0 +1,102 @@
+import builtins
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+# Startup-time measurement mode: run with GROOVE_STARTUP_PROFILE=1 to print how long each module
+# import and init step took before the window was usable. Set GROOVE_STARTUP_PROFILE_FILE to also
+# write the numbers as JSON.
+
+enabled = os.environ.get("GROOVE_STARTUP_PROFILE") == "1"
+REPORT_TOP_IMPORTS = 20
+
+_process_start = time.perf_counter()
+import_times = {}  # module name -> (inclusive seconds, self seconds)
+steps = []  # (label, seconds) for measured init steps
+marks = []  # (label, seconds since start)
+_original_import = None
+
+
+def install_import_timer():
+    """
+    Wraps __import__ so the first import of every module is timed, with and without its children.
+    """
+    global _original_import
+    if _original_import is not None:
+        return
+    _original_import = builtins.__import__
+    child_time = []
+
+    def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules:
+            return _original_import(name, globals, locals, fromlist, level)
+        start = time.perf_counter()
+        child_time.append(0.0)
+        try:
+            return _original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = child_time.pop()
+            if child_time:
+                child_time[-1] += elapsed
+            import_times.setdefault(name, (elapsed, elapsed - children))
+
+    builtins.__import__ = timed_import
+
+
+def start():
+    if enabled:
+        install_import_timer()
+
+
+@contextmanager
+def measure(label):
+    if not enabled:
+        yield
+        return
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        steps.append((label, time.perf_counter() - start_time))
+
+
+def mark(label):
+    if enabled:
+        marks.append((label, time.perf_counter() - _process_start))
+
+
+def report():
+    if not enabled:
+        return None
+    if _original_import is not None:
+        builtins.__import__ = _original_import
+
+    top_level = sorted(
+        ((name, times) for name, times in import_times.items() if "." not in name),
+        key=lambda item: item[1][0], reverse=True
+    )[:REPORT_TOP_IMPORTS]
+    print("\nStartup profile")
+    print(f"{'import':32s} {'total ms':>10s} {'self ms':>10s}")
+    for name, (inclusive, self_time) in top_level:
+        print(f"{name:32s} {inclusive * 1000:10.1f} {self_time * 1000:10.1f}")
+    print(f"\n{'init step':32s} {'ms':>10s}")
+    for label, seconds in steps:
+        print(f"{label:32s} {seconds * 1000:10.1f}")
+    print(f"\n{'milestone':32s} {'ms since start':>14s}")
+    for label, seconds in marks:
+        print(f"{label:32s} {seconds * 1000:14.1f}")
+
+    profile = {
+        "imports": {name: {"total_ms": inclusive * 1000, "self_ms": self_time * 1000}
+                    for name, (inclusive, self_time) in import_times.items()},
+        "steps": {label: seconds * 1000 for label, seconds in steps},
+        "marks": {label: seconds * 1000 for label, seconds in marks},
+    }
+    profile_file = os.environ.get("GROOVE_STARTUP_PROFILE_FILE")
+    if profile_file:
+        with open(profile_file, "w") as f:
+            json.dump(profile, f, indent=2)
+    return profile
@@ -0,0 +1,204 @@
+import collections
+import threading
+import time
+import numpy as np
+from audio_buffer import AudioBuffer, ENGINE_FRAME_RATE, ENGINE_CHANNELS
+from event_log import velocity_to_gain
+from tracing import span
+
+# Step sequencer for the drum pad: one row of steps per pad, one bar of 16th notes, locked to the
+# session BPM.
+#
+# The pattern is rendered into a loop buffer with every hit at an exact frame, and the loop is
+# played over and over on one pygame channel with Channel.queue(), so there are no gaps between
+# loops and no timer jitter inside them. Each pad's part of the loop is rendered and cached
+# separately: editing a step re-renders that pad only and sums the parts again. Finished loops
+# are cached by pattern, samples and BPM, so switching back to a pattern costs nothing.
+#
+# Hits whose sample runs past the end of the loop wrap around to its start, so a long crash
+# keeps ringing into the next loop the way it would on a drum machine. Edits are heard from the
+# next loop on: the loop already queued behind the playing one is replaced with the new one.
+
+STEPS = 16
+STEPS_PER_BEAT = 4
+DEFAULT_VELOCITY = 127
+MAX_CACHED_LOOPS = 8
+POLL_SECONDS = 0.01
+
+
+def step_frames(bpm):
+    return ENGINE_FRAME_RATE * 60.0 / bpm / STEPS_PER_BEAT
+
+
+def step_start(step, bpm):
+    # Rounded per step rather than accumulated, so rounding errors never add up along the bar
+    return int(round(step * step_frames(bpm)))
+
+
+class StepSequencer:
+    def __init__(self, pad_count, load_sample, steps=STEPS):
+        """
+        load_sample(path) returns the sample as a float32 (frames x channels) array in the engine format.
+        """
+        self.steps = steps
+        self.load_sample = load_sample
+        self.patterns = [[0] * steps for _ in range(pad_count)]  # Velocity per step, 0 is off
+        self.sample_paths = [None] * pad_count
+        self.bpm = 120
+        self._parts = [(None, None)] * pad_count  # (key, rendered part) per pad
+        self._loops = collections.OrderedDict()  # (patterns, samples, bpm) -> (Sound, frames)
+        self.sound = None  # The loop queued from the next loop boundary on
+        self.channel = None
+        self._queued = None  # The loop in the channel's queue slot, waiting for the boundary
+        self._lock = threading.Lock()  # Between edits on the Tk thread and the sequencer thread
+        self.playing = False
+        self.loop_started = 0.0
+        self.loop_seconds = 0.0
+        self._thread = None
+
+    def loop_length(self, bpm):
+        return step_start(self.steps, bpm)
+
+    def set_step(self, pad_index, step, velocity):
+        self.patterns[pad_index][step] = velocity
+        self._refresh()
+
+    def toggle_step(self, pad_index, step):
+        velocity = 0 if self.patterns[pad_index][step] else DEFAULT_VELOCITY
+        self.set_step(pad_index, step, velocity)
+        return velocity
+
+    def set_sample(self, pad_index, sample_path):
+        self.sample_paths[pad_index] = sample_path
+        self._refresh()
+
+    def set_bpm(self, bpm):
+        if bpm > 0 and bpm != self.bpm:
+            self.bpm = bpm
+            self._refresh()
+
+    def clear(self):
+        for pattern in self.patterns:
+            pattern[:] = [0] * self.steps
+        self._refresh()
+
+    def render_part(self, pad_index, bpm):
+        """
+        Returns one pad's hits rendered over a whole loop, re-rendering only if its steps, sample or the BPM changed.
+        """
+        pattern = tuple(self.patterns[pad_index])
+        sample_path = self.sample_paths[pad_index]
+        key = (pattern, sample_path, bpm)
+        cached_key, part = self._parts[pad_index]
+        if cached_key == key:
+            return part
+        part = None
+        if sample_path and any(pattern):
+            with span("step_sequencer.render_part", pad=pad_index):
+                loop_frames = self.loop_length(bpm)
+                sample = self.load_sample(sample_path)
+                part = np.zeros((loop_frames, ENGINE_CHANNELS), dtype=np.float32)
+                for step, velocity in enumerate(pattern):
+                    if velocity:
+                        add_wrapped(part, sample, step_start(step, bpm), 10 ** (velocity_to_gain(velocity) / 20))
+        self._parts[pad_index] = (key, part)
+        return part
+
+    def render(self, bpm=None):
+        """
+        Returns (Sound, frames) for the whole loop, from the cache when this pattern was rendered before.
+        """
+        import pygame
+        bpm = bpm or self.bpm
+        key = (tuple(tuple(pattern) for pattern in self.patterns), tuple(self.sample_paths), bpm)
+        loop = self._loops.get(key)
+        if loop is not None:
+            self._loops.move_to_end(key)
+            return loop
+        loop_frames = self.loop_length(bpm)
+        mix = np.zeros((loop_frames, ENGINE_CHANNELS), dtype=np.float32)
+        for pad_index in range(len(self.patterns)):
+            part = self.render_part(pad_index, bpm)
+            if part is not None:
+                np.add(mix, part, out=mix)
+        sound = pygame.mixer.Sound(buffer=AudioBuffer(mix, ENGINE_FRAME_RATE).to_pcm())
+        loop = (sound, loop_frames)
+        self._loops[key] = loop
+        while len(self._loops) > MAX_CACHED_LOOPS:
+            self._loops.popitem(last=False)
+        return loop
+
+    def _refresh(self):
+        if not self.playing:
+            return
+        sound = self.render()[0]
+        with self._lock:
+            self.sound = sound
+            if self._queued is not None and self.channel.get_queue() is not None:
+                self.channel.queue(sound)  # Replaces the old loop waiting in the slot
+                self._queued = sound
+
+    def start(self, channel):
+        if self.playing:
+            return
+        self.channel = channel
+        self.sound = self.render()[0]
+        self._queued = None
+        self.playing = True
+        channel.play(self.sound)
+        self._loop_begun(self.sound)
+        self._thread = threading.Thread(target=self._run, name="step-sequencer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.playing = False
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(1.0)
+        self._thread = None
+        if self.channel is not None:
+            self.channel.stop()
+
+    def current_step(self):
+        # For the playhead in the window; follows the loop that is audible now
+        if not self.playing or not self.loop_seconds:
+            return None
+        fraction = ((time.perf_counter() - self.loop_started) % self.loop_seconds) / self.loop_seconds
+        return min(int(fraction * self.steps), self.steps - 1)
+
+    def _loop_begun(self, sound):
+        self.loop_started = time.perf_counter()
+        self.loop_seconds = sound.get_length()
+
+    def _run(self):
+        while self.playing:
+            # pygame holds one queued sound; put the next loop behind the playing one as soon as
+            # the slot is free, i.e. right after a loop boundary
+            with self._lock:
+                if self.channel.get_queue() is None:
+                    if self._queued is not None:
+                        self._loop_begun(self._queued)
+                    self._queued = self.sound
+                    if self.channel.get_busy():
+                        self.channel.queue(self._queued)
+                    else:
+                        self.channel.play(self._queued)
+                        self._loop_begun(self._queued)
+                        self._queued = None
+            time.sleep(POLL_SECONDS)
+
+    def buffers(self):
+        for _, part in self._parts:
+            yield None, part
+        for sound, _ in list(self._loops.values()):
+            yield None, sound
+
+
+def add_wrapped(part, sample, start, gain):
+    # Adds a hit at start, wrapping whatever runs past the end of the loop around to its beginning
+    position = start
+    remaining = sample
+    while len(remaining):
+        count = min(len(remaining), len(part) - position)
+        part[position:position + count] += remaining[:count] * np.float32(gain)
+        remaining = remaining[count:]
+        position = 0
@@ -0,0 +1,131 @@
+import collections
+import functools
+import json
+import os
+import threading
+import time
+
+# Lightweight tracing spans, off unless GROOVE_TRACE=1 (or enable() is called).
+# Finished spans go into a fixed-size ring buffer and can be dumped as Chrome trace-event JSON,
+# which opens in chrome://tracing or https://ui.perfetto.dev.
+# Set GROOVE_TRACE_FILE to also dump the buffer there when the app exits.
+
+DEFAULT_BUFFER_SIZE = 65536
+
+enabled = os.environ.get("GROOVE_TRACE") == "1"
+_events = collections.deque(maxlen=int(os.environ.get("GROOVE_TRACE_BUFFER", DEFAULT_BUFFER_SIZE)))
+_thread_names = {}
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        thread = threading.current_thread()
+        _thread_names[thread.ident] = thread.name
+        # deque.append is atomic, so spans from any thread can be recorded without a lock
+        _events.append((self.name, self.start, end - self.start, thread.ident, self.args))
+        return False
+
+
+def span(name, **args):
+    """
+    Context manager timing a block. Costs one flag check when tracing is off.
+    """
+    if not enabled:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+
+def traced(name=None):
+    """
+    Decorator recording a span for every call of the function.
+    """
+    def decorate(func):
+        span_name = name or f"{func.__module__}.{func.__name__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            with _Span(span_name, None):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def enable(buffer_size=None):
+    global enabled, _events
+    if buffer_size and buffer_size != _events.maxlen:
+        _events = collections.deque(_events, maxlen=buffer_size)
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def clear():
+    _events.clear()
+
+
+def chrome_trace():
+    """
+    Returns the buffered spans in Chrome trace-event format.
+    """
+    pid = os.getpid()
+    trace_events = [
+        {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread_name}}
+        for tid, thread_name in list(_thread_names.items())
+    ]
+    for name, start, duration, tid, args in list(_events):
+        event = {
+            "name": name,
+            "cat": name.split(".", 1)[0],
+            "ph": "X",
+            "ts": start / 1000,
+            "dur": duration / 1000,
+            "pid": pid,
+            "tid": tid,
+        }
+        if args:
+            event["args"] = args
+        trace_events.append(event)
+    return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+
+def dump(file_path):
+    with open(file_path, "w") as f:
+        json.dump(chrome_trace(), f)
+    return file_path
+
+
+def dump_on_exit():
+    trace_file = os.environ.get("GROOVE_TRACE_FILE")
+    if enabled and trace_file:
+        dump(trace_file)
+        print(f"Trace written to {trace_file}")
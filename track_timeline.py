@@ -1,82 +1,123 @@
 import tkinter as tk
 import globals
-import pygame
 import threading
 from time import sleep
-import io
+import numpy as np
+from mixdown import COLUMNS, INTERVAL_DURATION
+from audio_buffer import AudioBuffer
+from tracing import traced, span
+from undo_journal import journal, GridToggleStep
 
 
-ROWS = 10  # Number of tracks
-COLUMNS = 5  # 16-second intervals
-INTERVAL_DURATION = 16  # Each interval duration in seconds
-
-# Initialize a grid state to keep track of active cells (True for active, False for inactive)
-grid_state = [[{"active": False, "button": None} for _ in range(COLUMNS)] for _ in range(ROWS)]
+# Initialize a grid state to keep track of active cells (True for active, False for inactive),
+# one row per track; rows are added and removed with the track count
+grid_state = [[{"active": False, "button": None} for _ in range(COLUMNS)] for _ in range(globals.track_count)]
+row_labels = []
+timeline_frame = None
 
 
 def setup_track_timeline(window):
     """
-    Sets up the 10x5 grid in the main window for track management.
+    Sets up the track x interval grid in the main window for track management.
     """
+    global timeline_frame
     timeline_frame = tk.Frame(window)
-    timeline_frame.grid(row=10, column=1, rowspan=ROWS, columnspan=COLUMNS + 1, padx=20, pady=20, sticky="nsew")
-
-    # Add labels for each track (rows)
-    for row in range(ROWS):
-        track_label = tk.Label(timeline_frame, text=f"Track {row + 1}", anchor="e", width=10)
-        track_label.grid(row=row, column=0, padx=5, pady=5, sticky="w")
-
-    # Create grid buttons
-    for row in range(ROWS):
-        for col in range(COLUMNS):
-            cell_button = tk.Button(
-                timeline_frame,
-                bg="white",
-                width=5,
-                height=1,
-                command=lambda r=row, c=col: toggle_cell(r, c)
-            )
-            cell_button.grid(row=row, column=col + 1, padx=5, pady=5)
-            # Store button reference in grid_state for easy toggling
-            grid_state[row][col]["button"] = cell_button
+    timeline_frame.grid(row=0, column=0, padx=20, pady=20, sticky="nsew")
+    for row in range(len(grid_state)):
+        add_row_widgets(row)
+
+
+def add_row_widgets(row):
+    track_label = tk.Label(timeline_frame, text=f"Track {row + 1}", anchor="e", width=10)
+    track_label.grid(row=row, column=0, padx=5, pady=5, sticky="w")
+    row_labels.append(track_label)
+
+    for col in range(COLUMNS):
+        cell_button = tk.Button(
+            timeline_frame,
+            bg="blue" if grid_state[row][col]["active"] else "white",
+            width=5,
+            height=1,
+            command=lambda r=row, c=col: toggle_cell(r, c)
+        )
+        cell_button.grid(row=row, column=col + 1, padx=5, pady=5)
+        # Store button reference in grid_state for easy toggling
+        grid_state[row][col]["button"] = cell_button
+
+
+def resize_timeline(count):
+    while len(grid_state) > count:
+        for cell in grid_state.pop():
+            if cell["button"] is not None:
+                cell["button"].destroy()
+        if len(row_labels) > len(grid_state):
+            row_labels.pop().destroy()
+    while len(grid_state) < count:
+        grid_state.append([{"active": False, "button": None} for _ in range(COLUMNS)])
+        if timeline_frame is not None:
+            add_row_widgets(len(grid_state) - 1)
+
+
+globals.track_count_listeners.append(resize_timeline)
 
 
 def toggle_cell(row, col):
     """
     Toggles the state of a cell in the grid.
     """
+    active = not grid_state[row][col]["active"]
+    set_cell_active(row, col, active)
+    journal.record(GridToggleStep(row, col, active))
+
+
+def set_cell_active(row, col, active):
     cell = grid_state[row][col]
-    cell["active"] = not cell["active"]
-    cell["button"].configure(bg="blue" if cell["active"] else "white")
+    cell["active"] = active
+    if cell["button"] is not None:
+        cell["button"].configure(bg="blue" if active else "white")
 
 
-def convert_audio_segment_to_pygame_sound(audio_segment):
+@traced()
+def convert_buffer_to_pygame_sound(audio):
     """
-    Converts a pydub.AudioSegment to a pygame.mixer.Sound object.
+    Converts an AudioBuffer to a pygame.mixer.Sound object.
     """
-    audio_data = io.BytesIO()
-    audio_segment.export(audio_data, format="wav")
-    audio_data.seek(0)
-    return pygame.mixer.Sound(audio_data)
+    import pygame
+    return pygame.mixer.Sound(buffer=audio.to_engine_format().to_pcm())
 
 
+@traced()
 def play_timeline():
     """
     Controls playback according to the grid state, playing the appropriate tracks for each interval.
     """
+    from audio_processing import render_event_log_tracks
+    render_event_log_tracks()
+
     for interval in range(COLUMNS):
         # Check which tracks are active for this interval
-        active_tracks = [row for row in range(ROWS) if grid_state[row][interval]["active"]]
-
-        # Stop any currently playing sounds
-        for channel in globals.channels:
-            channel.stop()
-
-        # Start playing the active tracks for this interval
-        for track_index in active_tracks:
-            if globals.tracks[track_index]:  # Check if a track is loaded
-                pygame_sound = convert_audio_segment_to_pygame_sound(globals.tracks[track_index])
-                globals.channels[track_index].play(pygame_sound)
+        active_tracks = [row for row in range(len(grid_state))
+                         if grid_state[row][interval]["active"] and globals.tracks[row]]
+
+        with span("track_timeline.start_interval", interval=interval + 1):
+            # Stop any currently playing sounds
+            for channel in globals.all_channels():
+                channel.stop()
+
+            # Start playing the active tracks for this interval
+            submix = None
+            for track_index in active_tracks:
+                track = globals.tracks[track_index]
+                if track_index < len(globals.channels):
+                    globals.channels[track_index].play(convert_buffer_to_pygame_sound(track))
+                else:
+                    # Past the hardware channels: mixed in software onto the shared submix channel
+                    if submix is None:
+                        submix = AudioBuffer.silent(INTERVAL_DURATION * 1000)
+                    submix.mix_into(track.slice_ms(0, INTERVAL_DURATION * 1000).to_engine_format(), 0, float(globals.volume_levels[track_index]))
+            if submix is not None:
+                np.clip(submix.samples, -1.0, 1.0, out=submix.samples)
+                globals.submix_channel.play(convert_buffer_to_pygame_sound(submix))
 
         # Wait for the interval duration before moving to the next
         sleep(INTERVAL_DURATION)
@@ -1,23 +1,27 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from pydub import AudioSegment
-from pydub.playback import play
-import threading
 import globals
 import os
+import job_scheduler
+from job_scheduler import track_key
+from tracing import traced
+from undo_journal import journal, TrimStep
+from audio_processing import replace_track_audio
+from scrubber import scrubber
+from preview_player import preview_player
 
 
 def open_trim_window():
     trim_window = tk.Toplevel()
     trim_window.title("Trim Audio")
-    trim_window.geometry("400x300")
+    trim_window.geometry("400x400")
 
     selected_track = tk.StringVar(value="Track 1")
     start_time = tk.DoubleVar(value=0.0)
     end_time = tk.DoubleVar(value=0.0)
 
     ttk.Label(trim_window, text="Select Track to Trim:").pack(pady=5)
-    track_options = [f"Track {i+1}" for i in range(10)]
+    track_options = [f"Track {i+1}" for i in range(globals.track_count)]
     track_menu = ttk.OptionMenu(trim_window, selected_track, track_options[0], *track_options)
     track_menu.pack()
 
@@ -29,82 +33,144 @@ def open_trim_window():
     end_entry = ttk.Entry(trim_window, textvariable=end_time)
     end_entry.pack()
 
+    # Dragging the scrub slider plays the track around the handle, to find the trim points by ear
+    ttk.Label(trim_window, text="Scrub:").pack(pady=5)
+    scrub_position = tk.DoubleVar(value=0.0)
+
+    def scrub_track_index():
+        return int(selected_track.get().split()[1]) - 1
+
+    def scrub(value):
+        track_index = scrub_track_index()
+        if globals.tracks[track_index]:
+            scrubber.scrub_to(track_index, float(value))
+
+    def update_scrub_range(*args):
+        track = globals.tracks[scrub_track_index()]
+        scrub_slider.config(to=track.duration_ms / 1000 if track else 0)
+
+    scrub_slider = ttk.Scale(trim_window, from_=0, to=0, orient="horizontal", length=360,
+                             variable=scrub_position, command=scrub)
+    scrub_slider.pack()
+    scrub_slider.bind("<ButtonRelease-1>", lambda event: scrubber.stop())
+    selected_track.trace_add("write", update_scrub_range)
+    update_scrub_range()
+
+    scrub_frame = ttk.Frame(trim_window)
+    scrub_frame.pack(pady=5)
+    ttk.Button(scrub_frame, text="Set Start", command=lambda: start_time.set(round(scrub_position.get(), 3))).grid(row=0, column=0, padx=5)
+    ttk.Button(scrub_frame, text="Set End", command=lambda: end_time.set(round(scrub_position.get(), 3))).grid(row=0, column=1, padx=5)
+
     buttons_frame = ttk.Frame(trim_window)
     buttons_frame.pack(pady=10)
 
     preview_button = ttk.Button(buttons_frame, text="Preview Trim", command=lambda: preview_trim(selected_track.get(), start_time.get(), end_time.get()))
     preview_button.grid(row=0, column=0, padx=5)
 
-    apply_button = ttk.Button(buttons_frame, text="Apply Trim", command=lambda: apply_trim(selected_track.get(), start_time.get(), end_time.get(), trim_window))
-    apply_button.grid(row=0, column=1, padx=5)
+    stop_button = ttk.Button(buttons_frame, text="Stop", command=preview_player.stop)
+    stop_button.grid(row=0, column=1, padx=5)
 
+    apply_button = ttk.Button(buttons_frame, text="Apply Trim", command=lambda: apply_trim(selected_track.get(), start_time.get(), end_time.get(), trim_window))
+    apply_button.grid(row=0, column=2, padx=5)
 
-def preview_trim(track_index_str, start, end):
-    try:
-        track_index = int(track_index_str.split()[1]) - 1
-        if not globals.tracks[track_index]:
-            messagebox.showerror("Error", f"No audio loaded in {track_index_str}.")
+    def restart_preview(*args):
+        # A preview playing follows the selection: it starts again from the new start point
+        if not preview_player.playing:
             return
+        try:
+            preview_player.play(trim_selection(selected_track.get(), start_time.get(), end_time.get()),
+                                scrub_track_index())
+        except (ValueError, tk.TclError):
+            preview_player.stop()  # Half-typed or invalid selection
 
-        start_ms = start * 1000
-        end_ms = end * 1000
-        if start_ms >= end_ms:
-            messagebox.showerror("Error", "Start time must be less than end time.")
-            return
+    for variable in (selected_track, start_time, end_time):
+        variable.trace_add("write", restart_preview)
+
+    def on_close():
+        preview_player.stop()
+        trim_window.destroy()
+
+    trim_window.protocol("WM_DELETE_WINDOW", on_close)
 
-        original_audio = globals.tracks[track_index]
-        if end_ms > len(original_audio):
-            messagebox.showerror("Error", "End time exceeds track duration.")
-            return
 
-        trimmed_audio = original_audio[start_ms:end_ms]
-        threading.Thread(target=play, args=(trimmed_audio,), daemon=True).start()
+def trim_selection(track_index_str, start, end):
+    """
+    Returns the selected part of the track, raising ValueError if the selection isn't valid.
+    """
+    track_index = int(track_index_str.split()[1]) - 1
+    if globals.track_event_logs[track_index] is not None:
+        raise ValueError(f"{track_index_str} holds a MIDI recording. Save it as WAV to trim it.")
+    if not globals.tracks[track_index]:
+        raise ValueError(f"No audio loaded in {track_index_str}.")
 
+    start_ms = start * 1000
+    end_ms = end * 1000
+    if start_ms >= end_ms:
+        raise ValueError("Start time must be less than end time.")
+
+    original_audio = globals.tracks[track_index]
+    if end_ms > original_audio.duration_ms:
+        raise ValueError("End time exceeds track duration.")
+    return original_audio.slice_ms(start_ms, end_ms)
+
+
+@traced()
+def preview_trim(track_index_str, start, end):
+    try:
+        # A view of the track, played from memory on the preview channel
+        trimmed_audio = trim_selection(track_index_str, start, end)
+        if not preview_player.play(trimmed_audio, int(track_index_str.split()[1]) - 1):
+            messagebox.showwarning("Trim", "Audio is still starting up.")
+    except ValueError as e:
+        messagebox.showerror("Error", str(e))
     except Exception as e:
         messagebox.showerror("Preview Error", f"Failed to preview trimmed audio:\n{e}")
 
 
+@traced()
 def apply_trim(track_index_str, start, end, window):
-    try:
-        track_index = int(track_index_str.split()[1]) - 1
+    track_index = int(track_index_str.split()[1]) - 1
+    start_ms = start * 1000
+    end_ms = end * 1000
+    if start_ms >= end_ms:
+        messagebox.showerror("Error", "Start time must be less than end time.")
+        return None
+
+    def work(job):
+        # Checked in the job so a load still pending on this track is waited for
+        if globals.track_event_logs[track_index] is not None:
+            raise ValueError(f"{track_index_str} holds a MIDI recording. Save it as WAV to trim it.")
         if not globals.tracks[track_index]:
-            messagebox.showerror("Error", f"No audio loaded in {track_index_str}.")
-            return
-
-        start_ms = start * 1000
-        end_ms = end * 1000
-        if start_ms >= end_ms:
-            messagebox.showerror("Error", "Start time must be less than end time.")
-            return
+            raise ValueError(f"No audio loaded in {track_index_str}.")
 
         original_audio = globals.tracks[track_index]
-        if end_ms > len(original_audio):
-            messagebox.showerror("Error", "End time exceeds track duration.")
-            return
-
-        trimmed_audio = original_audio[start_ms:end_ms]
-        globals.tracks[track_index] = trimmed_audio
-        globals.original_tracks[track_index] = trimmed_audio
-
+        if end_ms > original_audio.duration_ms:
+            raise ValueError("End time exceeds track duration.")
+
+        # Copied so the trimmed track doesn't keep the whole original alive
+        trimmed_audio = original_audio.slice_ms(start_ms, end_ms).copy()
+        # Keeps only the cut-off frames for undo
+        step = TrimStep(track_index, original_audio, original_audio.ms_to_frames(start_ms),
+                        original_audio.ms_to_frames(start_ms) + trimmed_audio.frame_count)
+        job.report_progress(0.5, "Writing file")
         file_path = globals.track_file_paths[track_index]
         trimmed_audio.export(file_path, format=os.path.splitext(file_path)[1][1:])
+        return trimmed_audio, step
 
-        duration_seconds = trimmed_audio.duration_seconds
-        globals.track_durations[track_index] = duration_seconds
-        duration_formatted = format_duration(duration_seconds)
-        filename = os.path.basename(file_path)
-        globals.track_labels[track_index].config(text=f"{filename} ({duration_formatted})")
-
-        globals.update_total_length() 
+    def done(result):
+        trimmed_audio, step = result
+        replace_track_audio(track_index, trimmed_audio)
+        journal.record(step)
 
         messagebox.showinfo("Trim Successful", f"{track_index_str} has been trimmed.")
-        window.destroy()
-
-    except Exception as e:
-        messagebox.showerror("Trim Error", f"Failed to apply trim:\n{e}")
+        if window.winfo_exists():
+            window.destroy()
 
+    def failed(e):
+        if isinstance(e, ValueError):
+            messagebox.showerror("Error", str(e))
+        else:
+            messagebox.showerror("Trim Error", f"Failed to apply trim:\n{e}")
 
-def format_duration(seconds):
-    minutes = int(seconds) // 60
-    seconds = int(seconds) % 60
-    return f"{minutes}:{seconds:02d}"
+    return job_scheduler.submit(f"Trimming {track_index_str}", work, keys=[track_key(track_index)],
+                                on_done=done, on_error=failed)
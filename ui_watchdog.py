@@ -0,0 +1,157 @@
+import collections
+import os
+import sys
+import threading
+import time
+import traceback
+
+# Event-loop watchdog: a heartbeat scheduled with window.after() every HEARTBEAT_MS measures how
+# late Tk runs it. Lateness is the time the Tk thread spent in something else, i.e. a handler that
+# blocked the UI.
+#
+# A monitor thread watches the heartbeat. When it has not run for longer than the stall threshold
+# (GROOVE_STALL_MS, 250 ms by default), the monitor captures the Tk thread's stack while the stall
+# is still going on, and the stall is logged with the handler that caused it once the loop is back.
+# The handler is the first app function Tkinter called into; the stack shows where it was stuck.
+# Counters are kept per handler so tests and benchmarks can assert on them.
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+HEARTBEAT_MS = 50
+DEFAULT_STALL_MS = 250
+MAX_STALLS = 100  # Stall records kept, oldest dropped first
+
+threshold_ms = float(os.environ.get("GROOVE_STALL_MS", DEFAULT_STALL_MS))
+stalls = collections.deque(maxlen=MAX_STALLS)
+stall_counts = collections.Counter()  # Handler -> number of stalls
+counters = {"beats": 0, "stalls": 0, "stall_ms": 0.0, "max_lag_ms": 0.0}
+
+_window = None
+_after_id = None
+_running = False
+_tk_thread_id = None
+_last_beat = 0.0
+_captured = None  # (handler, location, stack) taken by the monitor during the current stall
+_lock = threading.Lock()
+
+
+def start(window, stall_ms=None):
+    """
+    Starts watching window's event loop. Must be called on the Tk thread.
+    """
+    global _window, _running, _tk_thread_id, _last_beat, threshold_ms
+    if _running:
+        return
+    if stall_ms is not None:
+        threshold_ms = float(stall_ms)
+    _window = window
+    _tk_thread_id = threading.get_ident()
+    _running = True
+    _last_beat = time.perf_counter()
+    _schedule()
+    threading.Thread(target=_monitor, name="ui-watchdog", daemon=True).start()
+
+
+def stop():
+    global _running, _after_id
+    _running = False
+    if _after_id is not None and _window is not None:
+        try:
+            _window.after_cancel(_after_id)
+        except Exception:
+            pass  # The window is already gone
+    _after_id = None
+
+
+def reset():
+    stalls.clear()
+    stall_counts.clear()
+    counters.update(beats=0, stalls=0, stall_ms=0.0, max_lag_ms=0.0)
+
+
+def _schedule():
+    global _after_id
+    _after_id = _window.after(HEARTBEAT_MS, _beat)
+
+
+def _beat():
+    global _last_beat, _captured
+    if not _running:
+        return
+    now = time.perf_counter()
+    lag_ms = (now - _last_beat) * 1000 - HEARTBEAT_MS
+    _last_beat = now
+    counters["beats"] += 1
+    counters["max_lag_ms"] = max(counters["max_lag_ms"], lag_ms)
+    with _lock:
+        captured, _captured = _captured, None
+    if lag_ms >= threshold_ms:
+        _record_stall(lag_ms, captured)
+    _schedule()
+
+
+def _record_stall(lag_ms, captured):
+    # A stall shorter than the monitor's poll can end before its stack was captured
+    handler, location, stack = captured or ("unknown", "unknown", [])
+    stall = {"time": time.time(), "lag_ms": lag_ms, "handler": handler, "location": location, "stack": stack}
+    stalls.append(stall)
+    stall_counts[handler] += 1
+    counters["stalls"] += 1
+    counters["stall_ms"] += lag_ms
+    print(f"UI stall: event loop blocked {lag_ms:.0f} ms by {handler} (at {location})")
+
+
+def _monitor():
+    global _captured
+    poll = threshold_ms / 4000
+    while _running:
+        time.sleep(poll)
+        if (time.perf_counter() - _last_beat) * 1000 - HEARTBEAT_MS < threshold_ms:
+            continue
+        with _lock:
+            if _captured is not None:
+                continue  # Already captured this stall
+            frame = sys._current_frames().get(_tk_thread_id)
+            if frame is not None:
+                _captured = describe_stack(traceback.extract_stack(frame))
+
+
+def is_app_frame(frame_summary):
+    # Pseudo-files such as "<frozen importlib._bootstrap>" are not on disk and never match
+    return os.path.dirname(frame_summary.filename) == APP_DIR and not frame_summary.filename.endswith("ui_watchdog.py")
+
+
+def describe_stack(stack):
+    """
+    Returns (handler, location, formatted stack) for the Tk thread's stack, outermost frame first.
+    The handler is the app function called from the innermost Tkinter frame that called into app
+    code; the location is the innermost app frame, where the time was going.
+    """
+    handler = location = "unknown"
+    for index, frame in enumerate(stack):
+        if is_app_frame(frame) and index and "tkinter" in stack[index - 1].filename:
+            # A button's lambda only forwards to the real handler, one frame further in
+            if frame.name == "<lambda>" and index + 1 < len(stack) and is_app_frame(stack[index + 1]):
+                frame = stack[index + 1]
+            handler = f"{os.path.basename(frame.filename)}:{frame.name}"
+    app_frames = [frame for frame in stack if is_app_frame(frame)]
+    if app_frames:
+        location = f"{os.path.basename(app_frames[-1].filename)}:{app_frames[-1].lineno} {app_frames[-1].name}"
+    return handler, location, traceback.format_list(stack)
+
+
+def summary():
+    return {
+        "threshold_ms": threshold_ms,
+        "counters": dict(counters),
+        "by_handler": dict(stall_counts),
+        "stalls": [dict(stall) for stall in stalls],
+    }
+
+
+def print_summary():
+    if not counters["stalls"]:
+        return
+    print(f"\nUI stalls over {threshold_ms:.0f} ms: {counters['stalls']}, "
+          f"{counters['stall_ms']:.0f} ms in total, longest {counters['max_lag_ms']:.0f} ms")
+    for handler, count in stall_counts.most_common():
+        print(f"{handler:40s} {count:6d}")
@@ -0,0 +1,360 @@
+import atexit
+import contextlib
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+import time
+import numpy as np
+import globals
+import job_scheduler
+import memory_accounting
+from job_scheduler import track_key
+from audio_buffer import AudioBuffer
+
+# Undo/redo for track edits, grid toggles and volume changes.
+#
+# Each step records the operation and only the audio needed to reverse it: a trim keeps the
+# frames it cut off, an EQ keeps the audio it replaced (an IIR filter can't be inverted), and
+# grid and volume steps keep no audio at all. Redo re-runs the operation. Audio is held as 16-bit
+# PCM, the resolution of the session files, which halves it compared to the float samples.
+#
+# Audio kept in memory is limited by a budget (GROOVE_UNDO_BUDGET_MB). Past it, the steps furthest
+# from the present are written to a temp folder and memory-mapped back, so old steps cost disk,
+# not RAM. At most MAX_STEPS steps are kept.
+
+DEFAULT_MEMORY_BUDGET_MB = 64
+MAX_STEPS = 100
+VOLUME_MERGE_SECONDS = 1.0  # Slider moves on one track closer than this are one step
+
+_step_ids = itertools.count(1)
+
+
+class Step:
+    track_index = None
+
+    def __init__(self, description):
+        self.id = next(_step_ids)
+        self.description = description
+
+    @property
+    def nbytes(self):
+        return 0
+
+    def spill(self, directory):
+        pass
+
+    def discard(self):
+        pass
+
+    def undo(self, journal):
+        raise NotImplementedError
+
+    def redo(self, journal):
+        raise NotImplementedError
+
+
+class AudioEditStep(Step):
+    """
+    An edit that rewrote a track and its session file. Subclasses implement revert() and reapply(),
+    which run on a worker thread, and set before_frames and after_frames. export_args are passed to
+    AudioBuffer.export when undo or redo rewrites the file, as the edit itself did.
+    """
+
+    export_args = {}
+
+    def __init__(self, description, track_index):
+        super().__init__(description)
+        self.track_index = track_index
+        self.frame_rate = None
+        self.before_frames = 0
+        self.after_frames = 0
+        self._arrays = {}
+        self._spill_paths = []
+        self._discarded = False
+        self._lock = threading.Lock()  # spill() runs on a worker, discard() on the Tk thread
+
+    def store(self, name, audio):
+        self.frame_rate = audio.frame_rate
+        self._arrays[name] = audio.to_pcm()
+
+    def load(self, name):
+        return AudioBuffer.from_pcm(self._arrays[name], self.frame_rate).samples
+
+    def frames(self, name):
+        return len(self._arrays[name])
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self._arrays.values() if not isinstance(array, np.memmap))
+
+    def spill(self, directory):
+        for name, array in list(self._arrays.items()):
+            if isinstance(array, np.memmap):
+                continue
+            path = os.path.join(directory, f"step_{self.id}_{name}.npy")
+            np.save(path, array)
+            with self._lock:
+                if self._discarded:
+                    # Dropped from the history while it was being written
+                    os.remove(path)
+                    return
+                self._spill_paths.append(path)
+                self._arrays[name] = np.load(path, mmap_mode="r")
+
+    def discard(self):
+        with self._lock:
+            self._discarded = True
+            self._arrays.clear()
+            for path in self._spill_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+            self._spill_paths = []
+
+    def revert(self, audio):
+        raise NotImplementedError
+
+    def reapply(self, audio):
+        raise NotImplementedError
+
+    def undo(self, journal):
+        return self._submit(journal, "Undo", self.revert, self.after_frames)
+
+    def redo(self, journal):
+        return self._submit(journal, "Redo", self.reapply, self.before_frames)
+
+    def _submit(self, journal, verb, transform, expected_frames):
+        from tkinter import messagebox
+        from audio_processing import replace_track_audio
+        track_index = self.track_index
+        export_args = self.export_args
+
+        def work(job):
+            # Runs after any other job on the track, so it sees the audio the last edit left
+            audio = globals.tracks[track_index]
+            if audio is None or audio.frame_count != expected_frames:
+                raise ValueError(f"Track {track_index + 1} has changed since this edit.")
+            audio = transform(audio)
+            job.report_progress(0.5, "Writing file")
+            file_path = globals.track_file_paths[track_index]
+            audio.export(file_path, format=os.path.splitext(file_path)[1][1:], **export_args)
+            return audio
+
+        def done(audio):
+            replace_track_audio(track_index, audio)
+
+        def failed(e):
+            journal.step_failed(self, verb)
+            messagebox.showerror(verb, f"Could not {verb.lower()} {self.description}:\n{e}")
+
+        return job_scheduler.submit(f"{verb} {self.description}", work, keys=[track_key(track_index)],
+                                    on_done=done, on_error=failed)
+
+
+class TrimStep(AudioEditStep):
+    def __init__(self, track_index, original, start_frame, end_frame):
+        super().__init__(f"trim of Track {track_index + 1}", track_index)
+        self.store("head", AudioBuffer(original.samples[:start_frame], original.frame_rate))
+        self.store("tail", AudioBuffer(original.samples[end_frame:], original.frame_rate))
+        self.before_frames = original.frame_count
+        self.after_frames = end_frame - start_frame
+
+    def revert(self, audio):
+        samples = np.concatenate((self.load("head"), audio.samples, self.load("tail")))
+        return AudioBuffer(samples, audio.frame_rate)
+
+    def reapply(self, audio):
+        start = self.frames("head")
+        return AudioBuffer(audio.samples[start:start + self.after_frames].copy(), audio.frame_rate)
+
+
+class EqualizerStep(AudioEditStep):
+    export_args = {"bitrate": "320k"}
+
+    def __init__(self, track_index, original, band_gains):
+        super().__init__(f"equalizer on Track {track_index + 1}", track_index)
+        self.store("original", original)
+        self.band_gains = dict(band_gains)
+        self.before_frames = self.after_frames = original.frame_count
+
+    def revert(self, audio):
+        return AudioBuffer(self.load("original"), audio.frame_rate)
+
+    def reapply(self, audio):
+        from equalizer import equalize_buffer
+        return equalize_buffer(audio, self.band_gains)
+
+
+class GridToggleStep(Step):
+    def __init__(self, row, col, active):
+        super().__init__(f"grid cell {row + 1}:{col + 1}")
+        self.row = row
+        self.col = col
+        self.active = active
+
+    def undo(self, journal):
+        from track_timeline import set_cell_active
+        set_cell_active(self.row, self.col, not self.active)
+
+    def redo(self, journal):
+        from track_timeline import set_cell_active
+        set_cell_active(self.row, self.col, self.active)
+
+
+class VolumeStep(Step):
+    def __init__(self, track_index, old_volume, new_volume):
+        super().__init__(f"volume of Track {track_index + 1}")
+        self.track_index = track_index
+        self.old_volume = old_volume
+        self.new_volume = new_volume
+        self.time = time.monotonic()
+
+    def _set(self, volume):
+        from audio_processing import adjust_volume
+        if self.track_index < len(globals.mixer_sliders):
+            globals.mixer_sliders[self.track_index].set(volume)
+        adjust_volume(self.track_index, volume)
+
+    def undo(self, journal):
+        self._set(self.old_volume)
+
+    def redo(self, journal):
+        self._set(self.new_volume)
+
+
+class UndoJournal:
+    def __init__(self, memory_budget, max_steps=MAX_STEPS):
+        self.memory_budget = memory_budget
+        self.max_steps = max_steps
+        self.undo_steps = []  # Oldest first
+        self.redo_steps = []  # Furthest from the present first
+        self._suspended = 0
+        self._spill_dir = None
+        self._spilling = False
+
+    @contextlib.contextmanager
+    def suspended(self):
+        """
+        Changes made inside (undo itself, loading a project) are not recorded.
+        """
+        self._suspended += 1
+        try:
+            yield
+        finally:
+            self._suspended -= 1
+
+    def record(self, step):
+        if self._suspended:
+            step.discard()
+            return
+        for old in self.redo_steps:
+            old.discard()
+        self.redo_steps = []
+        self.undo_steps.append(step)
+        while len(self.undo_steps) > self.max_steps:
+            self.undo_steps.pop(0).discard()
+        self.enforce_budget()
+
+    def record_volume(self, track_index, old_volume, new_volume):
+        if self._suspended or old_volume == new_volume:
+            return
+        last = self.undo_steps[-1] if self.undo_steps else None
+        now = time.monotonic()
+        if (isinstance(last, VolumeStep) and last.track_index == track_index and not self.redo_steps
+                and now - last.time < VOLUME_MERGE_SECONDS):
+            last.new_volume = new_volume
+            last.time = now
+            return
+        self.record(VolumeStep(track_index, old_volume, new_volume))
+
+    def undo(self):
+        if not self.undo_steps:
+            print("Undo: nothing to undo")
+            return None
+        step = self.undo_steps.pop()
+        self.redo_steps.append(step)
+        print(f"Undo: {step.description}")
+        with self.suspended():
+            return step.undo(self)
+
+    def redo(self):
+        if not self.redo_steps:
+            print("Redo: nothing to redo")
+            return None
+        step = self.redo_steps.pop()
+        self.undo_steps.append(step)
+        print(f"Redo: {step.description}")
+        with self.suspended():
+            return step.redo(self)
+
+    def step_failed(self, step, verb):
+        # Put the step back where it was so the journal matches the tracks again
+        source, target = (self.redo_steps, self.undo_steps) if verb == "Undo" else (self.undo_steps, self.redo_steps)
+        if step in source:
+            source.remove(step)
+            target.append(step)
+
+    def forget_track(self, track_index):
+        """
+        Drops the audio edits of a track whose audio was replaced by a different file.
+        """
+        for steps in (self.undo_steps, self.redo_steps):
+            for step in [step for step in steps if isinstance(step, AudioEditStep) and step.track_index == track_index]:
+                steps.remove(step)
+                step.discard()
+
+    def clear(self):
+        for step in self.undo_steps + self.redo_steps:
+            step.discard()
+        self.undo_steps = []
+        self.redo_steps = []
+
+    @property
+    def memory_bytes(self):
+        return sum(step.nbytes for step in self.undo_steps + self.redo_steps)
+
+    def enforce_budget(self):
+        if self._spilling or self.memory_bytes <= self.memory_budget:
+            return None
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix="groove-undo-")
+            atexit.register(shutil.rmtree, self._spill_dir, True)
+        # Oldest undo steps first, then the redo steps furthest from the present
+        candidates = self.undo_steps + self.redo_steps
+        to_spill = []
+        excess = self.memory_bytes - self.memory_budget
+        for step in candidates:
+            if excess <= 0:
+                break
+            if step.nbytes:
+                to_spill.append(step)
+                excess -= step.nbytes
+
+        def work(job):
+            for n, step in enumerate(to_spill):
+                job.report_progress(n / len(to_spill))
+                step.spill(self._spill_dir)
+
+        def done(_):
+            self._spilling = False
+            print(f"Undo history: {self.memory_bytes / 2 ** 20:.1f} MB in memory")
+            self.enforce_budget()
+
+        def failed(e):
+            self._spilling = False
+            print(f"Undo history: could not write to disk: {e}")
+
+        self._spilling = True
+        return job_scheduler.submit("Moving undo history to disk", work, on_done=done, on_error=failed)
+
+
+def _journal_buffers():
+    for step in journal.undo_steps + journal.redo_steps:
+        if isinstance(step, AudioEditStep):
+            for array in list(step._arrays.values()):
+                yield step.track_index, array
+
+
+journal = UndoJournal(int(float(os.environ.get("GROOVE_UNDO_BUDGET_MB", DEFAULT_MEMORY_BUDGET_MB)) * 2 ** 20))
+memory_accounting.register("undo history", _journal_buffers)
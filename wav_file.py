@@ -0,0 +1,184 @@
+import os
+import struct
+import numpy as np
+
+# WAV files without ffmpeg: the RIFF header is parsed here and the data chunk is memory-mapped as
+# a NumPy array, so opening a file costs a few page reads however long it is, and pages are read
+# from disk only when something touches them.
+#
+# 32-bit float data is used as the samples directly. Integer PCM (16, 24 and 32-bit) and 64-bit
+# float stay encoded in the mapping and are decoded to float32 block by block as they are read
+# (WavSamples), so slicing, metering, exporting and block-by-block playback never decode the
+# whole file. Mappings are copy-on-write: writing to the samples never writes to the file.
+#
+# A mapping does see later writes to the file, and reading pages past the end of a truncated file
+# kills the process with SIGBUS. So the app never rewrites a WAV in place: exports and track loads
+# write a new file next to the old one and rename it over it, and the old mapping keeps the old
+# contents. A track file an external editor changed is reloaded by check_for_updates, which maps
+# it afresh.
+#
+# Windows does not let a mapped file be replaced, and track files are rewritten by edits, so there
+# the data chunk is read into memory instead (still without ffmpeg or an extra copy).
+
+FORMAT_PCM = 1
+FORMAT_FLOAT = 3
+FORMAT_EXTENSIBLE = 0xFFFE
+DECODE_CHUNK_FRAMES = 65536
+UNSET_SIZE = 0xFFFFFFFF
+MAP_FILES = os.name != "nt"
+
+_PCM_TYPES = {2: "<i2", 4: "<i4"}
+_FLOAT_TYPES = {4: "<f4", 8: "<f8"}
+
+
+class UnsupportedWav(ValueError):
+    pass
+
+
+def is_wav_file(file_path):
+    try:
+        with open(file_path, "rb") as f:
+            header = f.read(12)
+    except OSError:
+        return False
+    return header[:4] == b"RIFF" and header[8:12] == b"WAVE"
+
+
+def read_header(f):
+    """
+    Returns (format, channels, frame_rate, bits, data_offset, data_size) of an open WAV file.
+    """
+    riff, _, wave = struct.unpack("<4sI4s", f.read(12))
+    if riff != b"RIFF" or wave != b"WAVE":
+        raise UnsupportedWav("Not a RIFF WAVE file")
+    fmt = None
+    file_size = os.fstat(f.fileno()).st_size
+    while True:
+        chunk_header = f.read(8)
+        if len(chunk_header) < 8:
+            raise UnsupportedWav("No data chunk")
+        chunk_id, size = struct.unpack("<4sI", chunk_header)
+        if chunk_id == b"fmt ":
+            body = f.read(size)
+            audio_format, channels, frame_rate, _, _, bits = struct.unpack("<HHIIHH", body[:16])
+            if audio_format == FORMAT_EXTENSIBLE and len(body) >= 26:
+                audio_format = struct.unpack("<H", body[24:26])[0]  # First two bytes of the sub-format GUID
+            fmt = (audio_format, channels, frame_rate, bits)
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise UnsupportedWav("Data chunk before the format chunk")
+            # Writers that stream often leave the size unset (0 or 0xFFFFFFFF); the data then runs to
+            # the end of the file. A size past the end, from a cut-off file, is clamped the same way
+            offset = f.tell()
+            if size in (0, UNSET_SIZE):
+                size = file_size - offset
+            size = min(size, file_size - offset)
+            return fmt + (offset, size)
+        else:
+            f.seek(size, os.SEEK_CUR)
+        if size % 2:
+            f.seek(1, os.SEEK_CUR)  # Chunks are padded to an even size
+
+
+def open_wav(file_path):
+    """
+    Returns (samples, frame_rate) of a WAV file: a float32 (frames x channels) array for 32-bit
+    float files, a WavSamples decoding on demand for the other formats. Raises UnsupportedWav
+    for formats it can't map (8-bit, compressed), which the caller decodes another way.
+    """
+    with open(file_path, "rb") as f:
+        audio_format, channels, frame_rate, bits, offset, size = read_header(f)
+    width = bits // 8
+    if audio_format == FORMAT_PCM and width in (2, 3, 4):
+        dtype = np.uint8 if width == 3 else _PCM_TYPES[width]
+    elif audio_format == FORMAT_FLOAT and width in _FLOAT_TYPES:
+        dtype = _FLOAT_TYPES[width]
+    else:
+        raise UnsupportedWav(f"Unsupported WAV format {audio_format} with {bits} bits")
+    frames = size // (width * channels)
+    shape = (frames, channels * 3) if width == 3 else (frames, channels)
+    if not frames:
+        raw = np.zeros(shape, dtype=dtype)
+    elif MAP_FILES:
+        raw = np.memmap(file_path, dtype=dtype, mode="c", offset=offset, shape=shape)
+    else:
+        raw = np.fromfile(file_path, dtype=dtype, count=shape[0] * shape[1], offset=offset).reshape(shape)
+    samples = WavSamples(raw, audio_format, width, channels)
+    if dtype == "<f4":
+        return samples.raw, frame_rate
+    return samples, frame_rate
+
+
+class WavSamples:
+    """
+    Encoded samples in a mapping, read like a float32 (frames x channels) array: len() and slicing
+    by frames work, and a slice decodes just those frames.
+    """
+
+    def __init__(self, raw, audio_format, width, channels):
+        self.raw = raw
+        self.format = audio_format
+        self.width = width
+        self.channels = channels
+
+    def __len__(self):
+        return len(self.raw)
+
+    @property
+    def shape(self):
+        return (len(self.raw), self.channels)
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            raise TypeError("WavSamples only supports slicing by frames")
+        return self.decode(*key.indices(len(self.raw))[:2])
+
+    def slice(self, start, stop):
+        # Still encoded and still mapped
+        return WavSamples(self.raw[start:stop], self.format, self.width, self.channels)
+
+    def pcm(self, sample_width):
+        # The integer samples as stored, if the file already holds them at this width
+        if self.format == FORMAT_PCM and self.width == sample_width and sample_width != 3:
+            return self.raw
+        return None
+
+    def decode(self, start=0, stop=None):
+        raw = self.raw[start:stop]
+        out = np.empty((len(raw), self.channels), dtype=np.float32)
+        for chunk_start in range(0, len(raw), DECODE_CHUNK_FRAMES):
+            chunk = raw[chunk_start:chunk_start + DECODE_CHUNK_FRAMES]
+            target = out[chunk_start:chunk_start + len(chunk)]
+            if self.format == FORMAT_FLOAT:
+                target[:] = chunk
+            elif self.width == 3:
+                # Each 3-byte sample goes in the top of an int32, which keeps its sign
+                padded = np.zeros((len(chunk), self.channels, 4), dtype=np.uint8)
+                padded[:, :, 1:] = chunk.reshape(len(chunk), self.channels, 3)
+                np.multiply(padded.view("<i4").reshape(len(chunk), self.channels), np.float32(1 / 2 ** 31), out=target)
+            else:
+                np.multiply(chunk, np.float32(1 / 2 ** (8 * self.width - 1)), out=target)
+        return out
+
+
+def write_wav(file_path, pcm_chunks, frame_rate, channels, sample_width):
+    """
+    Writes integer PCM chunks, each a (frames x channels) array, as a WAV file, without holding
+    the whole file in memory.
+    """
+    with open(file_path, "wb") as f:
+        f.write(b"RIFF" + b"\0" * 4 + b"WAVE")
+        f.write(struct.pack("<4sIHHIIHH", b"fmt ", 16, FORMAT_PCM, channels, frame_rate,
+                            frame_rate * channels * sample_width, channels * sample_width, 8 * sample_width))
+        f.write(b"data" + b"\0" * 4)
+        size = 0
+        for chunk in pcm_chunks:
+            data = np.ascontiguousarray(chunk).astype(_PCM_TYPES[sample_width], copy=False)
+            f.write(data)
+            size += data.nbytes
+        if size % 2:
+            f.write(b"\0")
+        f.seek(4)
+        f.write(struct.pack("<I", 36 + size + size % 2))
+        f.seek(40)
+        f.write(struct.pack("<I", size))